@@ -17,7 +17,7 @@ ALLOWED_HOSTS = [
 if 'AZURE_POSTGRESQL_HOST' in os.environ:
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': 'finance.backends.postgresql' if DB_POOL else 'django.db.backends.postgresql',
             'NAME': os.environ.get('AZURE_POSTGRESQL_NAME'),
             'USER': os.environ.get('AZURE_POSTGRESQL_USER'),
             'PASSWORD': os.environ.get('AZURE_POSTGRESQL_PASSWORD'),
@@ -25,9 +25,19 @@ if 'AZURE_POSTGRESQL_HOST' in os.environ:
             'PORT': '5432',
             'OPTIONS': {
                 'sslmode': 'require',
-            }
+            },
+            # Avoid a TLS handshake per request: keep connections open or pool them
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+            'CONN_HEALTH_CHECKS': True,
+            'POOL': DB_POOL_OPTIONS,
         }
     }
+    # Rebuild the read replicas on top of the production primary
+    for index, location in enumerate(DATABASE_REPLICAS, start=1):
+        DATABASES[f'replica{index}'] = {**DATABASES['default'], 'HOST': location, 'TEST': {'MIRROR': 'default'}}
+    # ... and the shards
+    for index, location in enumerate(DATABASE_SHARDS, start=1):
+        DATABASES[f'shard{index}'] = {**DATABASES['default'], 'HOST': location}
 
 # Static files configuration for Azure
 STATIC_URL = '/static/'
@@ -69,5 +79,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        # Slow and sampled request profiles (finance.profiling)
+        'finance.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
\ No newline at end of file
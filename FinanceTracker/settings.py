@@ -44,11 +44,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'finance.metrics.MetricsMiddleware',
+    'finance.profiling.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'finance.routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'finance.sharding.ShardMiddleware',
+    'finance.profiling.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -57,7 +62,9 @@ ROOT_URLCONF = 'FinanceTracker.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django templates, timed per request for the metrics
+        'BACKEND': 'finance.metrics.TimedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -79,15 +86,28 @@ WSGI_APPLICATION = 'FinanceTracker.wsgi.application'
 # Default SQLite for development, configurable for production
 DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite3')
 
+# Connections are kept open per thread for DB_CONN_MAX_AGE seconds (0 closes
+# them after every request) and health-checked before reuse; DB_POOL=True
+# draws them from an in-process pool instead (see finance/pool.py)
+DB_POOL = os.environ.get('DB_POOL', 'False') == 'True'
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '0'))
+DB_POOL_OPTIONS = {
+    'MAX_SIZE': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+    'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', '30')),
+}
+
 if DATABASE_ENGINE == 'postgresql':
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': 'finance.backends.postgresql' if DB_POOL else 'django.db.backends.postgresql',
             'NAME': os.environ.get('DATABASE_NAME', 'financetracker'),
             'USER': os.environ.get('DATABASE_USER', 'postgres'),
             'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
             'HOST': os.environ.get('DATABASE_HOST', 'localhost'),
             'PORT': os.environ.get('DATABASE_PORT', '5432'),
+            'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'POOL': DB_POOL_OPTIONS,
         }
     }
 elif DATABASE_ENGINE == 'mysql':
@@ -104,12 +124,43 @@ elif DATABASE_ENGINE == 'mysql':
 else:
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
+            'ENGINE': 'finance.backends.sqlite3' if DB_POOL else 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'POOL': DB_POOL_OPTIONS,
         }
     }
 
 
+
+# Read replicas: DATABASE_REPLICAS is a comma-separated list of replica hosts
+# (or, for SQLite, database files holding a copy of the primary).  Reads of
+# GET requests go to a replica; clients that wrote stay on the primary for
+# REPLICA_PIN_SECONDS (see finance/routers.py)
+DATABASE_REPLICAS = [location for location in os.environ.get('DATABASE_REPLICAS', '').split(',') if location]
+REPLICA_DATABASES = []
+for index, location in enumerate(DATABASE_REPLICAS, start=1):
+    replica = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    replica['NAME' if replica['ENGINE'].endswith('sqlite3') else 'HOST'] = location
+    DATABASES[f'replica{index}'] = replica
+    REPLICA_DATABASES.append(f'replica{index}')
+
+# Sharding: DATABASE_SHARDS is a comma-separated list of database hosts (or,
+# for SQLite, database files).  Each user's categories, transactions and
+# budgets live on the shard their id hashes to (see finance/sharding.py);
+# run migrate_all_shards to create the schema on every shard
+DATABASE_SHARDS = [location for location in os.environ.get('DATABASE_SHARDS', '').split(',') if location]
+SHARD_DATABASES = []
+for index, location in enumerate(DATABASE_SHARDS, start=1):
+    shard = dict(DATABASES['default'])
+    shard['NAME' if shard['ENGINE'].endswith('sqlite3') else 'HOST'] = location
+    DATABASES[f'shard{index}'] = shard
+    SHARD_DATABASES.append(f'shard{index}')
+
+DATABASE_ROUTERS = ['finance.sharding.ShardRouter', 'finance.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '5'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -165,3 +216,60 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/accounts/login/'
 LOGIN_URL = '/accounts/login/'
+
+# Cache: local memory by default; point CACHE_BACKEND at
+# finance.sharedcache.SharedMemoryCache (with a file such as
+# /dev/shm/finance-cache in CACHE_LOCATION), or at
+# django.core.cache.backends.filebased.FileBasedCache (with a directory in
+# CACHE_LOCATION), to share cached dashboards between worker processes.
+# The shared-memory cache reserves 32 MiB in /dev/shm, which Docker limits
+# to 64 MiB unless the container is run with a larger --shm-size
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'finance-tracker'),
+    }
+}
+
+# Seconds a computed dashboard stays cached; writes invalidate it earlier
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', '300'))
+
+# Transaction list pagination: 'offset' (numbered pages) or 'cursor' (keyset)
+TRANSACTION_LIST_PAGINATION = os.environ.get('TRANSACTION_LIST_PAGINATION', 'offset')
+
+# Route the dashboard and list pages to their async views, which run their
+# independent queries concurrently; set by startup.sh when serving over ASGI
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', 'False') == 'True'
+
+# Prometheus metrics at /metrics/.  Each worker process writes a snapshot of
+# its metrics to METRICS_DIR (set by gunicorn.conf.py) at most every
+# METRICS_FLUSH_SECONDS, so any worker can report them all.  /metrics/,
+# /health/database/ and the details of /health/ready/ answer staff users and
+# requests sending "Authorization: Bearer <METRICS_TOKEN>" only
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', '1'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Server-Timing header with the db, render, cache and total time of every
+# response.  Requests slower than SLOW_REQUEST_SECONDS (0 turns it off), and
+# a SLOW_REQUEST_SAMPLE_RATE share of all requests, are logged as JSON with
+# their SQL to the finance.profiling logger.  Staff users can send an
+# "X-Profile" header to get a cProfile report of a request instead
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'True') == 'True'
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', '1'))
+SLOW_REQUEST_SAMPLE_RATE = float(os.environ.get('SLOW_REQUEST_SAMPLE_RATE', '0'))
+
+# Seconds the readiness probe (/health/ready/ and /health/) reuses its
+# database, cache and migration checks, so frequent probes add no load
+READINESS_CACHE_SECONDS = float(os.environ.get('READINESS_CACHE_SECONDS', '5'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'finance.profiling': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Category, Transaction, Budget
+from . import search
+from .models import Category, Transaction, Budget, MonthlyRollup
 
 
 @admin.register(Category)
@@ -23,7 +24,8 @@ class TransactionAdmin(admin.ModelAdmin):
     """Admin interface for Transaction model"""
     list_display = ['description', 'type', 'amount', 'date', 'category', 'user', 'created_at']
     list_filter = ['type', 'category', 'user', 'date', 'created_at']
-    search_fields = ['description', 'user__username', 'category__name']
+    # Descriptions are matched through the full-text index in get_search_results
+    search_fields = ['user__username', 'category__name']
     ordering = ['-date', '-created_at']
     date_hierarchy = 'date'
     
@@ -46,6 +48,13 @@ class TransactionAdmin(admin.ModelAdmin):
             return qs
         return qs.filter(user=request.user)
     
+    def get_search_results(self, request, queryset, search_term):
+        """Add full-text description matches to the username/category search"""
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            results |= queryset.filter(search.match(search_term, using=queryset.db))
+        return results, may_have_duplicates
+    
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         """Filter category choices to show only user's categories"""
         if db_field.name == "category" and not request.user.is_superuser:
@@ -75,6 +84,22 @@ class BudgetAdmin(admin.ModelAdmin):
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
+@admin.register(MonthlyRollup)
+class MonthlyRollupAdmin(admin.ModelAdmin):
+    """Read-only admin interface for the derived MonthlyRollup table"""
+    list_display = ['category', 'year', 'month', 'type', 'total', 'count', 'user']
+    list_filter = ['type', 'year', 'month']
+    search_fields = ['category__name', 'user__username']
+    ordering = ['user', '-year', '-month', 'category__name']
+    list_select_related = ['category', 'user']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # Customize admin site header and title
 admin.site.site_header = "Finance Tracker Administration"
 admin.site.site_title = "Finance Tracker Admin"
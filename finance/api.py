@@ -0,0 +1,304 @@
+"""Versioned JSON API for transactions, categories and budgets.
+
+Every endpoint lists the signed-in user's rows with keyset pagination
+(``cursor``), an optional ``page_size`` and ``fields=`` sparse projection.
+Rows are read with ``.values()`` and serialised as plain dictionaries, so no
+model instances are built.
+
+Responses carry ``ETag`` and ``Last-Modified`` headers derived from the
+latest ``updated_at`` and the row count of the listed rows (the count catches
+deletions).  A poll with ``If-None-Match`` or ``If-Modified-Since`` costs one
+aggregate query and returns 304 without paginating or serialising anything.
+Deleting a row changes the ETag but not ``Last-Modified``, so clients should
+prefer ``If-None-Match``.
+"""
+import hashlib
+import json
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from . import batch, exports
+from .forms import TransactionFilterForm
+from .models import Budget, Category, Transaction
+from .pagination import CursorPaginator, InvalidCursor, cursor_filters
+
+API_VERSION = 'v1'
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class ApiError(Exception):
+    """A client error reported as a JSON ``{"detail": ...}`` response"""
+
+    def __init__(self, detail, status=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+class Resource:
+    """How a model is exposed: its JSON fields, ordering and filters.
+
+    ``fields`` maps JSON names to ``.values()`` lookups.  ``ordering`` must
+    end in a unique field, as required by ``CursorPaginator``.  ``related``
+    lists models whose values are embedded in the rows (such as a category
+    name), so that changing them also changes the ETag.
+    """
+
+    def __init__(self, name, model, fields, ordering, filter_form=None, related=()):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        self.ordering = ordering
+        self.filter_form = filter_form
+        self.related = related
+
+    def get_queryset(self, user, filters):
+        return self.model.objects.filter(user=user)
+
+
+class TransactionResource(Resource):
+
+    def get_queryset(self, user, filters):
+        return exports.filter_transactions(
+            super().get_queryset(user, filters),
+            type=filters.get('type'),
+            category_id=filters.get('category'),
+            start=filters.get('start'),
+            end=filters.get('end'),
+        )
+
+
+TRANSACTIONS = TransactionResource(
+    'transactions',
+    Transaction,
+    fields={
+        'id': 'id',
+        'type': 'type',
+        'amount': 'amount',
+        'date': 'date',
+        'category': 'category_id',
+        'category_name': 'category__name',
+        'description': 'description',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    },
+    ordering=('-date', '-created_at', '-id'),
+    filter_form=TransactionFilterForm,
+    related=(Category,),
+)
+
+CATEGORIES = Resource(
+    'categories',
+    Category,
+    fields={
+        'id': 'id',
+        'name': 'name',
+        'description': 'description',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    },
+    ordering=('name', 'id'),
+)
+
+BUDGETS = Resource(
+    'budgets',
+    Budget,
+    fields={
+        'id': 'id',
+        'category': 'category_id',
+        'category_name': 'category__name',
+        'limit': 'limit',
+        'period': 'period',
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+    },
+    ordering=('id',),
+    related=(Category,),
+)
+
+
+def api_login_required(view):
+    """Like ``login_required``, but answers 401 JSON instead of redirecting"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'detail': 'Authentication required.'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _parse_request(request, resource):
+    """Validated ``(filters, raw_filters, fields, page_size)`` for a request, memoised on it"""
+    if getattr(request, '_api_params', None) is None:
+        try:
+            request._api_params = (True, _parse(request, resource))
+        except ApiError as exc:
+            request._api_params = (False, exc)
+    ok, result = request._api_params
+    if not ok:
+        raise result
+    return result
+
+
+def _parse(request, resource):
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            raw_filters = cursor_filters(cursor)
+        except InvalidCursor:
+            raise ApiError('Invalid cursor.')
+    elif resource.filter_form is not None:
+        raw_filters = {
+            name: request.GET[name]
+            for name in resource.filter_form.base_fields
+            if request.GET.get(name)
+        }
+    else:
+        raw_filters = {}
+
+    filters = {}
+    if resource.filter_form is not None:
+        form = resource.filter_form(raw_filters)
+        if not form.is_valid():
+            raise ApiError({name: messages for name, messages in form.errors.items()})
+        filters = form.cleaned_data
+
+    requested = request.GET.get('fields')
+    if requested:
+        fields = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in fields if name not in resource.fields]
+        if unknown:
+            raise ApiError(f"Unknown field(s): {', '.join(unknown)}.")
+    else:
+        fields = list(resource.fields)
+
+    try:
+        page_size = int(request.GET.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ApiError('page_size must be an integer.')
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise ApiError(f'page_size must be between 1 and {MAX_PAGE_SIZE}.')
+
+    return filters, raw_filters, fields, page_size
+
+
+def _freshness(request, resource):
+    """``(latest updated_at, row count)`` of the listed rows, memoised on the request"""
+    if not hasattr(request, '_api_freshness'):
+        try:
+            filters = _parse_request(request, resource)[0]
+        except ApiError:
+            request._api_freshness = None
+        else:
+            state = resource.get_queryset(request.user, filters).aggregate(
+                latest=Max('updated_at'),
+                count=Count('pk'),
+            )
+            latest = [state['latest']] + [
+                model.objects.filter(user=request.user).aggregate(latest=Max('updated_at'))['latest']
+                for model in resource.related
+            ]
+            latest = [value for value in latest if value is not None]
+            request._api_freshness = (max(latest) if latest else None, state['count'])
+    return request._api_freshness
+
+
+def _etag(request, resource):
+    freshness = _freshness(request, resource)
+    if freshness is None:
+        return None
+    latest, count = freshness
+    # The query string selects filters, fields and the page, so it is part of the representation
+    key = f"{API_VERSION}:{resource.name}:{latest.isoformat() if latest else ''}:{count}:{request.GET.urlencode()}"
+    return hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+
+
+def _last_modified(request, resource):
+    freshness = _freshness(request, resource)
+    return freshness[0] if freshness else None
+
+
+def _page_url(request, cursor):
+    params = {'cursor': cursor}
+    for name in ('fields', 'page_size'):
+        if request.GET.get(name):
+            params[name] = request.GET[name]
+    return f'{request.path}?{urlencode(params)}'
+
+
+def list_view(resource):
+    """JSON list view for ``resource`` with conditional GET support"""
+
+    @require_GET
+    @api_login_required
+    @condition(
+        etag_func=lambda request: _etag(request, resource),
+        last_modified_func=lambda request: _last_modified(request, resource),
+    )
+    def view(request):
+        try:
+            filters, raw_filters, fields, page_size = _parse_request(request, resource)
+        except ApiError as exc:
+            return JsonResponse({'detail': exc.detail}, status=exc.status)
+
+        lookups = {resource.fields[name] for name in fields}
+        lookups.update(name.lstrip('-') for name in resource.ordering)
+        paginator = CursorPaginator(
+            resource.get_queryset(request.user, filters).values(*lookups),
+            page_size,
+            resource.ordering,
+        )
+        try:
+            page = paginator.page(request.GET.get('cursor'), raw_filters)
+        except InvalidCursor:
+            return JsonResponse({'detail': 'Invalid cursor.'}, status=400)
+
+        return JsonResponse({
+            'version': API_VERSION,
+            'results': [{name: row[resource.fields[name]] for name in fields} for row in page],
+            'next': _page_url(request, page.next_cursor) if page.next_cursor else None,
+            'previous': _page_url(request, page.previous_cursor) if page.previous_cursor else None,
+        })
+
+    view.__name__ = f'api_{resource.name}'
+    view.__doc__ = f"List the user's {resource.name} as JSON"
+    return view
+
+
+transactions = list_view(TRANSACTIONS)
+categories = list_view(CATEGORIES)
+budgets = list_view(BUDGETS)
+
+
+@require_POST
+@api_login_required
+def transactions_batch(request):
+    """Apply a batch of transaction creates, updates and deletes"""
+    try:
+        payload = json.loads(request.body)
+    except (UnicodeDecodeError, ValueError):
+        return JsonResponse({'detail': 'Request body must be JSON.'}, status=400)
+    if not isinstance(payload, dict) or 'operations' not in payload:
+        return JsonResponse({'detail': 'Expected an object with an "operations" list.'}, status=400)
+
+    try:
+        results = batch.apply_batch(request.user, payload['operations'])
+    except batch.BatchError as exc:
+        return JsonResponse({'detail': str(exc)}, status=400)
+
+    counts = {status: 0 for status in ('created', 'updated', 'deleted', 'error')}
+    for result in results:
+        counts[result['status']] += 1
+    return JsonResponse({
+        'version': API_VERSION,
+        'created': counts['created'],
+        'updated': counts['updated'],
+        'deleted': counts['deleted'],
+        'errors': counts['error'],
+        'results': results,
+    })
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class FinanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finance'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+
+        from . import metrics, pool, search, signals  # noqa: F401
+        post_migrate.connect(search.ensure_index, sender=self)
+        connection_created.connect(pool.record_connect)
+        connection_created.connect(metrics.install_query_recorder)
@@ -0,0 +1,8 @@
+"""PostgreSQL backend drawing its connections from ``finance.pool``"""
+from django.db.backends.postgresql import base
+
+from finance.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
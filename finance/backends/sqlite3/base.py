@@ -0,0 +1,8 @@
+"""SQLite backend drawing its connections from ``finance.pool``"""
+from django.db.backends.sqlite3 import base
+
+from finance.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
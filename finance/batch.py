@@ -0,0 +1,177 @@
+"""Create, update and delete many transactions in one request.
+
+A batch is a list of operations::
+
+    {"op": "create", "data": {"type": ..., "amount": ..., "date": ...,
+                              "category": <id>, "description": ...}}
+    {"op": "update", "id": <id>, "data": {<any subset of the fields above>}}
+    {"op": "delete", "id": <id>}
+
+Every operation is validated with the ``TransactionForm`` field rules; the
+categories and transactions it references are checked for ownership with
+one query each for the whole batch.  Valid operations are then applied in a
+single database transaction with ``bulk_create``, ``bulk_update`` and one
+``DELETE ... IN``, and invalid ones are reported without affecting the
+rest.  The transactions to update or delete are read with
+``select_for_update`` in that same database transaction, so a concurrent
+edit cannot change them between the read and the write.  Those bulk writes bypass model signals, so the rollups are updated
+and the dashboard cache invalidated once for the whole batch.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching, rollups, sharding
+from .importers import RowValidator
+from .models import Category, Transaction
+
+MAX_OPERATIONS = 5000
+FIELDS = ('type', 'amount', 'date', 'category', 'description')
+UPDATE_FIELDS = ('type', 'amount', 'date', 'category', 'description', 'updated_at')
+
+
+class BatchError(ValueError):
+    """Raised when the batch as a whole is malformed"""
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _operation_ids(operations):
+    """Transaction ids referenced by update and delete operations"""
+    ids = set()
+    for operation in operations:
+        if isinstance(operation, dict) and operation.get('op') in ('update', 'delete'):
+            if _is_id(operation.get('id')):
+                ids.add(operation['id'])
+    return ids
+
+
+def _category_ids(operations):
+    """Category ids referenced by create and update operations"""
+    ids = set()
+    for operation in operations:
+        data = operation.get('data') if isinstance(operation, dict) else None
+        if isinstance(data, dict) and _is_id(data.get('category')):
+            ids.add(data['category'])
+    return ids
+
+
+def _clean_data(validator, data, owned_categories, partial):
+    """Return ``(cleaned, errors)`` for an operation's ``data``"""
+    if not isinstance(data, dict):
+        return {}, {'data': ['Expected an object.']}
+
+    cleaned, errors = {}, {}
+    unknown = sorted(set(data) - set(FIELDS))
+    if unknown:
+        errors['data'] = [f"Unknown field(s): {', '.join(unknown)}."]
+    for name in FIELDS:
+        if name not in data:
+            if not partial:
+                errors[name] = ['This field is required.']
+            continue
+        value = data[name]
+        if name == 'category':
+            if _is_id(value) and value in owned_categories:
+                cleaned['category_id'] = value
+            else:
+                errors[name] = ['Select a valid choice. That choice is not one of the available choices.']
+            continue
+        try:
+            cleaned[name] = validator.clean_field(name, '' if value is None else str(value).strip())
+        except ValidationError as exc:
+            errors[name] = exc.messages
+    return cleaned, errors
+
+
+def apply_batch(user, operations):
+    """Validate and apply ``operations`` for ``user``; return one result per operation.
+
+    Results are dictionaries with the operation ``index`` and a ``status`` of
+    ``created``, ``updated``, ``deleted`` or ``error`` (with ``errors``).
+    """
+    if not isinstance(operations, list):
+        raise BatchError('"operations" must be a list.')
+    if len(operations) > MAX_OPERATIONS:
+        raise BatchError(f'A batch may contain at most {MAX_OPERATIONS} operations.')
+
+    validator = RowValidator()
+    owned_categories = set(
+        Category.objects.filter(user=user, id__in=_category_ids(operations)).values_list('id', flat=True)
+    )
+    using = sharding.shard_for(user.pk)
+    with transaction.atomic(using=using):
+        # Locked until the batch commits, so the rollup contributions reversed
+        # below are those of the rows actually overwritten or deleted
+        existing = (
+            Transaction.objects.filter(user=user, id__in=_operation_ids(operations)).select_for_update().in_bulk()
+        )
+
+        results = []
+        to_create, to_update, to_delete = [], [], []
+        previous = []  # copies of updated and deleted rows, to reverse their rollup contributions
+        seen = set()
+        now = timezone.now()
+        for index, operation in enumerate(operations):
+            result = {'index': index}
+            results.append(result)
+            op = operation.get('op') if isinstance(operation, dict) else None
+            if op not in ('create', 'update', 'delete'):
+                result.update(status='error', errors={'op': ['Expected "create", "update" or "delete".']})
+                continue
+
+            if op == 'create':
+                cleaned, errors = _clean_data(validator, operation.get('data'), owned_categories, partial=False)
+                if errors:
+                    result.update(status='error', errors=errors)
+                else:
+                    to_create.append((result, Transaction(user=user, **cleaned)))
+                continue
+
+            pk = operation.get('id')
+            instance = existing.get(pk) if _is_id(pk) else None
+            if instance is None:
+                result.update(status='error', errors={'id': ['Transaction not found.']})
+                continue
+            if pk in seen:
+                result.update(status='error', errors={'id': ['Transaction appears more than once in this batch.']})
+                continue
+
+            if op == 'delete':
+                seen.add(pk)
+                previous.append(instance)
+                to_delete.append((result, pk))
+                continue
+
+            cleaned, errors = _clean_data(validator, operation.get('data'), owned_categories, partial=True)
+            if errors:
+                result.update(status='error', errors=errors)
+                continue
+            seen.add(pk)
+            previous.append(Transaction(**{
+                field.attname: getattr(instance, field.attname) for field in Transaction._meta.concrete_fields
+            }))
+            for name, value in cleaned.items():
+                setattr(instance, name, value)
+            instance.updated_at = now
+            to_update.append((result, instance))
+
+        created = Transaction.objects.bulk_create([instance for _, instance in to_create], batch_size=500)
+        Transaction.objects.bulk_update([instance for _, instance in to_update], UPDATE_FIELDS, batch_size=500)
+        if to_delete:
+            # Nothing references transactions, so skip the collector and its per-row signals
+            sharding.raw_delete(Transaction.objects.filter(user=user, id__in=[pk for _, pk in to_delete]), using)
+        rollups.apply_transactions(previous, sign=-1)
+        rollups.apply_transactions(created + [instance for _, instance in to_update])
+        if created or to_update or to_delete:
+            caching.invalidate_user(user.pk)
+
+    for result, instance in to_create:
+        result.update(status='created', id=instance.pk)
+    for result, instance in to_update:
+        result.update(status='updated', id=instance.pk)
+    for result, pk in to_delete:
+        result.update(status='deleted', id=pk)
+    return results
@@ -0,0 +1,129 @@
+"""Per-user dashboard caching with versioned invalidation.
+
+Every user has a version number in the cache.  Cached dashboard contexts are
+stored under a key containing that version, so invalidating a user's data is
+a single ``incr`` of the version: stale entries are never read again and
+simply expire.  Writes to ``Transaction``, ``Budget`` and ``Category`` bump
+the version through the signals in ``finance.signals``.
+
+Concurrent misses for the same key are collapsed ("single flight"): threads
+of one process wait on a shared lock, and processes coordinate through a
+short-lived ``cache.add`` lock, so the context is computed once and the other
+requests reuse the result.  Only ``add``/``get``/``set``/``incr`` are used,
+which the local-memory, file-based and Redis backends all provide.  Their
+time counts as cache time of the request in ``finance.metrics``.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.db import transaction
+
+from . import metrics, sharding
+
+VERSION_KEY = 'finance:dashboard:version:{user_id}'
+CONTEXT_KEY = 'finance:dashboard:context:{user_id}:{version}:{day}'
+LOCK_SUFFIX = ':lock'
+
+cache = metrics.TimedCache(default_cache)
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def get_timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+
+
+def get_version(user_id):
+    """Current cache version for a user, initialising it if missing"""
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock rather than 1 so an evicted version key can
+        # never resurrect contexts cached under an earlier version.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(user_id):
+    """Invalidate every cached dashboard context of a user"""
+    key = VERSION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def invalidate_user(user_id):
+    """Bump the version now and again once the current transaction commits.
+
+    The second bump discards anything a concurrent request cached from data
+    read before this transaction became visible.
+    """
+    bump_version(user_id)
+    using = sharding.shard_for(user_id)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: bump_version(user_id), using=using)
+
+
+def _acquire_local_lock(key):
+    """Reference-counted per-key lock shared by the threads of this process"""
+    with _local_locks_guard:
+        entry = _local_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    return entry[0]
+
+
+def _release_local_lock(key):
+    with _local_locks_guard:
+        entry = _local_locks[key]
+        entry[1] -= 1
+        if not entry[1]:
+            del _local_locks[key]
+
+
+def get_or_compute(key, compute, timeout=None, lock_timeout=10, poll_interval=0.05):
+    """Return the cached value for ``key``, computing it at most once when missing"""
+    value = cache.get(key)
+    metrics.record_cache(value is not None)
+    if value is not None:
+        return value
+
+    timeout = get_timeout() if timeout is None else timeout
+    try:
+        with _acquire_local_lock(key):
+            value = cache.get(key)
+            if value is not None:
+                return value
+
+            lock_key = key + LOCK_SUFFIX
+            deadline = time.monotonic() + lock_timeout
+            locked = cache.add(lock_key, True, timeout=lock_timeout)
+            while not locked:
+                # Another process is computing; wait for its result
+                time.sleep(poll_interval)
+                value = cache.get(key)
+                if value is not None:
+                    return value
+                if time.monotonic() >= deadline:
+                    break
+                locked = cache.add(lock_key, True, timeout=lock_timeout)
+
+            try:
+                value = compute()
+                cache.set(key, value, timeout)
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+            return value
+    finally:
+        _release_local_lock(key)
+
+
+def dashboard_context(user, day, compute):
+    """Cached dashboard context for ``user`` on ``day``, built by ``compute()``"""
+    key = CONTEXT_KEY.format(user_id=user.pk, version=get_version(user.pk), day=day.isoformat())
+    return get_or_compute(key, compute)
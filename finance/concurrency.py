@@ -0,0 +1,62 @@
+"""Helpers for the async views: concurrent ORM work and authentication.
+
+Django's async ORM methods (``aget``, ``acount``, ``async for``...) all run
+their SQL through ``sync_to_async(thread_sensitive=True)``, i.e. one at a
+time on a single shared thread, so awaiting several of them with
+``asyncio.gather`` still runs the queries one after another.  ``gather``
+runs each callable in its own worker thread instead.  Django connections
+are per thread, so every query gets its own connection and independent
+queries really overlap; each thread then releases its connection the way a
+finished request does, honouring ``CONN_MAX_AGE``.
+
+Inside a transaction (``atomic`` blocks, and every ``TestCase``) other
+connections cannot see uncommitted rows, so the callables then run one by
+one on the connection that owns the transaction.
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections, connections
+
+
+def _run_isolated(func):
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+def _in_atomic_block(using):
+    return connections[using].in_atomic_block
+
+
+async def gather(*funcs, using='default'):
+    """Call the sync callables ``funcs`` concurrently and return their results in order"""
+    # Connections belong to threads, so ask the thread sync code runs on
+    if await sync_to_async(_in_atomic_block)(using):
+        return [await sync_to_async(func)() for func in funcs]
+    return list(await asyncio.gather(*(
+        sync_to_async(_run_isolated, thread_sensitive=False)(func) for func in funcs
+    )))
+
+
+async def authenticate(request):
+    """Load ``request.user`` without blocking, for use before any sync code reads it"""
+    user = await request.auser()
+    # Replace the lazy object so sync code (templates, context processors)
+    # does not look the user up a second time
+    request.user = user
+    return user
+
+
+def async_login_required(view):
+    """``login_required`` for ``async def`` views"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await authenticate(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,86 @@
+"""Streaming export of transactions as CSV or NDJSON.
+
+Rows are read with ``.values_list()`` joined to the category name and
+``.iterator(chunk_size=...)``, so the database driver hands them over in
+chunks (a server-side cursor on PostgreSQL) and no model instances are
+built.  Output is produced lazily, a chunk of lines at a time, for use with
+``StreamingHttpResponse``; memory stays flat however many rows a user has.
+
+The CSV columns match what ``finance.importers`` reads, so an export can be
+imported again.
+"""
+import csv
+import json
+
+COLUMNS = ('date', 'type', 'amount', 'category', 'description')
+VALUE_FIELDS = ('date', 'type', 'amount', 'category__name', 'description')
+ORDERING = ('date', 'id')
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the data instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def filter_transactions(queryset, type=None, category_id=None, start=None, end=None):
+    """Apply the list filters plus an inclusive ``start``/``end`` date range"""
+    if type:
+        queryset = queryset.filter(type=type)
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+    return queryset
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Iterate ``(date, type, amount, category, description)`` tuples"""
+    return queryset.order_by(*ORDERING).values_list(*VALUE_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def _chunked(lines, chunk_size):
+    """Join lines into strings of up to ``chunk_size`` lines"""
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def csv_lines(rows):
+    """Header line followed by one CSV line per row"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows):
+    """One JSON object per row; amounts are strings to keep exact decimals"""
+    for date, type, amount, category, description in rows:
+        yield json.dumps({
+            'date': date.isoformat(),
+            'type': type,
+            'amount': str(amount),
+            'category': category,
+            'description': description,
+        }) + '\n'
+
+
+def stream(queryset, format='csv', chunk_size=2000):
+    """Lazily render ``queryset`` in ``format``, ``chunk_size`` rows per piece"""
+    rows = export_rows(queryset, chunk_size=chunk_size)
+    lines = csv_lines(rows) if format == 'csv' else ndjson_lines(rows)
+    return _chunked(lines, chunk_size)
@@ -90,7 +90,8 @@ class TransactionForm(forms.ModelForm):
         
         # Filter categories to show only user's categories
         if self.user:
-            self.fields['category'].queryset = Category.objects.filter(user=self.user)
+            # Option labels use Category.__str__, which reads the user
+            self.fields['category'].queryset = Category.objects.filter(user=self.user).select_related('user')
         
         self.helper = FormHelper()
         self.helper.layout = Layout(
@@ -125,7 +126,8 @@ class BudgetForm(forms.ModelForm):
         
         # Filter categories to show only user's categories
         if self.user:
-            self.fields['category'].queryset = Category.objects.filter(user=self.user)
+            # Option labels use Category.__str__, which reads the user
+            self.fields['category'].queryset = Category.objects.filter(user=self.user).select_related('user')
         
         self.helper = FormHelper()
         self.helper.layout = Layout(
@@ -156,4 +158,36 @@ class BudgetForm(forms.ModelForm):
                     f'You already have a {period.lower()} budget for {category.name}.'
                 )
         
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+
+class TransactionImportForm(forms.Form):
+    """Form for uploading a CSV file of transactions"""
+    file = forms.FileField(
+        label='CSV file',
+        help_text='Columns: date, type, amount, category, description. '
+                  'Missing categories are created automatically.'
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.layout = Layout(
+            'file'
+        )
+
+
+class TransactionFilterForm(forms.Form):
+    """Query-string filters for the transaction export and API"""
+    type = forms.ChoiceField(choices=[('', 'All Types')] + Transaction.TRANSACTION_TYPES, required=False)
+    category = forms.IntegerField(min_value=1, required=False)
+    start = forms.DateField(required=False)
+    end = forms.DateField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start = cleaned_data.get('start')
+        end = cleaned_data.get('end')
+        if start and end and end < start:
+            raise forms.ValidationError('The end date must not be before the start date.')
+        return cleaned_data
@@ -0,0 +1,119 @@
+"""Readiness checks of the database, cache and migrations, cached between probes.
+
+Container probes and load balancers poll the health endpoints every few
+seconds from every instance, so the checks must not turn into database
+load.  ``readiness()`` runs them at most once per ``READINESS_CACHE_SECONDS``
+per process and serves the latest report in between; while one request is
+re-checking, concurrent probes get the previous report instead of queueing
+behind it.  A database found fully migrated is not checked again by the
+process, since migrations are only applied between deployments.
+
+Each check reports whether it passed and how long it took, so a slow
+dependency shows up before it fails.
+"""
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+from . import sharding
+
+CACHE_KEY = 'finance:health:{pid}'
+
+_lock = threading.Lock()
+_result = None  # (time.monotonic() of the check, report)
+_migrated = set()  # aliases found with every migration applied
+
+
+def get_ttl():
+    return getattr(settings, 'READINESS_CACHE_SECONDS', 5.0)
+
+
+def timed(check, *args):
+    """Run ``check(*args)``, returning whether it passed, its milliseconds and any details it returns"""
+    started = time.perf_counter()
+    try:
+        details, ok = check(*args) or {}, True
+    except Exception as exc:
+        details, ok = {'error': str(exc)}, False
+    return {'ok': ok, 'ms': round((time.perf_counter() - started) * 1000, 2), **details}
+
+
+def check_database(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def check_migrations(alias):
+    if alias in _migrated:
+        return {'pending': 0}
+    executor = MigrationExecutor(connections[alias])
+    pending = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    if pending:
+        raise RuntimeError(f'{len(pending)} migration(s) not applied')
+    _migrated.add(alias)
+    return {'pending': 0}
+
+
+def check_cache():
+    key = CACHE_KEY.format(pid=os.getpid())
+    value = time.time_ns()
+    cache.set(key, value, 60)
+    if cache.get(key) != value:
+        raise RuntimeError('The cache did not return the value just written')
+
+
+def check():
+    """Run every check now; the report's ``status`` is ``ok`` only if all of them passed"""
+    migrated = [DEFAULT_DB_ALIAS] + [alias for alias in sharding.get_shards() if alias != DEFAULT_DB_ALIAS]
+    checks = {
+        'databases': {alias: timed(check_database, alias) for alias in connections},
+        'migrations': {alias: timed(check_migrations, alias) for alias in migrated},
+        'cache': timed(check_cache),
+    }
+    results = [*checks['databases'].values(), *checks['migrations'].values(), checks['cache']]
+    return {
+        'status': 'ok' if all(result['ok'] for result in results) else 'error',
+        'checked_at': time.time(),
+        'checks': checks,
+    }
+
+
+def summary(report):
+    """``report`` with only each check's result and latency, leaving out errors and details"""
+    def brief(result):
+        return {'ok': result['ok'], 'ms': result['ms']}
+    checks = report['checks']
+    return {**report, 'checks': {
+        'databases': {alias: brief(result) for alias, result in checks['databases'].items()},
+        'migrations': {alias: brief(result) for alias, result in checks['migrations'].items()},
+        'cache': brief(checks['cache']),
+    }}
+
+
+def readiness(refresh=False):
+    """``(age in seconds, report)`` of the latest check, re-checking once it is older than the TTL"""
+    global _result
+    result = _result
+    if refresh or result is None or time.monotonic() - result[0] >= get_ttl():
+        # Only the first caller waits; the others keep serving the previous report
+        if _lock.acquire(blocking=result is None):
+            try:
+                result = _result
+                if refresh or result is None or time.monotonic() - result[0] >= get_ttl():
+                    result = _result = (time.monotonic(), check())
+            finally:
+                _lock.release()
+    return time.monotonic() - result[0], result[1]
+
+
+def reset():
+    """Forget the cached report and migration state, so the next probe checks again"""
+    global _result
+    _result = None
+    _migrated.clear()
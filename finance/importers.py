@@ -0,0 +1,189 @@
+"""Streaming CSV import of transactions.
+
+Rows are read one at a time from any text stream, validated with the field
+rules of ``TransactionForm`` and inserted with ``bulk_create`` in chunks,
+each chunk in its own database transaction.  Category names are resolved
+against a per-import cache; names the user does not have yet are created in
+bulk, once per chunk.  Because ``bulk_create`` bypasses model signals, the
+monthly rollups are updated with one delta per affected rollup row and the
+dashboard cache is invalidated once per import.
+"""
+import csv
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import caching, rollups, sharding
+from .forms import TransactionForm
+from .models import Category, Transaction
+
+REQUIRED_COLUMNS = ('date', 'type', 'amount', 'category', 'description')
+VALIDATED_FIELDS = ('type', 'amount', 'date', 'description')
+
+
+class ImportFileError(ValueError):
+    """Raised when the file itself cannot be imported (as opposed to single rows)"""
+
+
+@dataclass
+class ImportResult:
+    """Outcome of an import: rows created and per-row validation errors"""
+    created: int = 0
+    categories_created: int = 0
+    errors: list = field(default_factory=list)
+
+    @property
+    def error_count(self):
+        return len(self.errors)
+
+
+class RowValidator:
+    """Validate raw CSV values with the same rules as ``TransactionForm``.
+
+    Uses the form's own field definitions plus the model field validators a
+    ``ModelForm`` would run, without building a form instance per row.
+    Results for low-cardinality columns are memoised, since spreadsheets
+    repeat the same dates and types on thousands of rows.
+    """
+    MEMOISED_FIELDS = ('type', 'date')
+    MEMO_LIMIT = 10000
+
+    def __init__(self):
+        self.form_fields = {name: TransactionForm.base_fields[name] for name in VALIDATED_FIELDS}
+        self.model_fields = {name: Transaction._meta.get_field(name) for name in VALIDATED_FIELDS}
+        self.memo = {name: {} for name in self.MEMOISED_FIELDS}
+
+    def clean_field(self, name, raw_value):
+        """Cleaned value for one field, or raise ``ValidationError``"""
+        value = self.form_fields[name].clean(raw_value)
+        self.model_fields[name].run_validators(value)
+        return value
+
+    def clean(self, raw):
+        """Return ``(cleaned, errors)`` for a dict of raw strings"""
+        cleaned, errors = {}, {}
+        for name in VALIDATED_FIELDS:
+            raw_value = (raw.get(name) or '').strip()
+            memo = self.memo.get(name)
+            try:
+                if memo is None:
+                    cleaned[name] = self.clean_field(name, raw_value)
+                    continue
+                outcome = memo.get(raw_value)
+                if outcome is None:
+                    try:
+                        outcome = (True, self.clean_field(name, raw_value))
+                    except ValidationError as exc:
+                        outcome = (False, exc)
+                    if len(memo) < self.MEMO_LIMIT:
+                        memo[raw_value] = outcome
+                if not outcome[0]:
+                    raise outcome[1]
+                cleaned[name] = outcome[1]
+            except ValidationError as exc:
+                errors[name] = exc.messages
+
+        category = (raw.get('category') or '').strip()
+        max_length = Category._meta.get_field('name').max_length
+        if not category:
+            errors['category'] = ['This field is required.']
+        elif len(category) > max_length:
+            errors['category'] = [f'Ensure this value has at most {max_length} characters.']
+        cleaned['category'] = category
+        return cleaned, errors
+
+
+class CategoryResolver:
+    """Map category names to ids for one user, creating missing ones in bulk"""
+
+    def __init__(self, user):
+        self.user = user
+        self.ids = dict(Category.objects.filter(user=user).values_list('name', 'id'))
+        self.created = 0
+
+    def resolve(self, names):
+        """Ensure every name in ``names`` has an id, creating categories as needed"""
+        missing = {name for name in names if name not in self.ids}
+        if not missing:
+            return
+        Category.objects.bulk_create(
+            [Category(user=self.user, name=name) for name in missing],
+            ignore_conflicts=True,  # respect unique_together if created concurrently
+        )
+        found = dict(Category.objects.filter(user=self.user, name__in=missing).values_list('name', 'id'))
+        self.created += len(found)
+        self.ids.update(found)
+
+
+def read_rows(stream):
+    """Yield ``(line_number, row_dict)`` from a CSV text stream with a header row"""
+    reader = csv.DictReader(stream)
+    try:
+        fieldnames = reader.fieldnames
+    except UnicodeDecodeError as exc:
+        raise ImportFileError('The file is not UTF-8 encoded text.') from exc
+    if fieldnames is None:
+        raise ImportFileError('The file is empty.')
+
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    missing = [column for column in REQUIRED_COLUMNS if column not in reader.fieldnames]
+    if missing:
+        raise ImportFileError(f"Missing required column(s): {', '.join(missing)}.")
+
+    try:
+        for row in reader:
+            yield reader.line_num, row
+    except csv.Error as exc:
+        raise ImportFileError(f'Line {reader.line_num}: {exc}') from exc
+    except UnicodeDecodeError as exc:
+        raise ImportFileError(f'Line {reader.line_num + 1}: the file is not UTF-8 encoded text.') from exc
+
+
+def import_transactions(user, stream, chunk_size=5000, batch_size=1000):
+    """Import transactions for ``user`` from a CSV text stream.
+
+    Valid rows are committed chunk by chunk, so an error on one row never
+    discards the others; invalid rows are reported in ``ImportResult.errors``
+    as ``{'line': ..., 'errors': {field: [messages]}}`` dictionaries.
+    """
+    result = ImportResult()
+    validator = RowValidator()
+    categories = CategoryResolver(user)
+
+    chunk = []
+    for line_number, raw in read_rows(stream):
+        cleaned, errors = validator.clean(raw)
+        if errors:
+            result.errors.append({'line': line_number, 'errors': errors})
+            continue
+        chunk.append(cleaned)
+        if len(chunk) >= chunk_size:
+            result.created += _insert_chunk(user, chunk, categories, batch_size)
+            chunk = []
+    if chunk:
+        result.created += _insert_chunk(user, chunk, categories, batch_size)
+
+    result.categories_created = categories.created
+    if result.created or result.categories_created:
+        caching.invalidate_user(user.pk)
+    return result
+
+
+def _insert_chunk(user, rows, categories, batch_size):
+    with transaction.atomic(using=sharding.shard_for(user.pk)):
+        categories.resolve({row['category'] for row in rows})
+        objects = [
+            Transaction(
+                user=user,
+                type=row['type'],
+                amount=row['amount'],
+                date=row['date'],
+                category_id=categories.ids[row['category']],
+                description=row['description'],
+            )
+            for row in rows
+        ]
+        Transaction.objects.bulk_create(objects, batch_size=batch_size)
+        rollups.apply_transactions(objects)
+    return len(objects)
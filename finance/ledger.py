@@ -0,0 +1,76 @@
+"""Running balances for a page of transactions.
+
+A row's balance is the signed sum (income positive, expenses negative) of
+every matching transaction up to and including it, in ``(date, created_at,
+id)`` order.  Instead of summing a user's whole history per page, the
+balance is split in two:
+
+* the opening balance of the month holding the page's oldest row, read from
+  the ``MonthlyRollup`` table (one row per category, month and type);
+* a SQL ``Sum`` window over the transactions from the start of that month
+  to the page's newest row.
+
+The work therefore depends on the size of one month and one page, not on
+how deep the page is, on both SQLite and PostgreSQL.
+"""
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When, Window
+from django.db.models.expressions import RowRange
+
+from . import periods
+from .models import MonthlyRollup
+
+ORDERING = ('date', 'created_at', 'id')
+BALANCE_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def signed(field):
+    """``field`` for income, ``-field`` for expenses"""
+    return Case(
+        When(type='Income', then=F(field)),
+        default=F(field) * Value(-1),
+        output_field=BALANCE_FIELD,
+    )
+
+
+def opening_balance(user, year, month, type=None, category_id=None):
+    """Signed total of every matching transaction before the given month"""
+    queryset = MonthlyRollup.objects.filter(
+        Q(year__lt=year) | Q(year=year, month__lt=month),
+        user=user,
+    )
+    if type:
+        queryset = queryset.filter(type=type)
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+    return queryset.aggregate(balance=Sum(signed('total')))['balance'] or Decimal('0.00')
+
+
+def attach_balances(queryset, rows, user, type=None, category_id=None):
+    """Set ``balance`` on each transaction in ``rows``.
+
+    ``queryset`` must be the filtered queryset the rows were paged from, and
+    ``type``/``category_id`` the same filters, so the rollup opening balance
+    and the window cover the same transactions.
+    """
+    if not rows:
+        return rows
+    oldest = min(row.date for row in rows)
+    newest = max(row.date for row in rows)
+    month = periods.month(oldest.year, oldest.month)
+
+    opening = opening_balance(user, oldest.year, oldest.month, type=type, category_id=category_id)
+    running = queryset.filter(date__gte=month.start, date__lte=newest).order_by().annotate(
+        running=Window(
+            Sum(signed('amount')),
+            order_by=[F(name).asc() for name in ORDERING],
+            frame=RowRange(start=None, end=0),
+        )
+    ).values_list('id', 'running')
+
+    wanted = {row.pk for row in rows}
+    balances = {pk: opening + value for pk, value in running if pk in wanted}
+    for row in rows:
+        row.balance = balances[row.pk]
+    return rows
@@ -0,0 +1,230 @@
+"""Concurrent HTTP load generation for the benchmark commands.
+
+Only the standard library is used: every client thread keeps its own
+keep-alive ``http.client`` connection and cycles through a list of paths
+(or ``Target``s, for POSTs and per-URL results), recording each request's
+latency.  ``serve`` starts a server process for the duration of a benchmark
+and ``login_cookie`` creates a session for a user without going through the
+login form.
+"""
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.middleware.csrf import CSRF_ALLOWED_CHARS, CSRF_SECRET_LENGTH
+from django.utils.crypto import get_random_string
+
+
+class Target:
+    """A request made by load clients: a GET, or a POST of ``body`` as JSON.
+
+    Results are also reported per ``label`` (the path by default).
+    """
+
+    def __init__(self, path, label=None, body=None):
+        self.path = path
+        self.label = label or path
+        self.body = body
+
+    @property
+    def method(self):
+        return 'GET' if self.body is None else 'POST'
+
+
+class LoadResult:
+    """Latencies (in milliseconds) and errors of one load run.
+
+    ``by_label`` holds a ``LoadResult`` per target label.
+    """
+
+    def __init__(self, latencies, errors, seconds, by_label=None):
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.seconds = seconds
+        self.by_label = by_label or {}
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    @property
+    def throughput(self):
+        """Successful requests per second"""
+        return self.requests / self.seconds if self.seconds else 0.0
+
+    def percentile(self, fraction):
+        """Latency below which ``fraction`` of the requests completed (nearest rank)"""
+        if not self.latencies:
+            return None
+        index = max(0, min(len(self.latencies) - 1, round(fraction * len(self.latencies)) - 1))
+        return self.latencies[index]
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'seconds': round(self.seconds, 3),
+            'throughput': round(self.throughput, 1),
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.latencies[-1] if self.latencies else None,
+        }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def login_cookie(user):
+    """``Cookie`` header value of a new authenticated session for ``user``"""
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+
+def csrf_headers(cookie):
+    """Headers sending ``cookie`` with a new CSRF token, so that POSTs pass the CSRF check"""
+    token = get_random_string(CSRF_SECRET_LENGTH, allowed_chars=CSRF_ALLOWED_CHARS)
+    return {
+        'Cookie': f'{cookie}; {settings.CSRF_COOKIE_NAME}={token}',
+        'X-CSRFToken': token,
+    }
+
+
+def request(connection, path, headers, body=None):
+    """Issue one GET (or POST of ``body`` as JSON) and return ``(status, body)``"""
+    if body is None:
+        connection.request('GET', path, headers=headers)
+    else:
+        connection.request(
+            'POST', path, body=json.dumps(body).encode(), headers={**headers, 'Content-Type': 'application/json'},
+        )
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def run(base_url, paths, concurrency=10, duration=10.0, headers=None, warmup=1.0, sessions=None):
+    """Request ``paths`` round-robin from ``concurrency`` threads for ``duration`` seconds.
+
+    ``paths`` holds paths or ``Target``s.  With ``sessions``, a list of
+    ``(headers, paths)`` pairs, client ``n`` uses ``sessions[n % len(sessions)]``
+    instead, so clients can act as different users.  Requests made during
+    the first ``warmup`` seconds are not recorded.  Responses with a status
+    of 400 or more count as errors.
+    """
+    url = urlsplit(base_url)
+    sessions = [
+        (dict(session_headers or {}), [path if isinstance(path, Target) else Target(path) for path in session_paths])
+        for session_headers, session_paths in (sessions or [(headers, paths)])
+    ]
+    samples = []  # (label, latency or None for an error)
+    lock = threading.Lock()
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def client(offset):
+        connection = http.client.HTTPConnection(url.hostname, url.port, timeout=60)
+        client_headers, targets = sessions[offset % len(sessions)]
+        own_samples = []
+        index = offset
+        while True:
+            target = targets[index % len(targets)]
+            index += 1
+            sent = time.perf_counter()
+            if sent >= stop_at:
+                break
+            try:
+                status, _ = request(connection, target.path, client_headers, target.body)
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(url.hostname, url.port, timeout=60)
+                status = None
+            if sent < measure_from:
+                continue
+            if status is None or status >= 400:
+                own_samples.append((target.label, None))
+            else:
+                own_samples.append((target.label, (time.perf_counter() - sent) * 1000))
+        connection.close()
+        with lock:
+            samples.extend(own_samples)
+
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    seconds = min(time.perf_counter(), stop_at) - measure_from
+    by_label = {}
+    for label, latency in samples:
+        by_label.setdefault(label, ([], [0]))
+        if latency is None:
+            by_label[label][1][0] += 1
+        else:
+            by_label[label][0].append(latency)
+    return LoadResult(
+        [latency for _, latency in samples if latency is not None],
+        sum(1 for _, latency in samples if latency is None),
+        seconds,
+        by_label={label: LoadResult(latencies, errors[0], seconds) for label, (latencies, errors) in by_label.items()},
+    )
+
+
+@contextmanager
+def serve(argv, base_url, env=None, ready_path='/health/', timeout=60):
+    """Run the server command ``argv`` until the block exits.
+
+    Waits until ``ready_path`` answers before entering the block, then stops
+    the server's process group (so its workers go too) afterwards.
+    """
+    process = subprocess.Popen(
+        argv,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    url = urlsplit(base_url)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f'{argv[0]} exited with status {process.returncode}')
+            try:
+                connection = http.client.HTTPConnection(url.hostname, url.port, timeout=5)
+                status, _ = request(connection, ready_path, {})
+                connection.close()
+                if status < 500:
+                    break
+            except OSError:
+                pass
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f'{argv[0]} did not become ready within {timeout}s')
+            time.sleep(0.2)
+        yield process
+    finally:
+        if process.poll() is None:
+            os.killpg(process.pid, signal.SIGTERM)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
@@ -0,0 +1,178 @@
+import json
+import multiprocessing
+import os
+import queue as queue_module
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'filebased': 'django.core.cache.backends.filebased.FileBasedCache',
+    'shared': 'finance.sharedcache.SharedMemoryCache',
+}
+INCREMENTS = 1000
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def make_value(size):
+    """A dashboard-like context of about ``size`` pickled bytes"""
+    rows = max(1, size // 60)
+    return {'totals': {'income': 1234.5, 'expenses': 987.25}, 'rows': [
+        {'category': f'Category {index}', 'amount': index * 1.25, 'count': index} for index in range(rows)
+    ]}
+
+
+def work(path, location, options, seed, results):
+    """One worker process: a read-mostly workload over shared keys, then increments of one counter"""
+    cache = import_string(path)(location, {'TIMEOUT': 300, 'OPTIONS': {'MAX_ENTRIES': options['keys'] * 2}})
+    value = make_value(options['value_size'])
+    rng = random.Random(seed)
+    hits = misses = writes = 0
+    deadline = time.perf_counter() + options['duration']
+    while time.perf_counter() < deadline:
+        key = f"benchmark:{rng.randrange(options['keys'])}"
+        if rng.random() < options['writes']:
+            cache.set(key, value)
+            writes += 1
+        elif cache.get(key) is None:
+            # A miss computes and stores the value, as the dashboard does
+            cache.set(key, value)
+            misses += 1
+        else:
+            hits += 1
+    for _ in range(INCREMENTS):
+        cache.incr('benchmark:counter')
+    results.put({'hits': hits, 'misses': misses, 'writes': writes})
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the local-memory, file-based and shared-memory (finance.sharedcache) cache '
+        'backends: per-operation latency in one process, then throughput, hit rate and lost '
+        'increments with several processes working on the same keys, as Gunicorn workers do.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends', default=','.join(BACKENDS), help=f"Backends to compare (default: '{','.join(BACKENDS)}')",
+        )
+        parser.add_argument('--operations', type=int, default=2000, help='Operations per latency test (default: 2,000)')
+        parser.add_argument('--processes', type=int, default=4, help='Concurrent processes (default: 4)')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds of the concurrent test (default: 5)')
+        parser.add_argument('--keys', type=int, default=1000, help='Distinct keys of the concurrent test (default: 1,000)')
+        parser.add_argument('--value-size', type=int, default=2048, help='Approximate pickled value size (default: 2,048)')
+        parser.add_argument('--writes', type=float, default=0.05, help='Share of operations that are writes (default: 0.05)')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['backends'].split(',') if name.strip()]
+        for name in names:
+            if name not in BACKENDS:
+                raise CommandError(f"Unknown backend '{name}': choose from {', '.join(BACKENDS)}.")
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('The concurrent test needs processes started with fork.')
+
+        shm = '/dev/shm' if os.path.isdir('/dev/shm') else None
+        results = {}
+        for name in names:
+            directory = tempfile.mkdtemp(prefix='finance-cache-benchmark-', dir=shm if name == 'shared' else None)
+            location = os.path.join(directory, 'cache') if name == 'shared' else directory
+            try:
+                results[name] = {
+                    'latency': self.latency(BACKENDS[name], location, options),
+                    'concurrent': self.concurrent(BACKENDS[name], location, options),
+                }
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"Latency in one process, {options['operations']:,} operations, ~{options['value_size']} byte values")
+        self.stdout.write(f"{'backend':<11}{'operation':<11}{'mean us':>10}{'p99 us':>10}")
+        for name, result in results.items():
+            for operation, figures in result['latency'].items():
+                self.stdout.write(f"{name:<11}{operation:<11}{figures['mean_us']:>10.1f}{figures['p99_us']:>10.1f}")
+        self.stdout.write('')
+        self.stdout.write(
+            f"{options['processes']} processes for {options['duration']:g}s on {options['keys']:,} keys, "
+            f"{options['writes']:.0%} writes, then {INCREMENTS:,} increments each"
+        )
+        self.stdout.write(f"{'backend':<11}{'ops/s':>10}{'hit rate':>10}{'misses':>10}{'counter':>10}{'expected':>10}")
+        for name, result in results.items():
+            figures = result['concurrent']
+            self.stdout.write(
+                f"{name:<11}{figures['ops_per_second']:>10,.0f}{figures['hit_rate']:>10.1%}{figures['misses']:>10,}"
+                f"{figures['counter']:>10,}{figures['expected_counter']:>10,}"
+            )
+
+    def latency(self, path, location, options):
+        """Mean and p99 microseconds of get (hit and miss), set and incr"""
+        cache = import_string(path)(location, {'TIMEOUT': 300, 'OPTIONS': {'MAX_ENTRIES': options['operations'] * 2}})
+        cache.clear()
+        value = make_value(options['value_size'])
+        count = options['operations']
+        cache.set('benchmark:counter', 0)
+        operations = {
+            'set': lambda index: cache.set(f'benchmark:{index}', value),
+            'get hit': lambda index: cache.get(f'benchmark:{index}'),
+            'get miss': lambda index: cache.get(f'benchmark:missing:{index}'),
+            'incr': lambda index: cache.incr('benchmark:counter'),
+        }
+        figures = {}
+        for operation, run in operations.items():
+            samples = []
+            for index in range(count):
+                started = time.perf_counter()
+                run(index)
+                samples.append(time.perf_counter() - started)
+            figures[operation] = {
+                'mean_us': round(sum(samples) / count * 1e6, 2),
+                'p99_us': round(percentile(samples, 0.99) * 1e6, 2),
+            }
+        cache.clear()
+        return figures
+
+    def concurrent(self, path, location, options):
+        """Throughput and hit rate of processes sharing keys, and whether their increments all count"""
+        cache = import_string(path)(location, {'TIMEOUT': 300, 'OPTIONS': {'MAX_ENTRIES': options['keys'] * 2}})
+        cache.clear()
+        cache.set('benchmark:counter', 0)
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        processes = [
+            context.Process(target=work, args=(path, location, options, seed, queue))
+            for seed in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        totals = {'hits': 0, 'misses': 0, 'writes': 0}
+        for _ in processes:
+            try:
+                result = queue.get(timeout=options['duration'] + 120)
+            except queue_module.Empty:
+                raise CommandError(f'A {path} worker process did not finish.')
+            for key, value in result.items():
+                totals[key] += value
+        for process in processes:
+            process.join()
+        operations = sum(totals.values())
+        # A cache private to each process never sees the workers' increments
+        counter = cache.get('benchmark:counter')
+        cache.clear()
+        return {
+            **totals,
+            'ops_per_second': round(operations / options['duration'], 1),
+            'hit_rate': round(totals['hits'] / max(1, totals['hits'] + totals['misses']), 4),
+            'counter': counter,
+            'expected_counter': INCREMENTS * options['processes'],
+        }
@@ -0,0 +1,131 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from finance import pool
+
+POOLED_ENGINES = {
+    'postgresql': 'finance.backends.postgresql',
+    'sqlite': 'finance.backends.sqlite3',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure connection setup overhead: simulate requests from concurrent threads '
+        'that each run one query against the configured database, with a connection per '
+        'request (CONN_MAX_AGE=0), persistent connections and the in-process pool.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per strategy (default: 2,000)')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent request threads (default: 8)')
+        parser.add_argument('--pool-size', type=int, default=4, help='Pool size for the pooled strategy (default: 4)')
+        parser.add_argument('--query', default='SELECT 1', help="Query run per request (default: 'SELECT 1')")
+        parser.add_argument('--database', default='default', help='Database alias to benchmark (default: default)')
+
+    def handle(self, *args, **options):
+        base = connections[options['database']]
+        if base.vendor not in POOLED_ENGINES:
+            raise CommandError(f'No pooled backend for {base.vendor}.')
+        if base.vendor == 'sqlite' and base.is_in_memory_db():
+            raise CommandError('Benchmark a file or server database; in-memory SQLite never reconnects.')
+
+        strategies = [
+            ('per request', {'CONN_MAX_AGE': 0}),
+            ('persistent', {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True}),
+            ('pooled', {
+                'ENGINE': POOLED_ENGINES[base.vendor],
+                'CONN_MAX_AGE': 0,
+                'POOL': {'MAX_SIZE': options['pool_size'], 'TIMEOUT': 30},
+            }),
+        ]
+        self.stdout.write(
+            f"{options['requests']:,} requests from {options['threads']} threads on {base.vendor} "
+            f"({base.settings_dict['NAME']})\n"
+        )
+        self.stdout.write(
+            f"{'strategy':<14}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'connect ms':>12}{'connects':>10}{'opened':>8}"
+        )
+        for label, overrides in strategies:
+            alias = f"benchmark_{label.replace(' ', '_')}"
+            connections.settings[alias] = {**base.settings_dict, **overrides}
+            try:
+                result = self.run(alias, options)
+            finally:
+                del connections.settings[alias]
+            self.stdout.write(
+                f"{label:<14}{result['throughput']:>10.1f}{result['p50']:>10.3f}{result['p95']:>10.3f}"
+                f"{result['connect']:>12.3f}{result['connects']:>10}{result['opened']:>8}"
+            )
+            if result['pool']:
+                stats = result['pool']
+                self.stdout.write(
+                    f"{'':<14}pool: {stats['checkouts']} checkouts, {stats['waits']} waits, "
+                    f"{stats['wait_time_ms'] / max(stats['checkouts'], 1):.3f}ms mean wait, "
+                    f"{stats['max_wait_time_ms']:.3f}ms max wait"
+                )
+
+    def run(self, alias, options):
+        per_thread = options['requests'] // options['threads']
+        latencies, connect_times = [], []
+        opened = []
+        lock = threading.Lock()
+
+        def count(sender, connection, **kwargs):
+            if connection.alias == alias:
+                with lock:
+                    opened.append(connection)
+
+        def worker():
+            connection = connections[alias]
+            own_latencies, own_connects = [], []
+            for _ in range(per_thread):
+                started = time.perf_counter()
+                # The request_started/request_finished handlers call this
+                connection.close_if_unusable_or_obsolete()
+                connection.ensure_connection()
+                connected = time.perf_counter()
+                with connection.cursor() as cursor:
+                    cursor.execute(options['query'])
+                    cursor.fetchall()
+                connection.close_if_unusable_or_obsolete()
+                own_latencies.append((time.perf_counter() - started) * 1000)
+                own_connects.append((connected - started) * 1000)
+            connection.close()
+            with lock:
+                latencies.extend(own_latencies)
+                connect_times.extend(own_connects)
+
+        connection_created.connect(count)
+        try:
+            threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count)
+
+        pool_stats = None
+        if 'POOL' in connections.settings[alias] and connections.settings[alias]['ENGINE'] in POOLED_ENGINES.values():
+            connection_pool = pool.get_pool(alias, connections.settings[alias])
+            pool_stats = connection_pool.stats()
+            connection_pool.close()
+
+        latencies.sort()
+        return {
+            'throughput': len(latencies) / elapsed,
+            'p50': statistics.median(latencies),
+            'p95': latencies[int(len(latencies) * 0.95) - 1],
+            'connect': statistics.mean(connect_times),
+            'connects': len(opened),
+            'opened': pool_stats['created'] if pool_stats else len(opened),
+            'pool': pool_stats,
+        }
@@ -0,0 +1,256 @@
+import json
+import shutil
+import sys
+import time
+from contextlib import ExitStack
+from datetime import date, datetime
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from finance import loadtest, seeding, sharding
+from finance.models import Transaction
+from finance.urls import get_urlpatterns
+
+USERNAME_PREFIX = 'benchmark-load-'
+SERVERS = ('wsgi', 'gthread', 'asgi')
+SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+
+
+def parse_tier(value):
+    """Number of transactions in a tier written as ``1000``, ``100k`` or ``1m``"""
+    value = value.strip().lower()
+    try:
+        if value[-1:] in SUFFIXES:
+            return int(float(value[:-1]) * SUFFIXES[value[-1]])
+        return int(value)
+    except ValueError:
+        raise CommandError(f"Invalid tier '{value}': use a number such as 1000, 100k or 1m.")
+
+
+def _ms(value):
+    return '-' if value is None else f'{value:.1f}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test every URL of the app with concurrent authenticated clients on seeded data '
+        'tiers (1k, 100k and 1M transactions by default, generated like seed_finance), reporting '
+        'p50/p95/p99 latency, throughput and queries per request, and saving them as JSON '
+        'that --compare reads back. Runs offline against the configured database, which must '
+        'be migrated and reachable from other processes; seeded users are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tiers', default='1k,100k,1m', help="Transactions per tier (default: '1k,100k,1m')")
+        parser.add_argument('--users', type=int, default=100, help='Users sharing the transactions of a tier (default: 100)')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients (default: 16)')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds measured per tier (default: 10)')
+        parser.add_argument('--warmup', type=float, default=2.0, help='Unmeasured seconds before each run (default: 2)')
+        parser.add_argument('--server', default='wsgi', choices=SERVERS, help='Server mode of gunicorn.conf.py (default: wsgi)')
+        parser.add_argument(
+            '--workers', type=int,
+            help='Gunicorn worker processes (default: sized for this machine by gunicorn.conf.py)',
+        )
+        parser.add_argument(
+            '--cache', action='store_true',
+            help='Keep the dashboard cache on; by default it is disabled so every request runs its queries',
+        )
+        parser.add_argument(
+            '--output', help='JSON file to write the results to (default: benchmark-load-<timestamp>.json)',
+        )
+        parser.add_argument('--compare', help='Earlier results file to compare p95 latency and throughput with')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated data')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded users and their data afterwards')
+
+    def handle(self, *args, **options):
+        if shutil.which('gunicorn') is None:
+            raise CommandError('gunicorn is not installed.')
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError('The server cannot share an in-memory SQLite database.')
+        tiers = [(name.strip(), parse_tier(name)) for name in options['tiers'].split(',') if name.strip()]
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read {options['compare']}: {exc}")
+
+        report = {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'vendor': connection.vendor,
+            'server': options['server'],
+            'workers': options['workers'],
+            'concurrency': options['concurrency'],
+            'duration': options['duration'],
+            'cache': options['cache'],
+            'seed': options['seed'],
+            'tiers': {},
+        }
+        for name, rows in tiers:
+            report['tiers'][name] = self.run_tier(name, rows, options)
+
+        output = options['output'] or f"benchmark-load-{datetime.now():%Y%m%d-%H%M%S}.json"
+        with open(output, 'w') as file:
+            json.dump(report, file, indent=2)
+        self.print_report(report)
+        if baseline:
+            self.print_comparison(baseline, report)
+        self.stdout.write(f'Wrote results to {output}')
+
+    def run_tier(self, name, rows, options):
+        users = max(1, min(options['users'], rows))
+        seeding.delete_users(USERNAME_PREFIX)
+        started = time.perf_counter()
+        # Busiest user first
+        seeded = seeding.create_users(users, USERNAME_PREFIX)
+        # Histories up to today, so the dashboard's current month has data to show
+        seeding.seed(seeded, rows, seed=options['seed'], end_date=date.today())
+        seed_seconds = time.perf_counter() - started
+        self.stdout.write(
+            f'Seeded tier {name}: {rows:,} transactions for {users} users on {connection.vendor} in {seed_seconds:.1f}s'
+        )
+
+        session_keys = []
+        try:
+            targets = [self.targets(user) for user in seeded[:options['concurrency']]]
+            queries = self.count_queries(seeded[0], targets[0], options)
+            # Clients act as the users in turn, from the busiest down
+            sessions = []
+            for index in range(min(users, options['concurrency'])):
+                cookie = loadtest.login_cookie(seeded[index])
+                session_keys.append(cookie.split('=', 1)[1])
+                sessions.append((loadtest.csrf_headers(cookie), targets[index]))
+            result = self.measure(name, sessions, options)
+        finally:
+            Session.objects.filter(session_key__in=session_keys).delete()
+            if not options['keep']:
+                seeding.delete_users(USERNAME_PREFIX)
+
+        urls = {}
+        for label, count in queries.items():
+            by_label = result.by_label.get(label)
+            urls[label] = {**(by_label.as_dict() if by_label else {}), 'queries': count}
+        return {
+            'rows': rows,
+            'users': users,
+            'seed_seconds': round(seed_seconds, 1),
+            'total': result.as_dict(),
+            'urls': urls,
+        }
+
+    def targets(self, user):
+        """One request per URL of the app for ``user``; detail URLs use their first transaction, if any"""
+        with sharding.for_user(user.pk):
+            first = Transaction.objects.filter(user=user).order_by('pk')[:5]
+            first = list(first.values('pk', 'description'))
+        targets = []
+        for pattern in get_urlpatterns():
+            if not first and ('pk' in pattern.pattern.converters or pattern.name == 'api-transactions-batch'):
+                continue
+            kwargs = {'pk': first[0]['pk']} if 'pk' in pattern.pattern.converters else {}
+            body = None
+            if pattern.name == 'api-transactions-batch':
+                # Updates that change nothing, so the data stays the same however long the run
+                body = {'operations': [
+                    {'op': 'update', 'id': row['pk'], 'data': {'description': row['description']}} for row in first
+                ]}
+            targets.append(loadtest.Target(reverse(pattern.name, kwargs=kwargs), label=pattern.name, body=body))
+        return targets
+
+    def count_queries(self, user, targets, options):
+        """Queries made by each target for ``user``, on every database, once caches are warm"""
+        client = Client()
+        client.force_login(user)
+        overrides = {'ALLOWED_HOSTS': ['*']}
+        if not options['cache']:
+            overrides['DASHBOARD_CACHE_TIMEOUT'] = 0
+        counts = {}
+        with override_settings(**overrides):
+            for target in targets:
+                self.send(client, target)
+                with ExitStack() as stack:
+                    captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                    self.send(client, target)
+                counts[target.label] = sum(len(context) for context in captured)
+        client.logout()
+        return counts
+
+    def send(self, client, target):
+        if target.body is None:
+            response = client.get(target.path)
+        else:
+            response = client.post(target.path, json.dumps(target.body), content_type='application/json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        if response.status_code >= 400:
+            raise CommandError(f'{target.method} {target.path} failed with status {response.status_code}.')
+
+    def measure(self, name, sessions, options):
+        port = loadtest.free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        argv = [
+            sys.executable, '-m', 'gunicorn',
+            '--config', str(settings.BASE_DIR / 'gunicorn.conf.py'),
+            '--bind', f'127.0.0.1:{port}',
+        ]
+        if options['workers']:
+            argv += ['--workers', str(options['workers'])]
+        env = {'DEBUG': 'False', 'SERVER_MODE': options['server']}
+        if not options['cache']:
+            env['DASHBOARD_CACHE_TIMEOUT'] = '0'
+
+        self.stdout.write(
+            f"Measuring tier {name} on {options['server']} with {options['concurrency']} clients "
+            f"for {options['duration']:g}s..."
+        )
+        with loadtest.serve(argv, base_url, env=env):
+            return loadtest.run(
+                base_url, None,
+                concurrency=options['concurrency'],
+                duration=options['duration'],
+                warmup=options['warmup'],
+                sessions=sessions,
+            )
+
+    def print_report(self, report):
+        for name, tier in report['tiers'].items():
+            total = tier['total']
+            self.stdout.write('')
+            self.stdout.write(
+                f"Tier {name}: {tier['rows']:,} transactions, {tier['users']} users, "
+                f"{total['throughput']:.1f} req/s, {total['errors']} errors"
+            )
+            self.stdout.write(
+                f"{'url':<26}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}"
+            )
+            for label, result in tier['urls'].items():
+                self.stdout.write(
+                    f"{label:<26}{result.get('throughput', 0):>9.1f}{_ms(result.get('p50_ms')):>9}"
+                    f"{_ms(result.get('p95_ms')):>9}{_ms(result.get('p99_ms')):>9}"
+                    f"{result['queries']:>9}{result.get('errors', 0):>8}"
+                )
+
+    def print_comparison(self, baseline, report):
+        self.stdout.write('')
+        self.stdout.write(f"Compared with the run of {baseline.get('started_at', 'unknown')}:")
+        self.stdout.write(f"{'tier':<6}{'url':<26}{'p95 ms':>19}{'req/s':>17}{'queries':>10}")
+        for name, tier in report['tiers'].items():
+            old_tier = baseline.get('tiers', {}).get(name)
+            if not old_tier:
+                continue
+            rows = [('total', tier['total'], old_tier['total'])]
+            rows += [(label, result, old_tier['urls'][label]) for label, result in tier['urls'].items()
+                     if label in old_tier.get('urls', {})]
+            for label, new, old in rows:
+                queries = f"{old['queries']}->{new['queries']}" if 'queries' in new else ''
+                self.stdout.write(
+                    f"{name:<6}{label:<26}{_ms(old.get('p95_ms')):>9}->{_ms(new.get('p95_ms')):<8}"
+                    f"{old.get('throughput', 0):>8.1f}->{new.get('throughput', 0):<7.1f}{queries:>10}"
+                )
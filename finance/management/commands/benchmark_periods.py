@@ -0,0 +1,108 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from finance import periods
+from finance.models import Category, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare date__month/date__year filtering with half-open date ranges. '
+        'Seeds transactions inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Transactions to seed (default: 1,000,000)')
+        parser.add_argument('--users', type=int, default=20, help='Users to spread the rows across (default: 20)')
+        parser.add_argument('--years', type=int, default=5, help='Years of history to generate (default: 5)')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query (default: 20)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated data')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.seed(options)
+            self.run(user, options)
+            transaction.set_rollback(True)
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        users = [
+            User.objects.create(username=f'benchmark-periods-{index}')
+            for index in range(options['users'])
+        ]
+        categories = {
+            user.pk: [
+                Category.objects.create(user=user, name=f'Category {index}')
+                for index in range(10)
+            ]
+            for user in users
+        }
+
+        first_day = date.today().replace(day=1) - timedelta(days=365 * options['years'])
+        span = (date.today() - first_day).days
+        started = time.perf_counter()
+        batch = []
+        for row in range(options['rows']):
+            user = users[row % len(users)]
+            batch.append(Transaction(
+                user=user,
+                type='Expense' if rng.random() < 0.8 else 'Income',
+                amount=Decimal(rng.randint(100, 50000)) / 100,
+                date=first_day + timedelta(days=rng.randrange(span)),
+                category=rng.choice(categories[user.pk]),
+                description='Benchmark transaction',
+            ))
+            if len(batch) == 10_000:
+                Transaction.objects.bulk_create(batch)
+                batch = []
+        Transaction.objects.bulk_create(batch)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        self.stdout.write(
+            f"Seeded {options['rows']:,} transactions for {len(users)} users "
+            f'in {time.perf_counter() - started:.1f}s on {connection.vendor}'
+        )
+        return users[0]
+
+    def run(self, user, options):
+        today = date.today()
+        last_month = periods.resolve('month', today.replace(day=1) - timedelta(days=1))
+        base = Transaction.objects.filter(user=user, type='Expense')
+
+        variants = [
+            ('date__month/date__year', base.filter(
+                date__month=last_month.start.month,
+                date__year=last_month.start.year,
+            )),
+            ('half-open range', base.within(last_month)),
+        ]
+        results = []
+        for label, queryset in variants:
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                total = queryset.aggregate(total=Sum('amount'))['total']
+                timings.append((time.perf_counter() - started) * 1000)
+            results.append((label, total, statistics.median(timings), min(timings)))
+
+        for label, queryset in variants:
+            self.stdout.write(f'\n{label} plan:')
+            self.stdout.write(queryset.values('amount').explain())
+
+        self.stdout.write('')
+        self.stdout.write(f"{'query':<26}{'median ms':>12}{'best ms':>12}  total")
+        for label, total, median, best in results:
+            self.stdout.write(f'{label:<26}{median:>12.2f}{best:>12.2f}  {total or 0:.2f}')
+
+        baseline, ranged = results[0][2], results[1][2]
+        if ranged:
+            self.stdout.write(self.style.SUCCESS(f'\nHalf-open range is {baseline / ranged:.1f}x faster'))
@@ -0,0 +1,121 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from finance.models import Category, Transaction
+
+MERCHANTS = [
+    'Amazon', 'Tesco', 'Lidl', 'Aldi', 'Shell', 'Uber', 'Netflix', 'Spotify', 'Starbucks', 'Costa',
+    'Ikea', 'Zara', 'Apple', 'Steam', 'Airbnb', 'Ryanair', 'Decathlon', 'Boots', 'Pret', 'Deliveroo',
+]
+WORDS = [
+    'coffee', 'groceries', 'fuel', 'rent', 'salary', 'refund', 'subscription', 'ticket', 'dinner', 'lunch',
+    'gift', 'books', 'pharmacy', 'parking', 'insurance', 'electricity', 'water', 'internet', 'phone', 'gym',
+    'taxi', 'hotel', 'flight', 'shoes', 'jacket', 'furniture', 'repair', 'haircut', 'cinema', 'concert',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare icontains with indexed full-text search on Transaction.description. '
+        'Seeds transactions inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Transactions to seed (default: 1,000,000)')
+        parser.add_argument('--users', type=int, default=20, help='Users to spread the rows across (default: 20)')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query (default: 20)')
+        parser.add_argument('--query', default='coffee starb', help="Search text to time (default: 'coffee starb')")
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated data')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.seed(options)
+            self.run(user, options)
+            transaction.set_rollback(True)
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        users = [
+            User.objects.create(username=f'benchmark-search-{index}')
+            for index in range(options['users'])
+        ]
+        categories = {
+            user.pk: [
+                Category.objects.create(user=user, name=f'Category {index}')
+                for index in range(10)
+            ]
+            for user in users
+        }
+
+        first_day = date.today() - timedelta(days=365 * 3)
+        started = time.perf_counter()
+        batch = []
+        for row in range(options['rows']):
+            user = users[row % len(users)]
+            batch.append(Transaction(
+                user=user,
+                type='Expense' if rng.random() < 0.8 else 'Income',
+                amount=Decimal(rng.randint(100, 50000)) / 100,
+                date=first_day + timedelta(days=rng.randrange(365 * 3)),
+                category=rng.choice(categories[user.pk]),
+                description=' '.join([rng.choice(MERCHANTS)] + rng.sample(WORDS, 2) + [f'#{rng.randrange(100000)}']),
+            ))
+            if len(batch) == 10_000:
+                Transaction.objects.bulk_create(batch)
+                batch = []
+        Transaction.objects.bulk_create(batch)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        self.stdout.write(
+            f"Seeded {options['rows']:,} transactions for {len(users)} users "
+            f'in {time.perf_counter() - started:.1f}s on {connection.vendor}'
+        )
+        return users[0]
+
+    def run(self, user, options):
+        text = options['query']
+        base = Transaction.objects.filter(user=user)
+        icontains = base
+        for word in text.split():
+            icontains = icontains.filter(description__icontains=word)
+
+        variants = [
+            ('icontains, first page', lambda: list(icontains.order_by('-date', '-created_at', '-id')[:20])),
+            ('icontains, count', icontains.count),
+            ('full-text, ranked page', lambda: list(
+                base.search(text).order_by('-search_rank', '-date', '-created_at', '-id')[:20]
+            )),
+            ('full-text, count', base.search(text).count),
+            ('full-text + type, ranked page', lambda: list(
+                base.filter(type='Expense').search(text).order_by('-search_rank', '-date', '-created_at', '-id')[:20]
+            )),
+        ]
+        results = []
+        for label, query in variants:
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                result = query()
+                timings.append((time.perf_counter() - started) * 1000)
+            size = result if isinstance(result, int) else len(result)
+            results.append((label, size, statistics.median(timings), min(timings)))
+
+        self.stdout.write('\nfull-text, ranked page plan:')
+        self.stdout.write(base.search(text).order_by('-search_rank', '-date')[:20].explain())
+
+        self.stdout.write('')
+        self.stdout.write(f"{'query':<32}{'median ms':>12}{'best ms':>12}  rows")
+        for label, size, median, best in results:
+            self.stdout.write(f'{label:<32}{median:>12.2f}{best:>12.2f}  {size}')
+
+        slowest = max(median for label, _, median, _ in results if label.startswith('full-text'))
+        style = self.style.SUCCESS if slowest < 50 else self.style.WARNING
+        self.stdout.write(style(f'\nSlowest full-text query: {slowest:.1f}ms median (target: < 50ms)'))
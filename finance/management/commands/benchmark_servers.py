@@ -0,0 +1,144 @@
+import json
+import random
+import shutil
+import sys
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from finance import loadtest, rollups, sharding
+from finance.models import Budget, Category, Transaction
+
+USERNAME = 'benchmark-servers'
+SERVERS = ('wsgi', 'gthread', 'asgi')
+PATHS = [
+    '/dashboard/',
+    '/transactions/',
+    '/transactions/?pagination=cursor',
+    '/categories/',
+    '/budgets/',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare latency and throughput of the server modes of gunicorn.conf.py under '
+        'concurrent load: sync WSGI workers, threaded WSGI workers and ASGI workers with '
+        'the async views. Starts each server against the configured database, which must '
+        'be migrated and reachable from other processes; the seeded user is deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20_000, help='Transactions to seed (default: 20,000)')
+        parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients (default: 32)')
+        parser.add_argument('--duration', type=float, default=15.0, help='Seconds measured per server (default: 15)')
+        parser.add_argument(
+            '--workers', type=int,
+            help='Gunicorn worker processes (default: sized for this machine by gunicorn.conf.py)',
+        )
+        parser.add_argument('--threads', type=int, help='Threads per gthread worker (default: from gunicorn.conf.py)')
+        parser.add_argument(
+            '--servers', default=','.join(SERVERS), help=f"Server modes to compare (default: '{','.join(SERVERS)}')",
+        )
+        parser.add_argument(
+            '--cache', action='store_true',
+            help='Keep the dashboard cache on; by default it is disabled so every request runs its queries',
+        )
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated data')
+
+    def handle(self, *args, **options):
+        if shutil.which('gunicorn') is None:
+            raise CommandError('gunicorn is not installed.')
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError('The servers cannot share an in-memory SQLite database.')
+
+        servers = [name.strip() for name in options['servers'].split(',') if name.strip()]
+        for name in servers:
+            if name not in SERVERS:
+                raise CommandError(f"Unknown server '{name}': choose from {', '.join(SERVERS)}.")
+
+        user = self.seed(options)
+        cookie = loadtest.login_cookie(user)
+        try:
+            results = {name: self.measure(name, cookie, options) for name in servers}
+        finally:
+            Session.objects.filter(session_key=cookie.split('=', 1)[1]).delete()
+            user.delete()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'server':<9}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'requests':>10}{'errors':>8}"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<9}{result['throughput']:>10.1f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+                f"{result['p99_ms']:>10.1f}{result['requests']:>10}{result['errors']:>8}"
+            )
+
+    def seed(self, options):
+        User.objects.filter(username=USERNAME).delete()
+        rng = random.Random(options['seed'])
+        user = User.objects.create(username=USERNAME)
+        with sharding.for_user(user.pk):
+            self.seed_data(user, rng, options)
+        self.stdout.write(f"Seeded {options['rows']:,} transactions for {USERNAME} on {connection.vendor}")
+        return user
+
+    def seed_data(self, user, rng, options):
+        categories = [Category.objects.create(user=user, name=f'Category {index}') for index in range(10)]
+        for period, _ in Budget.PERIOD_CHOICES:
+            for category in categories[:3]:
+                Budget.objects.create(user=user, category=category, limit=Decimal('500.00'), period=period)
+
+        today = date.today()
+        batch = []
+        for row in range(options['rows']):
+            batch.append(Transaction(
+                user=user,
+                type='Expense' if rng.random() < 0.8 else 'Income',
+                amount=Decimal(rng.randint(100, 50000)) / 100,
+                date=today - timedelta(days=rng.randrange(365 * 2)),
+                category=rng.choice(categories),
+                description=f'Transaction {row}',
+            ))
+            if len(batch) == 10_000:
+                Transaction.objects.bulk_create(batch)
+                batch = []
+        Transaction.objects.bulk_create(batch)
+        rollups.rebuild(user)
+
+    def measure(self, name, cookie, options):
+        port = loadtest.free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        argv = [
+            sys.executable, '-m', 'gunicorn',
+            '--config', str(settings.BASE_DIR / 'gunicorn.conf.py'),
+            '--bind', f'127.0.0.1:{port}',
+        ]
+        if options['workers']:
+            argv += ['--workers', str(options['workers'])]
+        if options['threads'] and name == 'gthread':
+            # More than one thread would turn sync workers into gthread ones
+            argv += ['--threads', str(options['threads'])]
+        env = {'DEBUG': 'False', 'SERVER_MODE': name}
+        if not options['cache']:
+            env['DASHBOARD_CACHE_TIMEOUT'] = '0'
+
+        self.stdout.write(f"Measuring {name} with {options['concurrency']} clients for {options['duration']:g}s...")
+        with loadtest.serve(argv, base_url, env=env):
+            result = loadtest.run(
+                base_url, PATHS,
+                concurrency=options['concurrency'],
+                duration=options['duration'],
+                headers={'Cookie': cookie},
+            )
+        return result.as_dict()
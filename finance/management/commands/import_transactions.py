@@ -0,0 +1,56 @@
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from finance import sharding
+from finance.importers import ImportFileError, import_transactions
+
+
+class Command(BaseCommand):
+    help = 'Import transactions for a user from a CSV file (columns: date, type, amount, category, description)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Owner of the imported transactions')
+        parser.add_argument('path', help="CSV file to read, or '-' for standard input")
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows committed per database transaction (default: 5000)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT statement (default: 1000)')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist")
+
+        started = time.perf_counter()
+        try:
+            if options['path'] == '-':
+                result = self.run_import(user, sys.stdin, options)
+            else:
+                with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                    result = self.run_import(user, stream, options)
+        except OSError as exc:
+            raise CommandError(str(exc))
+        except ImportFileError as exc:
+            raise CommandError(f'Cannot import file: {exc}')
+        elapsed = time.perf_counter() - started
+
+        for row in result.errors:
+            problems = '; '.join(f"{field}: {' '.join(messages)}" for field, messages in row['errors'].items())
+            self.stderr.write(f"line {row['line']}: {problems}")
+
+        rate = result.created / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} transactions ({result.categories_created} new categories) '
+            f'in {elapsed:.2f}s ({rate:,.0f} rows/s); {result.error_count} rows rejected.'
+        ))
+
+    def run_import(self, user, stream, options):
+        with sharding.for_user(user.pk):
+            return import_transactions(
+                user,
+                stream,
+                chunk_size=options['chunk_size'],
+                batch_size=options['batch_size'],
+            )
@@ -0,0 +1,26 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from finance import sharding
+
+
+class Command(BaseCommand):
+    help = 'Apply migrations to the default database and to every shard in SHARD_DATABASES'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plan', action='store_true', help='Show the migrations that would run on each database')
+
+    def handle(self, *args, **options):
+        databases = [DEFAULT_DB_ALIAS] + [alias for alias in sharding.get_shards() if alias != DEFAULT_DB_ALIAS]
+        for alias in databases:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'Database {alias}:'))
+            call_command(
+                'migrate',
+                database=alias,
+                interactive=False,
+                plan=options['plan'],
+                verbosity=options['verbosity'],
+                stdout=self.stdout,
+                stderr=self.stderr,
+            )
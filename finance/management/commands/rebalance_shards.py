@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from finance import sharding
+
+
+class Command(BaseCommand):
+    help = (
+        "Move users' finance data to the shard their id hashes to, after shards were added "
+        'or removed or when enabling sharding on an existing database. Moved rows get new ids.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='List the moves without making them')
+
+    def handle(self, *args, **options):
+        shards = sharding.get_shards()
+        if not shards:
+            raise CommandError('Sharding is not enabled; set DATABASE_SHARDS.')
+
+        moves = []
+        for source in [DEFAULT_DB_ALIAS] + [alias for alias in shards if alias != DEFAULT_DB_ALIAS]:
+            for user_id in sorted(sharding.user_ids(source)):
+                target = sharding.shard_for(user_id)
+                if target != source:
+                    moves.append((user_id, source, target))
+
+        known = set(User.objects.filter(pk__in={user_id for user_id, _, _ in moves}).values_list('pk', flat=True))
+        for user_id, source, target in moves:
+            if user_id not in known:
+                self.stderr.write(f'user={user_id}: not in {DEFAULT_DB_ALIAS}, left on {source}')
+                continue
+            if options['dry_run']:
+                self.stdout.write(f'user={user_id}: {source} -> {target}')
+                continue
+            moved = sharding.move_user(user_id, source, target)
+            counts = ', '.join(f'{count} {name}' for name, count in moved.items())
+            self.stdout.write(f'user={user_id}: {source} -> {target} ({counts})')
+
+        users = sum(1 for user_id, _, _ in moves if user_id in known)
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {users} user(s).'))
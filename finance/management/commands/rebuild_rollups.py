@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from finance import rollups, sharding
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the monthly transaction rollups used by the dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Only process the user with this username (default: all users)',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Report drift between rollups and transactions without writing anything',
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+
+        # Rollups live next to the transactions they summarize, on every shard
+        if user is not None:
+            databases = [sharding.shard_for(user.pk)]
+        else:
+            databases = sharding.get_shards() or [DEFAULT_DB_ALIAS]
+
+        if options['verify']:
+            mismatches = []
+            for alias in databases:
+                with sharding.use_shard(alias):
+                    mismatches += rollups.verify(user)
+            for key, expected, actual in mismatches:
+                user_id, category_id, year, month, type = key
+                self.stdout.write(
+                    f'user={user_id} category={category_id} {year}-{month:02d} {type}: '
+                    f'expected {expected[0]} ({expected[1]} rows), stored {actual[0]} ({actual[1]} rows)'
+                )
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} rollup row(s) out of date; run without --verify to rebuild')
+            self.stdout.write(self.style.SUCCESS('Rollups are consistent with transactions.'))
+            return
+
+        written = 0
+        for alias in databases:
+            with sharding.use_shard(alias):
+                written += rollups.rebuild(user)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} rollup row(s).'))
+
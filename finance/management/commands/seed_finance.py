@@ -0,0 +1,95 @@
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from finance import seeding, sharding
+
+
+def parse_end_date(value):
+    """``--end-date``: ``YYYY-MM-DD``, or ``today``"""
+    return date.today() if value == 'today' else date.fromisoformat(value)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate users with categories, budgets of every period and seasonal, skewed transaction '
+        'histories for load tests and profiling. The same --seed, --users, --rows, --months and '
+        '--end-date always produce the same data. Inserts with batched multi-row INSERTs on SQLite '
+        'and COPY on PostgreSQL, where --workers processes can load users in parallel.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help='Users to create (default: 100)')
+        parser.add_argument('--rows', type=int, default=100_000, help='Transactions across all users (default: 100,000)')
+        parser.add_argument('--prefix', default='seed-user-', help="Username prefix (default: 'seed-user-')")
+        parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Zipf exponent of transactions per user; 0 spreads them evenly (default: 1.0)',
+        )
+        parser.add_argument('--months', type=int, default=24, help='Months of history (default: 24)')
+        parser.add_argument(
+            '--end-date', type=parse_end_date, default=seeding.END_DATE,
+            help=f"Last day of the history, YYYY-MM-DD or 'today' (default: {seeding.END_DATE})",
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Processes loading users in parallel; SQLite allows a single writer, so 1 there (default: 1)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000, help='Rows per INSERT statement, where COPY is not used (default: 5000)',
+        )
+        parser.add_argument('--password', help='Password of every created user (default: none, login disabled)')
+        parser.add_argument('--replace', action='store_true', help='Delete existing users with the prefix first')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['rows'] < 0 or options['months'] < 1:
+            raise CommandError('--users and --months must be positive and --rows not negative.')
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            if not options['replace']:
+                raise CommandError(f"Users named '{prefix}...' already exist; pass --replace to delete them first.")
+            self.stdout.write(f"Deleted {seeding.delete_users(prefix)} existing '{prefix}...' user(s)")
+
+        workers = options['workers']
+        if workers > 1 and not seeding.supports_parallel_writes():
+            self.stderr.write('SQLite allows a single writer; loading with 1 worker.')
+            workers = 1
+        alias = (sharding.get_shards() or [DEFAULT_DB_ALIAS])[0]
+        method = 'COPY' if connections[alias].vendor == 'postgresql' else 'batched INSERTs'
+
+        started = time.perf_counter()
+        users = seeding.create_users(options['users'], prefix, options['password'])
+        done = {'users': 0, 'rows': 0, 'reported': 0}
+
+        def progress(count):
+            done['users'] += 1
+            done['rows'] += count
+            # Report about every tenth of the rows
+            if done['rows'] - done['reported'] >= options['rows'] / 10 or done['users'] == len(users):
+                done['reported'] = done['rows']
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{done['users']}/{len(users)} users, {done['rows']:,} transactions "
+                    f"({done['rows'] / elapsed if elapsed else 0:,.0f} rows/s)"
+                )
+
+        created = seeding.seed(
+            users,
+            options['rows'],
+            seed=options['seed'],
+            skew=options['skew'],
+            end_date=options['end_date'],
+            months=options['months'],
+            workers=workers,
+            batch_size=options['batch_size'],
+            progress=progress,
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(users)} users with {created:,} transactions in {elapsed:.1f}s "
+            f"({created / elapsed if elapsed else 0:,.0f} rows/s) using {method} and {workers} worker(s)."
+        ))
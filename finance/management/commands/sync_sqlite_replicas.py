@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from finance.routers import copy_sqlite_database, get_replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary SQLite database into every SQLite read replica, standing in for '
+        'replication when trying the replica router locally'
+    )
+
+    def handle(self, *args, **options):
+        replicas = get_replicas()
+        if not replicas:
+            raise CommandError('No read replicas are configured; set DATABASE_REPLICAS.')
+        for alias in replicas:
+            try:
+                copy_sqlite_database(DEFAULT_DB_ALIAS, alias)
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(self.style.SUCCESS(f'Copied {DEFAULT_DB_ALIAS} into {alias}.'))
@@ -0,0 +1,81 @@
+import random
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db.migrations.executor import MigrationExecutor
+
+from finance import sharding
+
+
+class Command(BaseCommand):
+    help = (
+        'Wait until the database accepts connections, retrying with exponential backoff, '
+        'and with --migrate apply migrations only if some are pending. Runs in one process, '
+        'so the container start pays for a single Django boot.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to wait for (default: default)')
+        parser.add_argument('--timeout', type=float, default=150.0, help='Seconds to keep retrying (default: 150)')
+        parser.add_argument('--initial-delay', type=float, default=0.25, help='First retry delay in seconds (default: 0.25)')
+        parser.add_argument('--max-delay', type=float, default=8.0, help='Longest retry delay in seconds (default: 8)')
+        parser.add_argument(
+            '--migrate', action='store_true',
+            help='Then migrate the database, and every shard, that has unapplied migrations',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        attempts = self.wait(options)
+        self.stdout.write(
+            f"Database {options['database']} ready after {attempts} attempt(s) "
+            f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+        if not options['migrate']:
+            return
+
+        databases = [options['database']] + [alias for alias in sharding.get_shards() if alias != options['database']]
+        for alias in databases:
+            checked = time.perf_counter()
+            pending = self.pending_migrations(alias)
+            if not pending:
+                self.stdout.write(
+                    f'No migrations pending on {alias} (checked in {(time.perf_counter() - checked) * 1000:.0f} ms)'
+                )
+                continue
+            self.stdout.write(f'Applying {len(pending)} migration(s) to {alias}...')
+            call_command('migrate', database=alias, interactive=False, verbosity=options['verbosity'])
+            self.stdout.write(f'Migrated {alias} in {(time.perf_counter() - checked) * 1000:.0f} ms')
+
+    def wait(self, options):
+        """Retry connecting until it works or ``--timeout`` passes; returns the attempts made"""
+        connection = connections[options['database']]
+        deadline = time.monotonic() + options['timeout']
+        delay = options['initial_delay']
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                connection.ensure_connection()
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                return attempt
+            except OperationalError as exc:
+                connection.close()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f"Database {options['database']} unavailable after {attempt} attempt(s): {exc}"
+                    )
+                # Full jitter, so replicas starting together do not retry in lockstep
+                pause = min(random.uniform(0, delay), remaining)
+                self.stderr.write(f'Database not ready ({exc}); retrying in {pause:.2f}s')
+                time.sleep(pause)
+                delay = min(delay * 2, options['max_delay'])
+
+    def pending_migrations(self, alias):
+        """Unapplied migrations on ``alias``: one query on django_migrations plus the files on disk"""
+        executor = MigrationExecutor(connections[alias])
+        return executor.migration_plan(executor.loader.graph.leaf_nodes())
@@ -0,0 +1,492 @@
+"""Prometheus metrics of requests, queries, template rendering and the dashboard cache.
+
+``MetricsMiddleware`` records, per URL name (``view`` label):
+
+* request latency as a histogram, and requests by method and status;
+* SQL queries and their time, through an execute wrapper installed on every
+  database connection as it is created;
+* template rendering time, less the queries run while rendering, through the
+  ``TimedDjangoTemplates`` backend;
+* dashboard cache hits and misses, reported by ``finance.caching``, and the
+  time of its cache calls, through ``TimedCache``.
+
+``RequestStats`` of the current request are also read by ``finance.profiling``
+for the ``Server-Timing`` header and slow-request logs.
+
+Recording only updates dictionaries in memory.  With ``METRICS_DIR`` set, a
+background thread of each process also writes a snapshot of its metrics to
+``<METRICS_DIR>/<pid>-<start>.json`` every ``METRICS_FLUSH_SECONDS`` while
+they change (and at exit), and the ``metrics`` view adds up the snapshots
+of every process, so a scrape served by any Gunicorn worker reports all of
+them.
+``gunicorn.conf.py`` folds the snapshot of each exited worker into an
+archive with ``mark_process_dead``, so counters never go backwards.  Without
+``METRICS_DIR`` the view reports the serving process only.
+
+Other workers' figures are up to ``METRICS_FLUSH_SECONDS`` old.  Connection
+counts and pool figures (see ``finance.pool``) are gauges labelled with each
+live worker's ``pid``.
+"""
+import atexit
+import bisect
+import glob
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+from django.views.decorators.csrf import csrf_exempt
+
+from . import pool
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ARCHIVE = 'archive.json'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+METRICS = {
+    'finance_http_request_duration_seconds': ('histogram', 'Request latency by URL name, to the first byte of the response'),
+    'finance_http_requests_total': ('counter', 'Requests by URL name, method and status'),
+    'finance_db_queries_total': ('counter', 'SQL queries run by requests, by URL name and database'),
+    'finance_db_query_seconds_total': ('counter', 'Time spent in SQL queries by requests, by URL name and database'),
+    'finance_template_render_seconds_total': ('counter', 'Time spent rendering templates, less their SQL queries, by URL name'),
+    'finance_cache_requests_total': ('counter', 'Dashboard cache lookups by URL name and result (hit or miss)'),
+    'finance_cache_seconds_total': ('counter', 'Time spent in dashboard cache calls, by URL name'),
+    'finance_db_connects': ('gauge', 'Database connections opened by a worker process'),
+    'finance_db_pool': ('gauge', 'Connection pool figures of a worker process (see finance.pool)'),
+}
+
+_request = ContextVar('finance_metrics_request', default=None)
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_file_name = (None, None)  # (pid, snapshot file name) of this process
+_flusher_pid = None
+_dirty = False
+
+
+class RequestStats:
+    """What one request spent its time on; filled in while it runs"""
+
+    def __init__(self):
+        self.queries = {}  # alias -> [count, seconds]
+        self.query_seconds = 0.0
+        self.render_seconds = 0.0
+        self.cache_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # (alias, sql, seconds, many) of every query, once set to a list
+        self.sql = None
+
+    def add_query(self, alias, seconds):
+        self.query_seconds += seconds
+        entry = self.queries.get(alias)
+        if entry is None:
+            self.queries[alias] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+
+def current_stats():
+    """``RequestStats`` of the request being served, if any"""
+    return _request.get()
+
+
+def begin_request():
+    """Start recording a request in this context; returns its stats and the token for ``end_request``"""
+    stats = RequestStats()
+    return stats, _request.set(stats)
+
+
+def end_request(token):
+    _request.reset(token)
+
+
+def inc(name, labels, amount=1):
+    key = (name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, labels, value):
+    key = (name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            # Per-bucket counts (the last one is +Inf), then the sum
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        histogram[bisect.bisect_left(BUCKETS, value)] += 1
+        histogram[-1] += value
+
+
+def record_cache(hit):
+    """Count a dashboard cache lookup for the current request"""
+    stats = _request.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper timing the queries of the current request"""
+    stats = _request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        stats.add_query(context['connection'].alias, seconds)
+        if stats.sql is not None:
+            stats.sql.append((context['connection'].alias, sql, seconds, many))
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """``connection_created`` receiver adding ``record_query`` to the connection once"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def record_request(view, method, status, seconds, stats):
+    observe('finance_http_request_duration_seconds', (('view', view), ('method', method)), seconds)
+    inc('finance_http_requests_total', (('view', view), ('method', method), ('status', str(status))))
+    for alias, (count, query_seconds) in stats.queries.items():
+        inc('finance_db_queries_total', (('view', view), ('database', alias)), count)
+        inc('finance_db_query_seconds_total', (('view', view), ('database', alias)), query_seconds)
+    if stats.render_seconds:
+        inc('finance_template_render_seconds_total', (('view', view),), stats.render_seconds)
+    if stats.cache_seconds:
+        inc('finance_cache_seconds_total', (('view', view),), stats.cache_seconds)
+    if stats.cache_hits:
+        inc('finance_cache_requests_total', (('view', view), ('result', 'hit')), stats.cache_hits)
+    if stats.cache_misses:
+        inc('finance_cache_requests_total', (('view', view), ('result', 'miss')), stats.cache_misses)
+
+
+def get_directory():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def snapshot():
+    """This process's metrics in the JSON form of the snapshot files"""
+    gauges = [[name, labels, value] for (name, labels), value in pool_gauges().items()]
+    with _lock:
+        return {
+            'counters': [[name, labels, value] for (name, labels), value in _counters.items()],
+            'histograms': [[name, labels, list(values)] for (name, labels), values in _histograms.items()],
+            'gauges': gauges,
+        }
+
+
+def pool_gauges():
+    """This process's connection counts and pool figures, labelled with its pid"""
+    pid = str(os.getpid())
+    gauges = {}
+    for alias, stats in pool.connection_stats().items():
+        gauges[('finance_db_connects', (('database', alias), ('pid', pid)))] = stats['connects']
+        for figure, value in (stats['pool'] or {}).items():
+            gauges[('finance_db_pool', (('database', alias), ('pid', pid), ('figure', figure)))] = value
+    return gauges
+
+
+def _process_file(directory):
+    """Snapshot file of this process; named anew after a fork, so a reused pid never shares a name"""
+    global _file_name
+    pid = os.getpid()
+    if _file_name[0] != pid:
+        _file_name = (pid, f'{pid}-{time.time_ns()}.json')
+    return os.path.join(directory, _file_name[1])
+
+
+def flush():
+    """Write this process's snapshot to ``METRICS_DIR``"""
+    global _dirty
+    directory = get_directory()
+    if directory:
+        _dirty = False
+        _write_json(_process_file(directory), snapshot())
+
+
+def _flush_periodically(interval):
+    while True:
+        time.sleep(interval)
+        if _dirty:
+            try:
+                flush()
+            except OSError:
+                logger.warning('Could not write metrics to %s', get_directory(), exc_info=True)
+
+
+def schedule_flush():
+    """Have this process's snapshot written within ``METRICS_FLUSH_SECONDS``, off the request path"""
+    global _dirty, _flusher_pid
+    _dirty = True
+    if _flusher_pid == os.getpid() or not get_directory():
+        return
+    with _lock:
+        # Threads do not survive a fork: every worker starts its own
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            threading.Thread(
+                target=_flush_periodically,
+                args=(getattr(settings, 'METRICS_FLUSH_SECONDS', 1.0),),
+                name='finance-metrics-flush',
+                daemon=True,
+            ).start()
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(data, file)
+    os.replace(temporary, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        # Gone since it was listed, or a worker killed mid-write
+        return None
+
+
+def _merge(into, data):
+    """Add snapshot ``data`` to ``into``: dicts of ``counters``, ``histograms`` and ``gauges`` by (name, labels)"""
+    for name, labels, value in data['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        into['counters'][key] = into['counters'].get(key, 0) + value
+    for name, labels, values in data['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        existing = into['histograms'].get(key)
+        into['histograms'][key] = values if existing is None else [a + b for a, b in zip(existing, values)]
+    for name, labels, value in data.get('gauges', ()):
+        into['gauges'][(name, tuple(map(tuple, labels)))] = value
+
+
+def mark_process_dead(pid, directory):
+    """Fold the snapshots of exited process ``pid`` into the archive; needs no Django settings"""
+    if not directory:
+        return
+    archive_path = os.path.join(directory, ARCHIVE)
+    archive = _read_json(archive_path) or {'counters': [], 'histograms': [], 'merged': []}
+    totals = {'counters': {}, 'histograms': {}, 'gauges': {}}
+    _merge(totals, archive)
+    merged = [name for name in archive['merged'] if os.path.exists(os.path.join(directory, name))]
+    for path in glob.glob(os.path.join(directory, f'{pid}-*.json')):
+        data = _read_json(path)
+        if data is not None:
+            _merge(totals, data)
+        merged.append(os.path.basename(path))
+    # Gauges of exited processes are dropped
+    _write_json(archive_path, {
+        'counters': [[name, labels, value] for (name, labels), value in totals['counters'].items()],
+        'histograms': [[name, labels, values] for (name, labels), values in totals['histograms'].items()],
+        # Readers skip these files, so a snapshot is never counted twice before it is removed
+        'merged': merged,
+    })
+    for name in merged:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def collect(attempts=5):
+    """Metrics of every process: the archive, the other processes' snapshots and this one, live.
+
+    A worker archived while the snapshots are read would be in neither the
+    archive read before nor the snapshots, so the reading is repeated until
+    the archive is the same after it as before.
+    """
+    directory = get_directory()
+    for _ in range(attempts):
+        totals = {'counters': {}, 'histograms': {}, 'gauges': {}}
+        if not directory:
+            break
+        archive_path = os.path.join(directory, ARCHIVE)
+        empty = {'counters': [], 'histograms': [], 'merged': []}
+        archive = _read_json(archive_path) or empty
+        skip = {os.path.join(directory, name) for name in archive['merged']} | {_process_file(directory)}
+        _merge(totals, archive)
+        for path in glob.glob(os.path.join(directory, '*-*.json')):
+            if path not in skip:
+                data = _read_json(path)
+                if data is not None:
+                    _merge(totals, data)
+        if (_read_json(archive_path) or empty) == archive:
+            break
+    _merge(totals, snapshot())
+    return totals
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(totals):
+    """Prometheus text exposition of ``collect()`` output"""
+    series = {}  # name -> [(labels, lines)]
+    for kind in ('counters', 'gauges'):
+        for (name, labels), value in totals[kind].items():
+            series.setdefault(name, []).append((labels, [f'{name}{_labels(labels)} {_number(value)}']))
+    for (name, labels), values in totals['histograms'].items():
+        lines, cumulative = [], 0
+        for bound, count in zip(BUCKETS + ('+Inf',), values[:-1]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f'{name}_sum{_labels(labels)} {_number(values[-1])}')
+        lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        series.setdefault(name, []).append((labels, lines))
+
+    output = []
+    for name in sorted(series):
+        type_, help_text = METRICS.get(name, ('untyped', name))
+        output.append(f'# HELP {name} {help_text}')
+        output.append(f'# TYPE {name} {type_}')
+        for _, lines in sorted(series[name], key=lambda item: item[0]):
+            output.extend(lines)
+    return '\n'.join(output) + '\n'
+
+
+def has_token(request):
+    """Whether the request sends ``Authorization: Bearer <METRICS_TOKEN>``; never true without a token set"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    sent = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(sent.encode(), f'Bearer {token}'.encode())
+
+
+def has_access(request):
+    """Whether the request may see per-process and database figures: it sends the token or is from staff"""
+    # The token is checked first, so scrapes do not look up a session
+    return has_token(request) or request.user.is_staff
+
+
+@csrf_exempt
+def metrics_view(request):
+    """Metrics of every worker process in the Prometheus text format, for the token or staff only"""
+    if not has_access(request):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
+
+
+class TimedTemplate(Template):
+    """Django template timing its rendering for the current request"""
+
+    def render(self, context=None, request=None):
+        stats = _request.get()
+        if stats is None:
+            return super().render(context, request)
+        # Querysets evaluated by the template count as database time only
+        started = time.perf_counter() - stats.query_seconds
+        try:
+            return super().render(context, request)
+        finally:
+            stats.render_seconds += time.perf_counter() - stats.query_seconds - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with rendering time recorded per request"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class TimedCache:
+    """Cache proxy adding the time of every call to the current request's cache time"""
+
+    def __init__(self, cache):
+        self._cache = cache
+
+    def __getattr__(self, name):
+        attribute = getattr(self._cache, name)
+        if not callable(attribute):
+            return attribute
+
+        def timed(*args, **kwargs):
+            stats = _request.get()
+            if stats is None:
+                return attribute(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                stats.cache_seconds += time.perf_counter() - started
+
+        return timed
+
+
+class MetricsMiddleware:
+    """Record latency, queries, rendering and cache use of every request.
+
+    Should come first, so the time of the other middleware is included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = begin_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        self.finish(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = begin_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        self.finish(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def finish(self, request, response, stats, seconds):
+        match = request.resolver_match
+        view = match.view_name if match is not None and match.view_name else 'unmatched'
+        record_request(view, request.method, response.status_code, seconds, stats)
+        schedule_flush()
+
+
+atexit.register(lambda: _dirty and flush())
@@ -0,0 +1,72 @@
+"""Custom migration operations shared by the finance migrations"""
+from django.db import migrations
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """Add an index with ``CREATE INDEX CONCURRENTLY`` on PostgreSQL.
+
+    Unlike ``django.contrib.postgres.operations.AddIndexConcurrently`` this
+    falls back to a plain ``AddIndex`` on other backends, so the same
+    migration runs against the SQLite development database.  Migrations
+    using it on PostgreSQL must set ``atomic = False``.
+    """
+
+    def describe(self):
+        return 'Concurrently create index %s on field(s) %s of model %s' % (
+            self.index.name,
+            ', '.join(self.index.fields),
+            self.model_name,
+        )
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+        self._ensure_not_in_transaction(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+        self._ensure_not_in_transaction(schema_editor)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+    def _ensure_not_in_transaction(self, schema_editor):
+        if schema_editor.connection.in_atomic_block:
+            raise ValueError(
+                'The %s operation cannot be executed inside a transaction '
+                '(set atomic = False on the migration).' % self.__class__.__name__
+            )
+
+
+class VendorRunSQL(migrations.RunSQL):
+    """``RunSQL`` that only runs on one database vendor and is a no-op elsewhere.
+
+    For schema objects the ORM cannot describe, such as PostgreSQL generated
+    columns or SQLite virtual tables and triggers.
+    """
+
+    def __init__(self, vendor, sql, reverse_sql=None, **kwargs):
+        self.vendor = vendor
+        super().__init__(sql, reverse_sql, **kwargs)
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        kwargs['vendor'] = self.vendor
+        return name, args, kwargs
+
+    def describe(self):
+        return 'Raw SQL operation for %s' % self.vendor
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,57 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:34
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def populate_rollups(apps, schema_editor):
+    """Backfill rollups for transactions created before this migration"""
+    Transaction = apps.get_model('finance', 'Transaction')
+    MonthlyRollup = apps.get_model('finance', 'MonthlyRollup')
+    db_alias = schema_editor.connection.alias
+
+    rows = Transaction.objects.using(db_alias).annotate(
+        year=ExtractYear('date'),
+        month=ExtractMonth('date'),
+    ).values('user_id', 'category_id', 'year', 'month', 'type').annotate(
+        total=Sum('amount'),
+        count=Count('id'),
+    ).order_by()
+
+    MonthlyRollup.objects.using(db_alias).bulk_create(
+        (MonthlyRollup(**row) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('type', models.CharField(choices=[('Income', 'Income'), ('Expense', 'Expense')], max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to='finance.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'year', 'month'], name='finance_rollup_user_month')],
+                'unique_together': {('user', 'category', 'year', 'month', 'type')},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
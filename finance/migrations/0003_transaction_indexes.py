@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-18 12:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+from finance.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block; building
+    # the indexes concurrently avoids locking finance_transaction against writes.
+    atomic = False
+
+    dependencies = [
+        ('finance', '0002_monthlyrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'date', 'created_at'], name='finance_txn_user_date'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'type', 'date', 'created_at'], name='finance_txn_user_type_date'),
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'category', 'date', 'created_at'], name='finance_txn_user_cat_date'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:02
+
+from django.db import migrations
+
+from finance.migration_operations import VendorRunSQL
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    # Adding the stored generated column still rewrites finance_transaction
+    # on PostgreSQL, so run this migration in a maintenance window.
+    atomic = False
+
+    dependencies = [
+        ('finance', '0003_transaction_indexes'),
+    ]
+
+    operations = [
+        VendorRunSQL(
+            'postgresql',
+            sql=[
+                "ALTER TABLE finance_transaction ADD COLUMN search_vector tsvector "
+                "GENERATED ALWAYS AS (to_tsvector('simple'::regconfig, coalesce(description, ''))) STORED",
+                'CREATE INDEX CONCURRENTLY finance_txn_search ON finance_transaction USING GIN (search_vector)',
+            ],
+            reverse_sql=[
+                'DROP INDEX CONCURRENTLY IF EXISTS finance_txn_search',
+                'ALTER TABLE finance_transaction DROP COLUMN search_vector',
+            ],
+        ),
+        VendorRunSQL(
+            'sqlite',
+            sql=[
+                "CREATE VIRTUAL TABLE finance_transaction_fts USING fts5("
+                "description, content='finance_transaction', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')",
+                'CREATE TRIGGER finance_transaction_fts_insert AFTER INSERT ON finance_transaction BEGIN '
+                'INSERT INTO finance_transaction_fts(rowid, description) VALUES (new.id, new.description); '
+                'END',
+                'CREATE TRIGGER finance_transaction_fts_delete AFTER DELETE ON finance_transaction BEGIN '
+                "INSERT INTO finance_transaction_fts(finance_transaction_fts, rowid, description) "
+                "VALUES ('delete', old.id, old.description); "
+                'END',
+                'CREATE TRIGGER finance_transaction_fts_update AFTER UPDATE OF description ON finance_transaction BEGIN '
+                "INSERT INTO finance_transaction_fts(finance_transaction_fts, rowid, description) "
+                "VALUES ('delete', old.id, old.description); "
+                'INSERT INTO finance_transaction_fts(rowid, description) VALUES (new.id, new.description); '
+                'END',
+                "INSERT INTO finance_transaction_fts(finance_transaction_fts) VALUES ('rebuild')",
+            ],
+            reverse_sql=[
+                'DROP TRIGGER IF EXISTS finance_transaction_fts_update',
+                'DROP TRIGGER IF EXISTS finance_transaction_fts_delete',
+                'DROP TRIGGER IF EXISTS finance_transaction_fts_insert',
+                'DROP TABLE IF EXISTS finance_transaction_fts',
+            ],
+        ),
+    ]
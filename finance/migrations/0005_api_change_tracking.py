@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-18 15:10
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+from finance.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    atomic = False
+
+    dependencies = [
+        ('finance', '0004_transaction_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'updated_at'], name='finance_txn_user_updated'),
+        ),
+    ]
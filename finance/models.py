@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from decimal import Decimal
+from . import periods, search
 
 
 class Category(models.Model):
@@ -10,6 +11,7 @@ class Category(models.Model):
     name = models.CharField(max_length=100, unique=False)
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name_plural = "Categories"
@@ -20,6 +22,18 @@ class Category(models.Model):
         return f"{self.name} ({self.user.username})"
 
 
+class TransactionQuerySet(models.QuerySet):
+    """QuerySet helpers for transactions"""
+
+    def within(self, period):
+        """Restrict to a ``finance.periods.Period`` using an index-friendly range"""
+        return self.filter(**period.lookups())
+
+    def search(self, text):
+        """Full-text match on description, annotated with ``search_rank``"""
+        return search.search(self, text)
+
+
 class Transaction(models.Model):
     """Model for financial transactions"""
     TRANSACTION_TYPES = [
@@ -40,13 +54,75 @@ class Transaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = TransactionQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            # Listing and date-range access paths, scanned backwards for the default ordering
+            models.Index(fields=['user', 'date', 'created_at'], name='finance_txn_user_date'),
+            models.Index(fields=['user', 'type', 'date', 'created_at'], name='finance_txn_user_type_date'),
+            models.Index(fields=['user', 'category', 'date', 'created_at'], name='finance_txn_user_cat_date'),
+            # Latest change per user, for API ETag/Last-Modified
+            models.Index(fields=['user', 'updated_at'], name='finance_txn_user_updated'),
+        ]
     
     def __str__(self):
         return f"{self.type}: {self.amount} - {self.description} ({self.user.username})"
 
 
+class BudgetQuerySet(models.QuerySet):
+    """QuerySet that can evaluate budget progress for all periods at once"""
+
+    def progress(self, today=None):
+        """Evaluate spending against every budget in this queryset.
+
+        Runs one query for the budgets and one conditional aggregate over the
+        users' expenses, with a ``Sum`` per period window, regardless of how
+        many budgets or periods are involved.  ``today`` selects the current
+        period (see ``finance.periods.resolve``) and defaults to the local date.  Returns a list of dictionaries
+        with ``budget``, ``spent``, ``remaining``, ``percentage``,
+        ``is_over_budget``, ``period_start`` and ``period_end`` keys, where
+        ``period_end`` is exclusive.
+        """
+        windows = {period: periods.resolve(period, today) for period, _ in Budget.PERIOD_CHOICES}
+        budgets = list(self.select_related('category'))
+        if not budgets:
+            return []
+
+        used_periods = {budget.period for budget in budgets}
+        covering = periods.Period(
+            min(windows[period].start for period in used_periods),
+            max(windows[period].end for period in used_periods),
+        )
+
+        spending = Transaction.objects.within(covering).filter(
+            user_id__in={budget.user_id for budget in budgets},
+            category_id__in={budget.category_id for budget in budgets},
+            type='Expense',
+        ).values('user_id', 'category_id').annotate(**{
+            period: models.Sum('amount', filter=models.Q(**windows[period].lookups()))
+            for period in used_periods
+        }).order_by()
+        spent_by_key = {(row['user_id'], row['category_id']): row for row in spending}
+
+        results = []
+        for budget in budgets:
+            row = spent_by_key.get((budget.user_id, budget.category_id), {})
+            spent = row.get(budget.period) or Decimal('0.00')
+            percentage = float((spent / budget.limit) * 100) if budget.limit > 0 else 0
+            results.append({
+                'budget': budget,
+                'spent': spent,
+                'remaining': budget.limit - spent,
+                'percentage': min(percentage, 100),  # Cap at 100%
+                'is_over_budget': spent > budget.limit,
+                'period_start': windows[budget.period].start,
+                'period_end': windows[budget.period].end,
+            })
+        return results
+
+
 class Budget(models.Model):
     """Model for budget limits per category"""
     PERIOD_CHOICES = [
@@ -67,6 +143,8 @@ class Budget(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = BudgetQuerySet.as_manager()
+    
     class Meta:
         unique_together = ('user', 'category', 'period')
         ordering = ['category__name']
@@ -76,10 +154,11 @@ class Budget(models.Model):
     
     def get_spending_percentage(self, start_date, end_date):
         """Calculate spending percentage for this budget in given period"""
-        total_spent = self.category.transactions.filter(
+        total_spent = self.category.transactions.within(
+            periods.custom(start_date, end_date)
+        ).filter(
             user=self.user,
             type='Expense',
-            date__range=[start_date, end_date]
         ).aggregate(
             total=models.Sum('amount')
         )['total'] or Decimal('0.00')
@@ -87,3 +166,27 @@ class Budget(models.Model):
         if self.limit > 0:
             return min((total_spent / self.limit) * 100, 100)
         return 0
+
+
+class MonthlyRollup(models.Model):
+    """Pre-aggregated transaction totals per user, category, month and type.
+
+    Maintained incrementally by the signals in ``finance.signals`` so the
+    dashboard can read monthly totals without scanning ``Transaction``.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_rollups')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='monthly_rollups')
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'category', 'year', 'month', 'type')
+        indexes = [
+            models.Index(fields=['user', 'year', 'month'], name='finance_rollup_user_month'),
+        ]
+
+    def __str__(self):
+        return f"{self.category.name} {self.year}-{self.month:02d} {self.type}: {self.total} ({self.user.username})"
@@ -0,0 +1,161 @@
+"""Keyset (cursor) pagination.
+
+Offset pagination costs ``O(offset)`` per page and a ``COUNT(*)`` per
+request.  ``CursorPaginator`` instead seeks past the last row of the previous
+page using the ordering columns, so every page is an index range scan of
+``per_page + 1`` rows no matter how deep it is.
+
+Cursors are signed, opaque tokens carrying the ordering values of the
+boundary row, the direction, and any filters that must stay in force.
+"""
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = 'finance.pagination.cursor'
+
+
+class InvalidCursor(Exception):
+    """Raised when a cursor token is malformed, tampered with or mismatched"""
+
+
+def cursor_filters(token):
+    """Filters embedded in a cursor token, without decoding its position"""
+    try:
+        return dict(signing.loads(token, salt=CURSOR_SALT)['f'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError) as exc:
+        raise InvalidCursor(str(exc)) from exc
+
+
+class CursorPage:
+    """One page of a keyset-paginated queryset"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None, filters=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.filters = filters or {}
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Paginate a queryset by seeking on a unique, fully ordered key.
+
+    ``ordering`` lists field names with an optional ``-`` prefix for
+    descending order; its last field must be unique (usually ``-id``) so
+    ties on the leading fields are broken deterministically.  ``count`` is
+    an optional callable returning an exact, cached or estimated total.
+    """
+
+    def __init__(self, queryset, per_page, ordering, count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self._count = count
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-'))
+            for name in self.ordering
+        ]
+
+    @property
+    def count(self):
+        """Total number of rows, or ``None`` if no count callable was given"""
+        if self._count is None:
+            return None
+        if not hasattr(self, '_cached_count'):
+            self._cached_count = self._count()
+        return self._cached_count
+
+    def encode_cursor(self, obj, backwards, filters):
+        """Opaque token positioned on ``obj``'s ordering values.
+
+        ``obj`` is a model instance, or a dictionary from ``.values()`` that
+        includes every ordering field.
+        """
+        if isinstance(obj, dict):
+            values = [self._value_to_string(obj[field.attname]) for field in self.fields]
+        else:
+            values = [field.value_to_string(obj) for field in self.fields]
+        return signing.dumps({'k': values, 'b': backwards, 'f': filters}, salt=CURSOR_SALT, compress=True)
+
+    @staticmethod
+    def _value_to_string(value):
+        """Match ``Field.value_to_string`` for values read with ``.values()``"""
+        if value is None:
+            return None
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return str(value)
+
+    def decode_cursor(self, token):
+        """Return ``(values, backwards, filters)`` from a token made by ``encode_cursor``"""
+        try:
+            payload = signing.loads(token, salt=CURSOR_SALT)
+            values = [field.to_python(value) for field, value in zip(self.fields, payload['k'], strict=True)]
+            return values, bool(payload['b']), dict(payload['f'])
+        except (signing.BadSignature, KeyError, TypeError, ValueError) as exc:
+            raise InvalidCursor(str(exc)) from exc
+
+    def _seek(self, values, backwards):
+        """Q matching rows strictly after (or before) ``values`` in ``ordering``"""
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            field = name.lstrip('-')
+            descending = name.startswith('-') != backwards
+            step = Q(**{f'{field}__{"lt" if descending else "gt"}': values[index]})
+            for previous_name, previous_value in zip(self.ordering[:index], values[:index]):
+                step &= Q(**{previous_name.lstrip('-'): previous_value})
+            condition |= step
+
+        # Redundant bound on the leading column so the planner can turn the
+        # OR-expanded row comparison into an index range scan.
+        first = self.ordering[0]
+        descending = first.startswith('-') != backwards
+        bound = Q(**{f'{first.lstrip("-")}__{"lte" if descending else "gte"}': values[0]})
+        return bound & condition
+
+    def page(self, cursor=None, filters=None):
+        """Return the ``CursorPage`` after ``cursor``, or the first page.
+
+        ``filters`` are embedded into the page's cursors; when ``cursor`` is
+        given the filters stored in it win, and callers should read them
+        back from ``page.filters``.
+        """
+        backwards = False
+        queryset = self.queryset
+        if cursor:
+            values, backwards, filters = self.decode_cursor(cursor)
+            queryset = queryset.filter(self._seek(values, backwards))
+        filters = filters or {}
+
+        if backwards:
+            ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+        else:
+            ordering = self.ordering
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or backwards:
+                next_cursor = self.encode_cursor(rows[-1], False, filters)
+            if cursor and (has_more or not backwards):
+                previous_cursor = self.encode_cursor(rows[0], True, filters)
+        return CursorPage(rows, self, next_cursor, previous_cursor, filters)
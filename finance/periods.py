@@ -0,0 +1,84 @@
+"""Resolve reporting periods into half-open ``[start, end)`` date bounds.
+
+Filtering with ``date__gte=start, date__lt=end`` keeps period queries
+sargable: the database can answer them with a range scan over an index on
+``date``, which is not possible for ``date__month``/``date__week`` lookups
+that wrap the column in ``EXTRACT(...)``.
+"""
+from collections import namedtuple
+from datetime import date, timedelta
+
+from django.utils import timezone
+
+# Budget.PERIOD_CHOICES values map onto the same units
+PERIOD_ALIASES = {
+    'week': 'week',
+    'weekly': 'week',
+    'month': 'month',
+    'monthly': 'month',
+    'quarter': 'quarter',
+    'quarterly': 'quarter',
+    'year': 'year',
+    'yearly': 'year',
+}
+
+
+class Period(namedtuple('Period', ['start', 'end'])):
+    """A half-open date range: ``start`` is included, ``end`` is not"""
+    __slots__ = ()
+
+    @property
+    def last_day(self):
+        """The last date inside the period"""
+        return self.end - timedelta(days=1)
+
+    def lookups(self, field='date'):
+        """Keyword arguments filtering ``field`` to this period"""
+        return {f'{field}__gte': self.start, f'{field}__lt': self.end}
+
+    def __contains__(self, value):
+        return self.start <= value < self.end
+
+
+def add_months(start, months):
+    """First day of the month ``months`` after the month containing ``start``"""
+    month_index = start.month - 1 + months
+    return date(start.year + month_index // 12, month_index % 12 + 1, 1)
+
+
+def resolve(period, today=None):
+    """Return the ``Period`` of the given unit containing ``today``.
+
+    ``period`` is one of week, month, quarter or year, case-insensitive, and
+    also accepts the ``Budget.PERIOD_CHOICES`` spellings (Weekly, Monthly...).
+    Weeks start on Monday.  ``today`` defaults to the current local date.
+    """
+    try:
+        unit = PERIOD_ALIASES[period.lower()]
+    except (AttributeError, KeyError):
+        raise ValueError(f'Unknown period: {period!r}')
+
+    today = today or timezone.localdate()
+    if unit == 'week':
+        start = today - timedelta(days=today.weekday())
+        return Period(start, start + timedelta(days=7))
+    if unit == 'month':
+        start = today.replace(day=1)
+        return Period(start, add_months(start, 1))
+    if unit == 'quarter':
+        start = date(today.year, 3 * ((today.month - 1) // 3) + 1, 1)
+        return Period(start, add_months(start, 3))
+    return Period(date(today.year, 1, 1), date(today.year + 1, 1, 1))
+
+
+def month(year, month):
+    """The ``Period`` covering one calendar month"""
+    start = date(year, month, 1)
+    return Period(start, add_months(start, 1))
+
+
+def custom(first_day, last_day):
+    """A ``Period`` covering ``first_day`` through ``last_day`` inclusive"""
+    if last_day < first_day:
+        raise ValueError('last_day must not be before first_day')
+    return Period(first_day, last_day + timedelta(days=1))
@@ -0,0 +1,287 @@
+"""In-process database connection pooling and connection statistics.
+
+Django either opens a connection per request (``CONN_MAX_AGE = 0``) or keeps
+one per thread (``CONN_MAX_AGE > 0``).  The pooled backends in
+``finance.backends`` add a third option: ``connect()`` checks a connection
+out of a per-process ``ConnectionPool`` and ``close()`` hands it back, so a
+worker's threads share at most ``MAX_SIZE`` physical connections that
+survive across requests.  Use them with ``CONN_MAX_AGE = 0`` so every request
+returns its connection::
+
+    'ENGINE': 'finance.backends.postgresql',
+    'CONN_MAX_AGE': 0,
+    'POOL': {'MAX_SIZE': 10, 'TIMEOUT': 30},
+
+``POOL`` keys (seconds unless noted):
+
+* ``MAX_SIZE``: connections per process (default 10);
+* ``TIMEOUT``: how long a checkout waits for a free connection before
+  failing with ``OperationalError`` (default 30);
+* ``CHECK_AFTER``: idle time after which a connection is pinged with
+  ``SELECT 1`` before reuse (default 30);
+* ``MAX_IDLE``: idle connections older than this are closed (default 300);
+* ``MAX_LIFETIME``: connections are closed instead of returned after this
+  long, so server-side timeouts and failovers are picked up (default 1800).
+
+Pools are keyed by process id, so a forked worker never reuses a
+connection opened by its parent.  ``connection_stats`` reports per-process
+counters for every database alias, pooled or not.
+"""
+import os
+import threading
+import time
+from collections import Counter, deque
+
+from django.db import connections
+
+DEFAULTS = {
+    'MAX_SIZE': 10,
+    'TIMEOUT': 30.0,
+    'CHECK_AFTER': 30.0,
+    'MAX_IDLE': 300.0,
+    'MAX_LIFETIME': 1800.0,
+}
+
+_pools = {}
+_pools_guard = threading.Lock()
+_connects = Counter()
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool's timeout"""
+
+
+def _ping(raw_connection):
+    cursor = raw_connection.cursor()
+    try:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def _close_quietly(raw_connection):
+    try:
+        raw_connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """A bounded, thread-safe pool of DB-API connections.
+
+    Idle connections are reused most-recently-returned first, which keeps
+    the working set warm and lets surplus connections age out through
+    ``max_idle``.
+    """
+
+    def __init__(self, max_size=10, timeout=30.0, check_after=30.0, max_idle=300.0, max_lifetime=1800.0,
+                 ping=_ping, clock=time.monotonic):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self._ping = ping
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._idle = deque()        # (connection, created_at, returned_at)
+        self._created_at = {}       # checked-out connection -> created_at
+        self._size = 0
+        self.created = 0
+        self.discarded = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def checkout(self, connect):
+        """Return an idle connection, or one made by ``connect()`` if the pool has room"""
+        started = self._clock()
+        deadline = started + self.timeout
+        waited = False
+        while True:
+            with self._condition:
+                entry = self._take_idle()
+                if entry is None and self._size >= self.max_size:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            f'No database connection became free within {self.timeout:g}s '
+                            f'({self.max_size} in use).'
+                        )
+                    waited = True
+                    self._condition.wait(remaining)
+                    continue
+                if entry is None:
+                    self._size += 1
+
+            if entry is None:
+                try:
+                    raw_connection = connect()
+                except BaseException:
+                    self._release_slot()
+                    raise
+                created_at = self._clock()
+            else:
+                raw_connection, created_at, returned_at = entry
+                if self._clock() - returned_at >= self.check_after and not self._is_alive(raw_connection):
+                    self._discard(raw_connection)
+                    continue
+
+            with self._condition:
+                if entry is None:
+                    self.created += 1
+                self._created_at[raw_connection] = created_at
+                self.checkouts += 1
+                wait_time = self._clock() - started
+                if waited:
+                    self.waits += 1
+                self.wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+            return raw_connection
+
+    def checkin(self, raw_connection):
+        """Return a checked-out connection, rolling back anything left open"""
+        with self._condition:
+            created_at = self._created_at.pop(raw_connection, None)
+        if created_at is None:
+            # Not ours (or returned twice)
+            _close_quietly(raw_connection)
+            return
+        try:
+            raw_connection.rollback()
+        except Exception:
+            self._discard(raw_connection)
+            return
+        now = self._clock()
+        if now - created_at >= self.max_lifetime:
+            self._discard(raw_connection)
+            return
+        with self._condition:
+            self._idle.append((raw_connection, created_at, now))
+            self._condition.notify()
+
+    def close(self):
+        """Close every idle connection; checked-out ones are closed when returned"""
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+            self.max_lifetime = 0
+            self._condition.notify_all()
+        for raw_connection, _, _ in idle:
+            _close_quietly(raw_connection)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._created_at),
+                'created': self.created,
+                'discarded': self.discarded,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'wait_time_ms': round(self.wait_time * 1000, 3),
+                'max_wait_time_ms': round(self.max_wait_time * 1000, 3),
+            }
+
+    def _take_idle(self):
+        """Pop the freshest usable idle connection, closing expired ones (lock held)"""
+        now = self._clock()
+        while self._idle:
+            raw_connection, created_at, returned_at = self._idle.pop()
+            if now - returned_at < self.max_idle and now - created_at < self.max_lifetime:
+                return raw_connection, created_at, returned_at
+            self._size -= 1
+            self.discarded += 1
+            _close_quietly(raw_connection)
+        return None
+
+    def _is_alive(self, raw_connection):
+        try:
+            self._ping(raw_connection)
+        except Exception:
+            return False
+        return True
+
+    def _discard(self, raw_connection):
+        _close_quietly(raw_connection)
+        with self._condition:
+            self.discarded += 1
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+
+def get_pool(alias, settings_dict):
+    """This process's pool for database ``alias``"""
+    key = (os.getpid(), alias)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_guard:
+            pool = _pools.get(key)
+            if pool is None:
+                options = {**DEFAULTS, **settings_dict.get('POOL', {})}
+                pool = _pools[key] = ConnectionPool(
+                    max_size=int(options['MAX_SIZE']),
+                    timeout=float(options['TIMEOUT']),
+                    check_after=float(options['CHECK_AFTER']),
+                    max_idle=float(options['MAX_IDLE']),
+                    max_lifetime=float(options['MAX_LIFETIME']),
+                )
+    return pool
+
+
+class PooledDatabaseWrapperMixin:
+    """Take connections from, and return them to, the alias's ``ConnectionPool``"""
+
+    def get_new_connection(self, conn_params):
+        def connect():
+            raw_connection = super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params)
+            _connects[self.alias] += 1
+            return raw_connection
+
+        try:
+            return get_pool(self.alias, self.settings_dict).checkout(connect)
+        except PoolTimeout as exc:
+            raise self.Database.OperationalError(str(exc)) from exc
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                get_pool(self.alias, self.settings_dict).checkin(self.connection)
+
+
+def record_connect(sender, connection, **kwargs):
+    """``connection_created`` receiver counting connections opened per alias.
+
+    Pooled backends send the signal on every checkout, so they count the
+    connections they actually open themselves.
+    """
+    if not isinstance(connection, PooledDatabaseWrapperMixin):
+        _connects[connection.alias] += 1
+
+
+def connection_stats():
+    """Connection settings and counters of every database alias, for this process"""
+    pid = os.getpid()
+    stats = {}
+    for alias in connections:
+        settings_dict = connections.settings[alias]
+        pool = _pools.get((pid, alias))
+        stats[alias] = {
+            'vendor': connections[alias].vendor,
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'health_checks': settings_dict['CONN_HEALTH_CHECKS'],
+            'connects': _connects[alias],
+            'pool': pool.stats() if pool is not None else None,
+        }
+    return stats
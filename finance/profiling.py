@@ -0,0 +1,246 @@
+"""Per-request timing breakdown, slow-request SQL logs and on-demand profiles.
+
+``ServerTimingMiddleware`` adds a ``Server-Timing`` header to every response,
+splitting the request's time into ``db`` (SQL queries), ``render`` (template
+rendering, less its queries), ``cache`` (dashboard cache calls) and
+``total``, as recorded in ``finance.metrics.RequestStats``; browsers show it
+in their developer tools.  Session and user lookups are ``db`` time.
+
+Requests slower than ``SLOW_REQUEST_SECONDS``, and a random
+``SLOW_REQUEST_SAMPLE_RATE`` share of all requests, are logged to
+``finance.profiling`` as one JSON record with every query, its time and its
+fingerprint, and the fingerprints run more than once (N+1 queries).  Query
+parameters are left out, so amounts and descriptions never reach the logs.
+
+``ProfileMiddleware`` answers a staff user's request sent with an
+``X-Profile`` header with a cProfile report of it instead of the response:
+``X-Profile: cumulative`` (or another ``pstats`` sort key) for the text
+report, ``X-Profile: pstats`` for the binary dump read by ``pstats.Stats``
+and tools such as snakeviz.
+"""
+import cProfile
+import hashlib
+import io
+import json
+import logging
+import marshal
+import pstats
+import random
+import re
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+SORT_KEYS = ('cumulative', 'tottime', 'calls', 'ncalls', 'time')
+REPORT_LINES = 60
+
+_profile_lock = threading.Lock()
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)*\s*(?:%s|\?)\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Identifier of a query's shape: the same for queries differing in values or ``IN`` list length"""
+    normalized = _STRING.sub('?', sql)
+    normalized = _NUMBER.sub('?', normalized)
+    normalized = _LIST.sub('(...)', normalized)
+    normalized = _SPACE.sub(' ', normalized).strip()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def server_timing(stats, seconds):
+    """``Server-Timing`` header value for a request that took ``seconds``"""
+    count = sum(count for count, _ in stats.queries.values())
+    return (
+        f'db;dur={stats.query_seconds * 1000:.1f};desc="{count} queries", '
+        f'render;dur={stats.render_seconds * 1000:.1f}, '
+        f'cache;dur={stats.cache_seconds * 1000:.1f}, '
+        f'total;dur={seconds * 1000:.1f}'
+    )
+
+
+def profile_record(request, response, stats, seconds, reason):
+    """The JSON-ready slow-request log record"""
+    queries, shapes = [], {}
+    for alias, sql, query_seconds, many in stats.sql or ():
+        key = fingerprint(sql)
+        queries.append({
+            'database': alias,
+            'sql': sql,
+            'ms': round(query_seconds * 1000, 3),
+            'many': many,
+            'fingerprint': key,
+        })
+        shape = shapes.setdefault(key, {'fingerprint': key, 'count': 0, 'ms': 0.0, 'sql': sql})
+        shape['count'] += 1
+        shape['ms'] += query_seconds * 1000
+    duplicates = sorted((shape for shape in shapes.values() if shape['count'] > 1), key=lambda shape: -shape['ms'])
+    for shape in duplicates:
+        shape['ms'] = round(shape['ms'], 3)
+    match = request.resolver_match
+    return {
+        'event': 'request_profile',
+        'reason': reason,
+        'method': request.method,
+        'path': request.path,
+        'view': match.view_name if match is not None and match.view_name else None,
+        'status': response.status_code,
+        'total_ms': round(seconds * 1000, 3),
+        'db_ms': round(stats.query_seconds * 1000, 3),
+        'render_ms': round(stats.render_seconds * 1000, 3),
+        'cache_ms': round(stats.cache_seconds * 1000, 3),
+        'query_count': len(queries),
+        'queries': queries,
+        'duplicates': duplicates,
+    }
+
+
+class ServerTimingMiddleware:
+    """Add ``Server-Timing`` to responses and log slow and sampled requests with their SQL.
+
+    Comes right after ``finance.metrics.MetricsMiddleware``, whose
+    ``RequestStats`` it shares, and before the session and authentication
+    middleware, so their queries are included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def start(self):
+        """``(stats, token, sampled)``; ``token`` is set when this middleware installed the stats"""
+        stats, token = metrics.current_stats(), None
+        if stats is None:
+            stats, token = metrics.begin_request()
+        rate = getattr(settings, 'SLOW_REQUEST_SAMPLE_RATE', 0.0)
+        sampled = rate > 0 and random.random() < rate
+        if sampled or getattr(settings, 'SLOW_REQUEST_SECONDS', 1.0) > 0:
+            # Kept for every request while a threshold is set: only known to be slow at the end
+            stats.sql = []
+        return stats, token, sampled
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, sampled = self.start()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                metrics.end_request(token)
+        self.finish(request, response, stats, time.perf_counter() - started, sampled)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, sampled = self.start()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                metrics.end_request(token)
+        self.finish(request, response, stats, time.perf_counter() - started, sampled)
+        return response
+
+    def finish(self, request, response, stats, seconds, sampled):
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = server_timing(stats, seconds)
+        threshold = getattr(settings, 'SLOW_REQUEST_SECONDS', 1.0)
+        if threshold > 0 and seconds >= threshold:
+            record = profile_record(request, response, stats, seconds, 'slow')
+            logger.warning('%s', json.dumps(record), extra={'profile': record})
+        elif sampled:
+            record = profile_record(request, response, stats, seconds, 'sampled')
+            logger.info('%s', json.dumps(record), extra={'profile': record})
+        stats.sql = None
+
+
+def profile_response(request, profiler, response, seconds):
+    """The report of ``profiler`` asked for by the request's ``X-Profile`` header"""
+    mode = request.headers[PROFILE_HEADER].strip().lower()
+    if mode == 'pstats':
+        profiler.create_stats()
+        dump = HttpResponse(marshal.dumps(profiler.stats), content_type='application/octet-stream')
+        dump['Content-Disposition'] = 'attachment; filename="request.pstats"'
+    else:
+        output = io.StringIO()
+        output.write(
+            f'{request.method} {request.get_full_path()} -> {response.status_code} in {seconds * 1000:.1f} ms\n'
+        )
+        stats = pstats.Stats(profiler, stream=output)
+        stats.strip_dirs().sort_stats(mode if mode in SORT_KEYS else 'cumulative').print_stats(REPORT_LINES)
+        dump = HttpResponse(output.getvalue(), content_type='text/plain; charset=utf-8')
+    dump['X-Profile-Status'] = str(response.status_code)
+    response.close()
+    return dump
+
+
+class ProfileMiddleware:
+    """Return a cProfile report instead of the response to staff requests with ``X-Profile``.
+
+    Comes after ``AuthenticationMiddleware``.  One request per process is
+    profiled at a time; others are served normally meanwhile.  Under ASGI only
+    the event loop thread is profiled, together with whatever else it runs.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if PROFILE_HEADER not in request.headers or not request.user.is_staff:
+            return self.get_response(request)
+        if not _profile_lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+                if response.streaming:
+                    # Profile the generation of a streamed export too
+                    for _ in response.streaming_content:
+                        pass
+            finally:
+                profiler.disable()
+            return profile_response(request, profiler, response, time.perf_counter() - started)
+        finally:
+            _profile_lock.release()
+
+    async def __acall__(self, request):
+        if PROFILE_HEADER not in request.headers or not (await request.auser()).is_staff:
+            return await self.get_response(request)
+        if not _profile_lock.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.disable()
+            return profile_response(request, profiler, response, time.perf_counter() - started)
+        finally:
+            _profile_lock.release()
@@ -0,0 +1,212 @@
+"""Maintenance and queries for the ``MonthlyRollup`` aggregate table.
+
+Every saved ``Transaction`` contributes its amount to exactly one rollup row,
+keyed by (user, category, year, month, type).  Signals apply deltas as rows
+change; ``rebuild`` recomputes the table from scratch for bulk loads or
+repairs, and ``verify`` reports any drift between the two.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .models import MonthlyRollup, Transaction
+
+CENT = Decimal('0.01')
+
+
+def apply_delta(user_id, category_id, date, type, amount, count):
+    """Add ``amount`` and ``count`` (either may be negative) to one rollup row"""
+    key = {
+        'user_id': user_id,
+        'category_id': category_id,
+        'year': date.year,
+        'month': date.month,
+        'type': type,
+    }
+    updated = MonthlyRollup.objects.filter(**key).update(
+        total=F('total') + amount,
+        count=F('count') + count,
+    )
+    if updated or count < 0:
+        return
+
+    try:
+        with transaction.atomic(using=router.db_for_write(MonthlyRollup)):
+            MonthlyRollup.objects.create(total=amount, count=count, **key)
+    except IntegrityError:
+        # A concurrent writer created the row first; fold our delta into it.
+        MonthlyRollup.objects.filter(**key).update(
+            total=F('total') + amount,
+            count=F('count') + count,
+        )
+
+
+def apply_transactions(transactions, sign=1):
+    """Fold many transactions into the rollups with a constant number of queries.
+
+    For writes that bypass model signals, such as ``bulk_create`` or
+    ``QuerySet.delete``; pass ``sign=-1`` to remove rows' contributions.
+    Deltas are summed in Python, then existing rollup rows are locked,
+    updated with ``bulk_update`` and missing ones added with ``bulk_create``.
+    Call inside the same atomic block as the write.
+    """
+    deltas = defaultdict(lambda: [Decimal('0.00'), 0])
+    for item in transactions:
+        delta = deltas[(item.user_id, item.category_id, item.date.year, item.date.month, item.type)]
+        delta[0] += sign * item.amount
+        delta[1] += sign
+    if not deltas:
+        return
+
+    keys = set(deltas)
+    with transaction.atomic(using=router.db_for_write(MonthlyRollup)):
+        existing = MonthlyRollup.objects.select_for_update().filter(
+            user_id__in={key[0] for key in keys},
+            category_id__in={key[1] for key in keys},
+            year__gte=min(key[2] for key in keys),
+            year__lte=max(key[2] for key in keys),
+        )
+        changed = []
+        for rollup in existing:
+            key = _key(rollup.__dict__)
+            if key in deltas:
+                amount, count = deltas.pop(key)
+                rollup.total += amount
+                rollup.count += count
+                changed.append(rollup)
+        MonthlyRollup.objects.bulk_update(changed, ['total', 'count'], batch_size=500)
+
+        # Removing contributions never needs new rows
+        if sign > 0:
+            MonthlyRollup.objects.bulk_create([
+                MonthlyRollup(
+                    user_id=user_id, category_id=category_id, year=year, month=month,
+                    type=type, total=amount, count=count,
+                )
+                for (user_id, category_id, year, month, type), (amount, count) in deltas.items()
+            ])
+
+
+def _aggregate_transactions(user=None):
+    """Group raw transactions into rollup-shaped dictionaries"""
+    queryset = Transaction.objects.all()
+    if user is not None:
+        queryset = queryset.filter(user=user)
+
+    return queryset.annotate(
+        year=ExtractYear('date'),
+        month=ExtractMonth('date'),
+    ).values(
+        'user_id', 'category_id', 'year', 'month', 'type'
+    ).annotate(
+        total=Sum('amount'),
+        count=Count('id'),
+    ).order_by()
+
+
+def _cents(value):
+    """Round an aggregate to cents; SQLite sums decimals as floating point"""
+    return Decimal(value).quantize(CENT)
+
+
+def _key(row):
+    return (row['user_id'], row['category_id'], row['year'], row['month'], row['type'])
+
+
+def rebuild(user=None, batch_size=1000):
+    """Recompute rollups from ``Transaction`` for one user or everyone.
+
+    Returns the number of rollup rows written.
+    """
+    with transaction.atomic(using=router.db_for_write(MonthlyRollup)):
+        existing = MonthlyRollup.objects.all()
+        if user is not None:
+            existing = existing.filter(user=user)
+        existing.delete()
+
+        rollups = [
+            MonthlyRollup(
+                user_id=row['user_id'],
+                category_id=row['category_id'],
+                year=row['year'],
+                month=row['month'],
+                type=row['type'],
+                total=_cents(row['total']),
+                count=row['count'],
+            )
+            for row in _aggregate_transactions(user).iterator()
+        ]
+        MonthlyRollup.objects.bulk_create(rollups, batch_size=batch_size)
+
+    return len(rollups)
+
+
+def verify(user=None):
+    """Compare rollups with a fresh aggregate and return the mismatching keys.
+
+    Each mismatch is a ``(key, expected, actual)`` tuple where ``expected`` and
+    ``actual`` are ``(total, count)`` pairs; missing rows count as zero.
+    """
+    expected = {_key(row): (_cents(row['total']), row['count']) for row in _aggregate_transactions(user)}
+
+    stored = MonthlyRollup.objects.all()
+    if user is not None:
+        stored = stored.filter(user=user)
+    actual = {
+        _key(row): (_cents(row['total']), row['count'])
+        for row in stored.values('user_id', 'category_id', 'year', 'month', 'type', 'total', 'count')
+    }
+
+    empty = (Decimal('0.00'), 0)
+    mismatches = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        expected_value = expected.get(key, empty)
+        actual_value = actual.get(key, empty)
+        if expected_value != actual_value:
+            mismatches.append((key, expected_value, actual_value))
+    return mismatches
+
+
+def monthly_rollups(user, year, month):
+    """Rollup rows holding at least one transaction for the given month"""
+    return MonthlyRollup.objects.filter(user=user, year=year, month=month, count__gt=0)
+
+
+def monthly_totals(user, year, month):
+    """Return ``(total_income, total_expenses)`` for a month"""
+    totals = {
+        row['type']: row['total']
+        for row in monthly_rollups(user, year, month).values('type').annotate(
+            total=Sum('total')
+        ).order_by()
+    }
+    return (
+        totals.get('Income') or Decimal('0.00'),
+        totals.get('Expense') or Decimal('0.00'),
+    )
+
+
+def expense_breakdown(user, year, month, limit=5):
+    """Top expense categories for a month, largest first"""
+    return monthly_rollups(user, year, month).filter(type='Expense').values(
+        'category__name'
+    ).annotate(
+        total=Sum('total')
+    ).order_by('-total')[:limit]
+
+
+def transaction_count(user, type=None, category_id=None):
+    """Number of transactions matching the list filters, read from rollups.
+
+    Exact as long as the rollups are current (see ``verify``), and its cost
+    depends on the number of months and categories rather than rows.
+    """
+    queryset = MonthlyRollup.objects.filter(user=user)
+    if type:
+        queryset = queryset.filter(type=type)
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+    return queryset.aggregate(total=Sum('count'))['total'] or 0
@@ -0,0 +1,159 @@
+"""Send reads to read replicas while keeping clients on the primary after their writes.
+
+``REPLICA_DATABASES`` lists the aliases of databases holding copies of
+``default``.  ``ReplicaMiddleware`` lets the reads of GET, HEAD and OPTIONS
+requests go to a randomly chosen replica, and ``ReplicaRouter`` sends
+everything else to the primary:
+
+* writes, and reads in the rest of a request after it has written;
+* reads inside a transaction on the primary;
+* code running outside a request (management commands, migrations);
+* every request within ``REPLICA_PIN_SECONDS`` of a request from the same
+  client that wrote, or used an unsafe method.  That is tracked with a
+  short-lived cookie, so a user always reads their own writes even if the
+  replicas lag, at no database cost.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_routing = ContextVar('finance_replica_routing', default=None)
+
+
+class RequestRouting:
+    """Routing state of the current request"""
+
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+
+def get_replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def copy_sqlite_database(source, target):
+    """Overwrite SQLite database ``target`` with a consistent snapshot of ``source``.
+
+    Stands in for replication when the primary and its replicas are local
+    SQLite files.
+    """
+    source_connection, target_connection = connections[source], connections[target]
+    for connection in (source_connection, target_connection):
+        if connection.vendor != 'sqlite':
+            raise ValueError(f"'{connection.alias}' is not a SQLite database.")
+    source_connection.ensure_connection()
+    target_connection.ensure_connection()
+    source_connection.connection.backup(target_connection.connection)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is None or not routing.use_replicas or routing.wrote:
+            return DEFAULT_DB_ALIAS
+        replicas = get_replicas()
+        if not replicas or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary and receive its schema with its data
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Decide per request whether reads may use replicas, and pin writers to the primary.
+
+    Should come before the session middleware, so session reads are routed
+    too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not get_replicas():
+            return self.get_response(request)
+        routing = self.start(request)
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(request, response, routing)
+
+    async def __acall__(self, request):
+        if not get_replicas():
+            return await self.get_response(request)
+        routing = self.start(request)
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(request, response, routing)
+
+    def start(self, request):
+        return RequestRouting(request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES)
+
+    def finish(self, request, response, routing):
+        if routing.wrote or request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                httponly=True,
+                samesite='Lax',
+            )
+        return wrap_streaming_content(response, _routing, routing)
+
+
+def wrap_streaming_content(response, variable, value):
+    """Keep context variable ``variable`` at ``value`` while a sync streamed body is read.
+
+    Streamed bodies are read after the middleware that set it has returned.
+    """
+    if response.streaming and not response.is_async:
+        response.streaming_content = _with_context(response.streaming_content, variable, value)
+    return response
+
+
+def _with_context(content, variable, value):
+    """Iterate ``content`` with ``variable`` set to ``value`` for each step"""
+    iterator = iter(content)
+    while True:
+        token = variable.set(value)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            variable.reset(token)
+        yield chunk
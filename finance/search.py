@@ -0,0 +1,138 @@
+"""Indexed full-text search over ``Transaction.description``.
+
+The index lives outside the Django model and is created by migration 0004:
+
+* PostgreSQL: a generated ``search_vector tsvector`` column with a GIN index;
+* SQLite: an FTS5 external-content table, ``finance_transaction_fts``, kept
+  in sync with ``finance_transaction`` by triggers, so ``bulk_create``, raw
+  SQL and cascading deletes are indexed too.
+
+Search text is split into words; every word must match as a prefix, and
+results are annotated with ``search_rank`` (higher is better).  Other
+backends fall back to ``icontains`` with a constant rank.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'finance_transaction_fts'
+TEXT_SEARCH_CONFIG = 'simple'
+MAX_TERMS = 8
+
+SEARCH_VECTOR = '"finance_transaction"."search_vector"'
+TSQUERY = f"to_tsquery('{TEXT_SEARCH_CONFIG}', %s)"
+
+TERM_PATTERN = re.compile(r'\w+')
+
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_insert': (
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON finance_transaction BEGIN '
+        f'INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); '
+        'END'
+    ),
+    f'{FTS_TABLE}_delete': (
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON finance_transaction BEGIN '
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description); "
+        'END'
+    ),
+    f'{FTS_TABLE}_update': (
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF description ON finance_transaction BEGIN '
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description) VALUES ('delete', old.id, old.description); "
+        f'INSERT INTO {FTS_TABLE}(rowid, description) VALUES (new.id, new.description); '
+        'END'
+    ),
+}
+
+
+def parse_terms(text):
+    """Lower-cased words of ``text``, at most ``MAX_TERMS`` of them"""
+    return TERM_PATTERN.findall(text.lower())[:MAX_TERMS]
+
+
+def _fts5_query(terms):
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _tsquery(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def match(text, using='default'):
+    """Condition for ``QuerySet.filter`` selecting transactions matching ``text``"""
+    terms = parse_terms(text)
+    if not terms:
+        return Q(pk__in=[])
+
+    vendor = connections[using].vendor
+    if vendor == 'postgresql':
+        return RawSQL(
+            f'{SEARCH_VECTOR} @@ {TSQUERY}',
+            [_tsquery(terms)],
+            output_field=BooleanField(),
+        )
+    if vendor == 'sqlite':
+        return RawSQL(
+            f'"finance_transaction"."id" IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)',
+            [_fts5_query(terms)],
+            output_field=BooleanField(),
+        )
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(description__icontains=term)
+    return condition
+
+
+def search(queryset, text):
+    """Filter ``queryset`` to matches of ``text`` and annotate ``search_rank``"""
+    terms = parse_terms(text)
+    if not terms:
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        # Join the FTS5 table so bm25 is computed once, during the MATCH; a
+        # correlated rank subquery would re-run the MATCH for every row.
+        # FTS5's rank is lower for better matches, so negate it.
+        return queryset.extra(
+            select={'search_rank': f'-{FTS_TABLE}.rank'},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = "finance_transaction"."id"', f'{FTS_TABLE} MATCH %s'],
+            params=[_fts5_query(terms)],
+        )
+
+    queryset = queryset.filter(match(text, using=queryset.db))
+    if vendor == 'postgresql':
+        rank = RawSQL(
+            f'ts_rank({SEARCH_VECTOR}, {TSQUERY})',
+            [_tsquery(terms)],
+            output_field=FloatField(),
+        )
+    else:
+        rank = Value(0.0, output_field=FloatField())
+    return queryset.annotate(search_rank=rank)
+
+
+def ensure_index(sender=None, using='default', **kwargs):
+    """Recreate the SQLite sync triggers if a table rebuild dropped them.
+
+    Django's SQLite schema editor alters tables by copying them, which drops
+    their triggers; connected to ``post_migrate`` so any such migration is
+    followed by reinstalling the triggers and rebuilding the index.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master WHERE name = %s OR (type = 'trigger' AND name LIKE %s)",
+            [FTS_TABLE, f'{FTS_TABLE}_%'],
+        )
+        existing = {name for _, name in cursor.fetchall()}
+        if FTS_TABLE not in existing or set(SQLITE_TRIGGERS) <= existing:
+            return
+        for statement in SQLITE_TRIGGERS.values():
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
@@ -0,0 +1,317 @@
+"""Deterministic synthetic data for load tests and local profiling.
+
+``create_users`` adds users named ``<prefix><index>`` and ``seed`` gives them
+categories, budgets for every period and a transaction history spread over
+the last ``months`` months:
+
+* users' volumes follow a Zipf-like skew, the first user being the busiest;
+* each user gets their own mix of category profiles, with seasonal months
+  (utilities in winter, travel in summer, gifts in December), log-normal
+  amounts, a monthly salary and rent, and a slowly growing activity;
+* rows are inserted in date order, with batched multi-row ``INSERT``s on
+  SQLite and other backends and ``COPY`` on PostgreSQL, and rollups are
+  rebuilt once per user.
+
+Every user's data comes from a random generator seeded with the seed and the
+user's index, so a seed, user count and end date always produce the same
+rows, in any number of worker processes.  The end date defaults to the fixed
+``END_DATE`` rather than today, so the data does not change from one day to
+the next.  Users are seeded in one database transaction each, on their own
+shard.
+"""
+import calendar
+import io
+import math
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from . import rollups, sharding
+from .models import Budget, Category, MonthlyRollup, Transaction
+
+PERIOD_MONTHS = {'Weekly': 12 / 52, 'Monthly': 1, 'Quarterly': 3, 'Yearly': 12}
+# Last day of seeded histories unless another end date is given
+END_DATE = date(2025, 12, 31)
+TRANSACTION_COLUMNS = ('user_id', 'type', 'amount', 'date', 'category_id', 'description', 'created_at', 'updated_at')
+
+
+@dataclass(frozen=True)
+class CategoryProfile:
+    """How often, when and how much a category of transactions occurs"""
+    name: str
+    type: str
+    weight: float
+    median_cents: int
+    spread: float
+    # Relative activity in January to December
+    seasons: tuple
+    merchants: tuple
+
+
+FLAT = (1,) * 12
+PROFILES = (
+    CategoryProfile('Groceries', 'Expense', 30, 4500, 0.6, (1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1.1, 1.3),
+                    ('Fresh Market', 'Corner Grocer', 'SuperSave', 'Farmers Market', 'Organic Pantry')),
+    CategoryProfile('Dining', 'Expense', 15, 2800, 0.7, (0.8, 0.9, 1, 1, 1.1, 1.2, 1.3, 1.2, 1, 1, 1, 1.4),
+                    ('Trattoria Roma', 'Sushi Bar', 'Burger Joint', 'Cafe Central', 'Noodle House')),
+    CategoryProfile('Coffee', 'Expense', 12, 450, 0.3, FLAT, ('Bean There', 'Daily Grind', 'Espresso Lab')),
+    CategoryProfile('Transport', 'Expense', 12, 3500, 0.8, FLAT,
+                    ('City Transit', 'Fuel Station', 'Ride Share', 'Train Ticket')),
+    CategoryProfile('Utilities', 'Expense', 4, 9000, 0.35, (1.6, 1.5, 1.3, 1, 0.8, 0.7, 0.7, 0.7, 0.8, 1, 1.3, 1.6),
+                    ('Power & Light', 'Water Works', 'Gas Utility', 'Internet Provider')),
+    CategoryProfile('Shopping', 'Expense', 8, 6000, 1.0, (1.2, 0.8, 0.9, 0.9, 1, 1, 1, 1, 1, 1, 1.6, 2.2),
+                    ('Online Store', 'Department Store', 'Electronics Hub', 'Bookshop')),
+    CategoryProfile('Travel', 'Expense', 3, 35000, 0.9, (0.5, 0.6, 0.8, 1, 1, 1.5, 2.5, 2.2, 1, 0.7, 0.5, 1.3),
+                    ('Airline', 'Hotel', 'Car Rental')),
+    CategoryProfile('Health', 'Expense', 4, 5500, 0.8, (1.5, 1.2, 1, 1, 1, 0.9, 0.8, 0.8, 1, 1, 1, 0.9),
+                    ('Pharmacy', 'Dental Clinic', 'Gym Membership')),
+    CategoryProfile('Entertainment', 'Expense', 6, 2200, 0.7, (1, 1, 1, 1, 1, 1.1, 1.2, 1.2, 1, 1, 1, 1.3),
+                    ('Cinema', 'Streaming Service', 'Concert Tickets', 'Game Store')),
+    CategoryProfile('Gifts', 'Expense', 2, 5000, 0.8, (0.5, 1.5, 0.7, 0.7, 1, 0.8, 0.7, 0.7, 0.8, 0.9, 1.2, 4),
+                    ('Gift Shop', 'Florist')),
+    CategoryProfile('Freelance', 'Income', 3, 60000, 0.6, FLAT, ('Client Payment', 'Consulting Invoice')),
+    CategoryProfile('Refunds', 'Income', 2, 3000, 0.8, (1.8, 1.2, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1),
+                    ('Store Refund', 'Warranty Refund')),
+)
+# Once a month, on a fixed day, for every user
+SALARY = CategoryProfile('Salary', 'Income', 0, 400000, 0.4, FLAT, ('Payroll',))
+RENT = CategoryProfile('Rent', 'Expense', 0, 120000, 0.3, FLAT, ('Landlord',))
+FIXED = ((SALARY, 25), (RENT, 1))
+
+
+def allocate(total, weights):
+    """Split ``total`` into integers proportional to ``weights`` (largest remainder)"""
+    scale = sum(weights)
+    if total <= 0 or not scale:
+        return [0] * len(weights)
+    shares = [total * weight / scale for weight in weights]
+    counts = [int(share) for share in shares]
+    by_remainder = sorted(range(len(weights)), key=lambda index: (counts[index] - shares[index], index))
+    for index in by_remainder[:total - sum(counts)]:
+        counts[index] += 1
+    return counts
+
+
+def user_counts(rows, users, skew=1.0):
+    """Transactions for each of ``users`` users, the ``n``-th getting a share of ``1 / n ** skew``"""
+    return allocate(rows, [1 / (rank + 1) ** skew for rank in range(users)])
+
+
+def month_starts(end_date, months):
+    """First days of the ``months`` months up to and including ``end_date``'s"""
+    year, month = end_date.year, end_date.month
+    starts = []
+    for _ in range(months):
+        starts.append(date(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return starts[::-1]
+
+
+def supports_parallel_writes():
+    """Whether every database holding finance data accepts concurrent writers from several processes"""
+    aliases = sharding.get_shards() or [DEFAULT_DB_ALIAS]
+    return all(connections[alias].vendor != 'sqlite' for alias in aliases)
+
+
+def create_users(count, prefix, password=None):
+    """Create ``count`` users named ``<prefix><index>``; returns them in index order"""
+    hashed = make_password(password)
+    User.objects.bulk_create(
+        [User(username=f'{prefix}{index}', password=hashed) for index in range(count)], batch_size=1000,
+    )
+    by_name = {user.username: user for user in User.objects.filter(username__startswith=prefix)}
+    users = [by_name[f'{prefix}{index}'] for index in range(count)]
+    # bulk_create skips the signal copying users to their shards
+    for user in users if sharding.get_shards() else ():
+        sharding.copy_user(user, sharding.shard_for(user.pk))
+    return users
+
+
+def delete_users(prefix):
+    """Delete the users named ``<prefix>...``, removing their finance rows in bulk first"""
+    ids = list(User.objects.filter(username__startswith=prefix).values_list('pk', flat=True))
+    if not ids:
+        return 0
+    for alias in sharding.get_shards() or [DEFAULT_DB_ALIAS]:
+        for model in (MonthlyRollup, Budget, Transaction, Category):
+            sharding.raw_delete(model._base_manager.using(alias).filter(user_id__in=ids), alias)
+    User.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def seed(users, rows, seed=0, skew=1.0, end_date=END_DATE, months=24, workers=1, batch_size=5000, progress=None):
+    """Give ``users`` (busiest first) ``rows`` transactions in total, with categories and budgets.
+
+    With ``workers`` above one, users are seeded by that many forked
+    processes; see ``supports_parallel_writes``.  ``progress`` is called
+    with each user's transaction count as they finish.  Returns the number
+    of transactions created.
+    """
+    tasks = [
+        (user.pk, index, count, seed, end_date, months, batch_size)
+        for index, (user, count) in enumerate(zip(users, user_counts(rows, len(users), skew)))
+    ]
+    progress = progress or (lambda count: None)
+    created = 0
+    if workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        # Children must open their own connections, never share the parent's
+        connections.close_all()
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            for count in pool.map(_seed_task, tasks):
+                created += count
+                progress(count)
+    else:
+        for task in tasks:
+            count = _seed_task(task)
+            created += count
+            progress(count)
+    return created
+
+
+def _seed_task(task):
+    user_id, index, count, seed_value, end_date, months, batch_size = task
+    user = User.objects.get(pk=user_id)
+    return seed_user(user, random.Random(f'{seed_value}:{index}'), count, end_date, months, batch_size)
+
+
+def seed_user(user, rng, count, end_date, months=24, batch_size=5000):
+    """Create ``user``'s categories, budgets and ``count`` transactions; returns the transactions created"""
+    alias = sharding.shard_for(user.pk)
+    scale = math.exp(rng.gauss(0, 0.3))
+    profiles = [PROFILES[0]] + [profile for profile in PROFILES[1:] if rng.random() < 0.85]
+    weights = [profile.weight * math.exp(rng.gauss(0, 0.5)) for profile in profiles]
+    starts = month_starts(end_date, months)
+    fixed = [(profile, day, int(profile.median_cents * scale * math.exp(rng.gauss(0, profile.spread))))
+             for profile, day in FIXED]
+    # Users with too few transactions for a monthly salary and rent only get the variable ones
+    with_fixed = count >= len(fixed) * len(starts)
+    variable_count = count - len(fixed) * len(starts) if with_fixed else count
+
+    with sharding.for_user(user.pk), transaction.atomic(using=alias):
+        categories = Category.objects.bulk_create([
+            Category(user=user, name=profile.name) for profile in profiles + [profile for profile, _ in FIXED]
+        ])
+        category_ids = {category.name: category.pk for category in categories}
+
+        # Budgets of every period on the biggest expense categories, set near the expected spending
+        monthly_spend = {
+            profile.name: variable_count / len(starts) * weight / sum(weights)
+            * profile.median_cents * scale * math.exp(profile.spread ** 2 / 2)
+            for profile, weight in zip(profiles, weights) if profile.type == 'Expense'
+        }
+        budgets = []
+        for name in sorted(monthly_spend, key=monthly_spend.get, reverse=True)[:4]:
+            for period, period_months in PERIOD_MONTHS.items():
+                cents = monthly_spend[name] * period_months * rng.uniform(0.8, 1.4)
+                budgets.append(Budget(
+                    user=user, category_id=category_ids[name], period=period,
+                    limit=Decimal(max(10, round(cents / 100))),
+                ))
+        Budget.objects.bulk_create(budgets)
+
+        write = _copy_transactions if connections[alias].vendor == 'postgresql' else _insert_transactions
+        month_weights = [
+            (1 + 0.3 * position / len(starts)) * sum(
+                weight * profile.seasons[start.month - 1] for profile, weight in zip(profiles, weights)
+            )
+            for position, start in enumerate(starts)
+        ]
+        created = 0
+        for start, month_count in zip(starts, allocate(variable_count, month_weights)):
+            last_day = calendar.monthrange(start.year, start.month)[1]
+            if (start.year, start.month) == (end_date.year, end_date.month):
+                last_day = end_date.day
+            rows = _month_rows(rng, start, last_day, month_count, profiles, weights, scale, category_ids)
+            if with_fixed:
+                rows += [
+                    (start.replace(day=min(day, last_day)), profile.type, cents,
+                     category_ids[profile.name], profile.merchants[0])
+                    for profile, day, cents in fixed
+                ]
+            rows.sort(key=lambda row: row[0])
+            write(alias, user.pk, rows, batch_size)
+            created += len(rows)
+        rollups.rebuild(user)
+    return created
+
+
+def _month_rows(rng, start, last_day, count, profiles, weights, scale, category_ids):
+    """``count`` rows of ``(date, type, cents, category_id, description)`` in ``start``'s month"""
+    seasonal = [weight * profile.seasons[start.month - 1] for profile, weight in zip(profiles, weights)]
+    rows = []
+    for profile in rng.choices(profiles, weights=seasonal, k=count):
+        cents = max(1, int(profile.median_cents * scale * math.exp(rng.gauss(0, profile.spread))))
+        rows.append((
+            start.replace(day=rng.randint(1, last_day)),
+            profile.type,
+            cents,
+            category_ids[profile.name],
+            rng.choice(profile.merchants),
+        ))
+    return rows
+
+
+def _insert_transactions(alias, user_id, rows, batch_size):
+    """Load ``rows`` with prepared multi-row ``INSERT``s of ``batch_size`` rows.
+
+    Values are converted once per row rather than field by field through
+    ``bulk_create``, which would spend more time compiling than inserting.
+    """
+    connection = connections[alias]
+    ops, quote = connection.ops, connection.ops.quote_name
+    now = ops.adapt_datetimefield_value(timezone.now())
+    per_statement = max(1, min(batch_size, ops.bulk_batch_size(TRANSACTION_COLUMNS, rows) or batch_size))
+    values = [
+        (user_id, type, f'{cents // 100}.{cents % 100:02d}', ops.adapt_datefield_value(day), category_id,
+         description, now, now)
+        for day, type, cents, category_id, description in rows
+    ]
+    placeholders = f"({', '.join(['%s'] * len(TRANSACTION_COLUMNS))})"
+    prefix = (
+        f'INSERT INTO {quote(Transaction._meta.db_table)} '
+        f"({', '.join(quote(column) for column in TRANSACTION_COLUMNS)}) VALUES "
+    )
+    with connection.cursor() as cursor:
+        # The backend's own cursor: with DEBUG on, Django's would also log every statement
+        raw = cursor.cursor
+        for start in range(0, len(values), per_statement):
+            batch = values[start:start + per_statement]
+            raw.execute(prefix + ', '.join([placeholders] * len(batch)), [value for row in batch for value in row])
+
+
+def _copy_transactions(alias, user_id, rows, batch_size):
+    """Load ``rows`` with PostgreSQL's ``COPY ... FROM STDIN`` (psycopg 2 or 3)"""
+    now = timezone.now().isoformat()
+    data = io.StringIO()
+    for day, type, cents, category_id, description in rows:
+        data.write(
+            f'{user_id}\t{type}\t{cents // 100}.{cents % 100:02d}\t{day.isoformat()}\t{category_id}\t'
+            f'{_copy_text(description)}\t{now}\t{now}\n'
+        )
+    data.seek(0)
+    connection = connections[alias]
+    quote = connection.ops.quote_name
+    sql = (
+        f'COPY {quote(Transaction._meta.db_table)} '
+        f"({', '.join(quote(column) for column in TRANSACTION_COLUMNS)}) FROM STDIN"
+    )
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            raw.copy_expert(sql, data)
+        else:
+            with raw.copy(sql) as copy:
+                copy.write(data.getvalue())
+
+
+def _copy_text(value):
+    """``value`` escaped for COPY's text format"""
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
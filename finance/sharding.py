@@ -0,0 +1,281 @@
+"""Spread users' finance data over several databases by user id.
+
+With ``SHARD_DATABASES`` listing database aliases, every user's
+``Category``, ``Transaction``, ``Budget`` and ``MonthlyRollup`` rows live on
+one of them, chosen by rendezvous hashing of the user id: the shard whose
+``md5("<alias>:<user id>")`` is highest.  The choice is stable across
+processes and releases, and adding a shard only moves the users who now
+hash to it (see the ``rebalance_shards`` command).
+
+Everything else (users, sessions, the admin log) stays on ``default``.
+Each shard keeps a copy of a user's ``auth_user`` row, so foreign keys to
+``User`` hold within the shard; ``finance.signals`` keeps it in step.
+
+``ShardRouter`` routes a query on a sharded model by, in order:
+
+* the database of an instance it was given, or the shard of the user the
+  instance belongs to;
+* the shard set with ``use_shard``/``for_user`` for the current block;
+* the shard of the request's user, set by ``ShardMiddleware``.
+
+Queries that can resolve none of these raise ``ShardingError`` instead of
+silently reading another user's shard.  Consequently the admin shows the
+finance rows of the logged-in staff member's shard only, and sharded models
+are always read from the shard itself, never from a read replica.
+"""
+import hashlib
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from . import rollups
+from .models import Budget, Category, MonthlyRollup, Transaction
+from .routers import wrap_streaming_content
+
+SHARDED_MODELS = {'category', 'transaction', 'budget', 'monthlyrollup'}
+
+_current = ContextVar('finance_shard', default=None)
+
+
+class ShardingError(RuntimeError):
+    """A query on a sharded model could not be routed to a shard"""
+
+
+def get_shards():
+    return getattr(settings, 'SHARD_DATABASES', [])
+
+
+def is_sharded(model):
+    return model._meta.app_label == 'finance' and model._meta.model_name in SHARDED_MODELS
+
+
+def shard_for(user_id, shards=None):
+    """Database alias holding ``user_id``'s finance data"""
+    shards = get_shards() if shards is None else shards
+    if not shards:
+        return DEFAULT_DB_ALIAS
+    return max(shards, key=lambda alias: hashlib.md5(f'{alias}:{user_id}'.encode()).digest())
+
+
+@contextmanager
+def use_shard(alias):
+    """Route unhinted queries on sharded models to ``alias`` within the block.
+
+    ``alias`` may also be a callable returning a user id, resolved per query.
+    """
+    token = _current.set(alias)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def for_user(user_id):
+    """Route unhinted queries on sharded models to ``user_id``'s shard within the block"""
+    if not get_shards():
+        return nullcontext()
+    return use_shard(shard_for(user_id))
+
+
+def current_shard():
+    """The shard selected for the current block or request, if any"""
+    current = _current.get()
+    if callable(current):
+        user_id = current()
+        return shard_for(user_id) if user_id is not None else None
+    return current
+
+
+def using_user(queryset, user):
+    """``queryset`` pinned to ``user``'s shard when sharding is enabled"""
+    if not get_shards():
+        return queryset
+    return queryset.using(shard_for(user.pk))
+
+
+def copy_user(user, alias):
+    """Create or refresh the copy of ``user``'s row on shard ``alias``"""
+    values = {field.attname: getattr(user, field.attname) for field in User._meta.concrete_fields}
+    copies = User._base_manager.using(alias)
+    if not copies.filter(pk=user.pk).update(**values):
+        copies.bulk_create([User(**values)])
+
+
+def delete_user(user_id, alias):
+    """Delete ``user_id``'s copy on shard ``alias`` with all their finance data"""
+    with use_shard(alias):
+        User._base_manager.using(alias).filter(pk=user_id).delete()
+
+
+def user_ids(alias):
+    """Ids of the users with finance data on database ``alias``"""
+    ids = set()
+    for model in (Category, Transaction, Budget):
+        ids.update(model._base_manager.using(alias).values_list('user_id', flat=True).distinct())
+    return ids
+
+
+def move_user(user_id, source, target):
+    """Move ``user_id``'s finance data from database ``source`` to ``target``.
+
+    Rows get new primary keys on ``target``; categories are matched by name,
+    so data already on ``target`` is merged rather than duplicated.  The
+    copy commits before the originals are deleted, so a failure part way
+    leaves the data on ``source``.  Returns the number of rows moved per
+    model name.
+    """
+    user = User.objects.get(pk=user_id)
+    moved = {}
+    with transaction.atomic(using=source), transaction.atomic(using=target):
+        copy_user(user, target)
+
+        existing = dict(Category._base_manager.using(target).filter(user_id=user_id).values_list('name', 'pk'))
+        categories = list(Category._base_manager.using(source).filter(user_id=user_id).order_by('pk'))
+        category_ids, new_categories = {}, []
+        for category in categories:
+            if category.name in existing:
+                category_ids[category.pk] = existing[category.name]
+            else:
+                new_categories.append((category.pk, _detached(category, target)))
+        _bulk_copy(Category, [category for _, category in new_categories], target)
+        category_ids.update((pk, category.pk) for pk, category in new_categories)
+        moved['category'] = len(categories)
+
+        transactions = []
+        for item in Transaction._base_manager.using(source).filter(user_id=user_id).order_by('pk').iterator():
+            item.category_id = category_ids[item.category_id]
+            transactions.append(_detached(item, target))
+        _bulk_copy(Transaction, transactions, target)
+        moved['transaction'] = len(transactions)
+
+        taken = set(
+            Budget._base_manager.using(target).filter(user_id=user_id).values_list('category_id', 'period')
+        )
+        budgets = []
+        for budget in Budget._base_manager.using(source).filter(user_id=user_id).order_by('pk'):
+            budget.category_id = category_ids[budget.category_id]
+            if (budget.category_id, budget.period) in taken:
+                continue
+            budgets.append(_detached(budget, target))
+        _bulk_copy(Budget, budgets, target)
+        moved['budget'] = len(budgets)
+
+        with use_shard(target):
+            rollups.rebuild(user)
+
+        with use_shard(source):
+            # Skip the collector: the rows are gone from the user's view and
+            # their rollups must not be adjusted on the way out
+            for model in (MonthlyRollup, Budget, Transaction, Category):
+                raw_delete(model._base_manager.using(source).filter(user_id=user_id), source)
+            if source != DEFAULT_DB_ALIAS:
+                raw_delete(User._base_manager.using(source).filter(pk=user_id), source)
+    return moved
+
+
+def _detached(instance, alias):
+    """``instance`` turned into an unsaved row for database ``alias``"""
+    instance.pk = None
+    instance._state.adding, instance._state.db = True, alias
+    return instance
+
+
+def raw_delete(queryset, using):
+    """Delete ``queryset``'s rows on ``using`` in one ``DELETE``; returns how many were deleted.
+
+    No rows are loaded and no delete signals are sent, so callers adjust
+    rollups and invalidate caches themselves, and delete referencing rows
+    first.  ``QuerySet.delete()`` would fetch every row to send
+    ``post_delete`` for it.  ``QuerySet._raw_delete`` is private, but it is
+    what ``delete()`` runs for its own fast deletes, so it is kept in step
+    with the query compiler; ``ShardingTests.test_raw_delete`` checks that it
+    still issues a single statement and sends no signals.
+    """
+    return queryset._raw_delete(using=using)
+
+
+def _bulk_copy(model, objects, alias):
+    """``bulk_create`` keeping the originals' ``auto_now``/``auto_now_add`` timestamps"""
+    stamps = [(item.created_at, item.updated_at) for item in objects]
+    model._base_manager.using(alias).bulk_create(objects, batch_size=500)
+    for item, (created_at, updated_at) in zip(objects, stamps):
+        item.created_at, item.updated_at = created_at, updated_at
+    model._base_manager.using(alias).bulk_update(objects, ['created_at', 'updated_at'], batch_size=500)
+
+
+class ShardRouter:
+    """Route sharded models to their user's shard; defer everything else"""
+
+    def _db(self, model, hints):
+        if not is_sharded(model) or not get_shards():
+            return None
+        instance = hints.get('instance')
+        if instance is not None:
+            if isinstance(instance, User):
+                return shard_for(instance.pk)
+            if instance._state.db in get_shards():
+                return instance._state.db
+            if getattr(instance, 'user_id', None) is not None:
+                return shard_for(instance.user_id)
+        alias = current_shard()
+        if alias is None:
+            raise ShardingError(
+                f'No shard selected for {model._meta.label}: query it through a user instance, '
+                f'within use_shard()/for_user(), or in a request by a logged-in user.'
+            )
+        return alias
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Users are copied to every shard holding their data
+        if get_shards() and (is_sharded(obj1) or is_sharded(obj2)):
+            return True
+        return None
+
+
+class ShardMiddleware:
+    """Route the request's queries on sharded models to its user's shard.
+
+    Must come after the authentication middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not get_shards():
+            return self.get_response(request)
+        selector = self.selector(request)
+        with use_shard(selector):
+            response = self.get_response(request)
+        return self.finish(response, selector)
+
+    async def __acall__(self, request):
+        if not get_shards():
+            return await self.get_response(request)
+        selector = self.selector(request)
+        with use_shard(selector):
+            response = await self.get_response(request)
+        return self.finish(response, selector)
+
+    def selector(self, request):
+        # Resolved lazily: async views authenticate the user themselves
+        return lambda: request.user.pk
+
+    def finish(self, response, selector):
+        return wrap_streaming_content(response, _current, selector)
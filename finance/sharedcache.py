@@ -0,0 +1,401 @@
+"""Cache backend shared by the worker processes of a host, in a memory-mapped file.
+
+Gunicorn workers each have their own local-memory cache, so a user's
+dashboard is cached once per worker and invalidated in only one of them
+unless every worker is reached.  ``SharedMemoryCache`` keeps a single cache
+in a file that every worker maps into memory; on ``/dev/shm`` it never
+touches a disk.  Configure it with::
+
+    CACHES = {'default': {
+        'BACKEND': 'finance.sharedcache.SharedMemoryCache',
+        'LOCATION': '/dev/shm/finance-cache',
+        'OPTIONS': {'SIZE': 32 * 1024 * 1024, 'MAX_ENTRIES': 16384},
+    }}
+
+The file takes ``SIZE`` (32 MiB by default) plus 32 bytes per entry, all
+reserved when a process first opens it, so a full ``/dev/shm`` fails then
+with ENOSPC instead of as a SIGBUS mid-request.  Docker gives containers a
+64 MiB ``/dev/shm``, which the metrics (``METRICS_DIR``) share; run with a
+larger ``--shm-size`` for a larger cache.
+
+The file holds a header, a set-associative table of ``MAX_ENTRIES`` slots
+(keys hash to a set of ``WAYS`` slots, so a lookup reads at most ``WAYS``
+slots) and ``SIZE`` bytes of fixed-size blocks, chained to hold each
+pickled key and value.  Entries expire at their timeout; a new key replaces
+the least recently used entry of its set when the set is full, and when the
+blocks run out, the least recently used entries of successive sets are
+evicted until the value fits.
+
+Every operation holds an exclusive ``flock`` on the file, together with a
+lock between the threads of the process, so workers never see a
+half-written entry.  Values are pickled and unpickled outside the lock,
+except by ``incr``.  The header is marked dirty from an operation's first
+write to the file until it completes, so a process killed, or an operation
+failing, while changing the file makes the next process to take the lock
+empty the cache rather than read it.  Operations do everything that can
+fail, such as unpickling, before their first write.
+The file is sized and laid out by the first process to open it; when a
+process finds a different layout, it lays the file out anew.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MAGIC = b'FINCACHE'
+LAYOUT_VERSION = 1
+WAYS = 8
+EMPTY = 0
+NO_BLOCK = -1
+
+# magic, layout version, sets, ways, blocks, block size, dirty, free list head, free blocks,
+# first never used block, clock
+HEADER = struct.Struct('<8sIIIIIIiIIQ')
+HEADER_SIZE = 64
+# key hash (0 when empty), expiry (0 for never), last use, first block, payload length
+SLOT = struct.Struct('<QdQiI')
+# next block of the chain
+BLOCK_HEADER = struct.Struct('<i')
+# key length, at the start of every payload
+KEY_LENGTH = struct.Struct('<I')
+
+LAYOUT_SIZE = 28  # magic to block size
+DIRTY_OFFSET = 28
+FREE_OFFSET = 32
+UNUSED_OFFSET = 40
+CLOCK_OFFSET = 44
+
+
+class SharedMemoryCache(BaseCache):
+    """Django cache backend in a file mapped into the memory of every process"""
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        options = params.get('OPTIONS', {})
+        if 'max_entries' not in params and 'MAX_ENTRIES' not in options:
+            params = {**params, 'max_entries': 16384}
+        super().__init__(params)
+        self._path = location
+        self._sets = max(1, -(-self._max_entries // WAYS))
+        self._block_size = int(options.get('BLOCK_SIZE', 512))
+        self._blocks = max(1, int(options.get('SIZE', 32 * 1024 * 1024)) // self._block_size)
+        self._slots_offset = HEADER_SIZE
+        self._blocks_offset = HEADER_SIZE + self._sets * WAYS * SLOT.size
+        self._size = self._blocks_offset + self._blocks * self._block_size
+        self._data_size = self._block_size - BLOCK_HEADER.size
+        self._layout = HEADER.pack(MAGIC, LAYOUT_VERSION, self._sets, WAYS, self._blocks, self._block_size, 0, 0, 0, 0, 0)
+        self._layout = self._layout[:LAYOUT_SIZE]
+        self._thread_lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._map = None
+        self._written = False
+
+    # Mapping and locking
+
+    def _open(self):
+        """Map the file in this process.
+
+        Reopened after a fork: a lock taken through an inherited descriptor
+        would not exclude the parent.  The file only ever grows, so other
+        processes' mappings stay valid, and its space is reserved: writing to
+        an unbacked page of a full tmpfs would kill the process with SIGBUS.
+        """
+        if self._pid == os.getpid():
+            return
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file = open(self._path, 'a+b')
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            if os.fstat(file.fileno()).st_size < self._size:
+                file.truncate(self._size)
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(file.fileno(), 0, self._size)
+            self._map = mmap.mmap(file.fileno(), self._size)
+        except OSError as exc:
+            file.close()
+            raise OSError(
+                exc.errno,
+                f'Cannot map {self._size:,} bytes of shared cache at {self._path}: {exc.strerror}; '
+                f"lower its OPTIONS['SIZE'] or give it more space (docker run --shm-size)",
+            ) from exc
+        finally:
+            if not file.closed:
+                fcntl.flock(file, fcntl.LOCK_UN)
+        self._file = file
+        self._pid = os.getpid()
+
+    def _initialize(self):
+        """Lay out an empty cache: all slots empty, all blocks free and never used"""
+        self._map[:self._blocks_offset] = bytes(self._blocks_offset)
+        HEADER.pack_into(
+            self._map, 0, MAGIC, LAYOUT_VERSION, self._sets, WAYS, self._blocks, self._block_size,
+            0, NO_BLOCK, self._blocks, 0, 0,
+        )
+
+    def _locked(self, function, *args):
+        """Run ``function(*args)`` holding both locks, with the cache marked dirty once it writes"""
+        if self._pid is not None and self._pid != os.getpid():
+            # Forked: the parent's threads may have held the lock
+            self._thread_lock = threading.Lock()
+        with self._thread_lock:
+            self._open()
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                if self._map[DIRTY_OFFSET] or self._map[:LAYOUT_SIZE] != self._layout:
+                    # A new file, one laid out by differently configured
+                    # processes, or one a process died while changing
+                    self._initialize()
+                self._written = False
+                completed = False
+                try:
+                    result = function(*args)
+                    completed = True
+                    return result
+                finally:
+                    # Clean unless the function failed after its first write
+                    if completed or not self._written:
+                        self._map[DIRTY_OFFSET] = 0
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def _mark_dirty(self):
+        """Called before every write to the file, with the locks held"""
+        if not self._written:
+            self._written = True
+            self._map[DIRTY_OFFSET] = 1
+
+    # Layout helpers, called with the locks held
+
+    def _slot_offset(self, slot):
+        return self._slots_offset + slot * SLOT.size
+
+    def _block_offset(self, block):
+        return self._blocks_offset + block * self._block_size
+
+    def _tick(self):
+        self._mark_dirty()
+        clock = struct.unpack_from('<Q', self._map, CLOCK_OFFSET)[0] + 1
+        struct.pack_into('<Q', self._map, CLOCK_OFFSET, clock)
+        return clock
+
+    def _hash(self, key):
+        digest = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+        return digest or 1
+
+    def _find(self, key, key_hash):
+        """Slot holding ``key``, or None"""
+        first = (key_hash % self._sets) * WAYS
+        for slot in range(first, first + WAYS):
+            stored_hash, _, _, block, length = SLOT.unpack_from(self._map, self._slot_offset(slot))
+            if stored_hash == key_hash and self._read_key(block) == key:
+                return slot
+        return None
+
+    def _read_key(self, block):
+        offset = self._block_offset(block) + BLOCK_HEADER.size
+        (length,) = KEY_LENGTH.unpack_from(self._map, offset)
+        if KEY_LENGTH.size + length <= self._data_size:
+            start = offset + KEY_LENGTH.size
+            return bytes(self._map[start:start + length])
+        return self._read_payload(block, KEY_LENGTH.size + length)[KEY_LENGTH.size:]
+
+    def _read_payload(self, block, length):
+        chunks = []
+        while length > 0:
+            offset = self._block_offset(block)
+            chunk = min(length, self._data_size)
+            chunks.append(self._map[offset + BLOCK_HEADER.size:offset + BLOCK_HEADER.size + chunk])
+            length -= chunk
+            (block,) = BLOCK_HEADER.unpack_from(self._map, offset)
+        return b''.join(chunks)
+
+    def _is_live(self, slot, now):
+        key_hash, expires, _, _, _ = SLOT.unpack_from(self._map, self._slot_offset(slot))
+        return key_hash != EMPTY and (not expires or expires > now)
+
+    def _free(self, slot):
+        """Empty ``slot`` and return its blocks to the free list"""
+        offset = self._slot_offset(slot)
+        key_hash, _, _, first, length = SLOT.unpack_from(self._map, offset)
+        if key_hash == EMPTY:
+            return
+        self._mark_dirty()
+        SLOT.pack_into(self._map, offset, EMPTY, 0.0, 0, NO_BLOCK, 0)
+        count = max(1, -(-length // self._data_size))
+        last = first
+        for _ in range(count - 1):
+            (last,) = BLOCK_HEADER.unpack_from(self._map, self._block_offset(last))
+        head, free = struct.unpack_from('<iI', self._map, FREE_OFFSET)
+        BLOCK_HEADER.pack_into(self._map, self._block_offset(last), head)
+        struct.pack_into('<iI', self._map, FREE_OFFSET, first, free + count)
+
+    def _evict_from_set(self, index, now):
+        """Free the expired or else least recently used entry of set ``index``; False if it is empty"""
+        victim, oldest = None, None
+        for slot in range(index * WAYS, index * WAYS + WAYS):
+            key_hash, expires, used, _, _ = SLOT.unpack_from(self._map, self._slot_offset(slot))
+            if key_hash == EMPTY:
+                continue
+            if expires and expires <= now:
+                victim = slot
+                break
+            if oldest is None or used < oldest:
+                victim, oldest = slot, used
+        if victim is None:
+            return False
+        self._free(victim)
+        return True
+
+    def _reserve(self, count, now):
+        """Evict entries, set by set from a moving start, until ``count`` blocks are free"""
+        index = self._tick() % self._sets
+        while struct.unpack_from('<I', self._map, FREE_OFFSET + 4)[0] < count:
+            self._evict_from_set(index, now)
+            index = (index + 1) % self._sets
+
+    def _store(self, key, key_hash, payload, expires):
+        """Write ``key`` with ``payload``; False if it is larger than the whole cache"""
+        data = KEY_LENGTH.pack(len(key)) + key + payload
+        count = max(1, -(-len(data) // self._data_size))
+        if count > self._blocks:
+            return False
+        now = time.time()
+        self._mark_dirty()
+        slot = self._find(key, key_hash)
+        if slot is not None:
+            self._free(slot)
+        self._reserve(count, now)
+        if slot is None:
+            first = (key_hash % self._sets) * WAYS
+            empty = [slot for slot in range(first, first + WAYS) if not self._is_live(slot, now)]
+            if not empty:
+                self._evict_from_set(key_hash % self._sets, now)
+                empty = [slot for slot in range(first, first + WAYS) if not self._is_live(slot, now)]
+            slot = empty[0]
+            self._free(slot)
+
+        # Blocks come from the free list, then from those never used yet
+        head, free, unused = struct.unpack_from('<iII', self._map, FREE_OFFSET)
+        first_block = previous = None
+        for start in range(0, len(data), self._data_size):
+            if head != NO_BLOCK:
+                block = head
+                (head,) = BLOCK_HEADER.unpack_from(self._map, self._block_offset(block))
+            else:
+                block, unused = unused, unused + 1
+            if previous is None:
+                first_block = block
+            else:
+                BLOCK_HEADER.pack_into(self._map, self._block_offset(previous), block)
+            offset = self._block_offset(block) + BLOCK_HEADER.size
+            chunk = data[start:start + self._data_size]
+            self._map[offset:offset + len(chunk)] = chunk
+            previous = block
+        struct.pack_into('<iII', self._map, FREE_OFFSET, head, free - count, unused)
+        SLOT.pack_into(self._map, self._slot_offset(slot), key_hash, expires or 0.0, self._tick(), first_block, len(data))
+        return True
+
+    def _load(self, key, key_hash):
+        """Pickled value of ``key``, or None if missing or expired; counts as a use"""
+        slot = self._find(key, key_hash)
+        if slot is None:
+            return None
+        offset = self._slot_offset(slot)
+        _, expires, _, block, length = SLOT.unpack_from(self._map, offset)
+        if expires and expires <= time.time():
+            self._free(slot)
+            return None
+        struct.pack_into('<Q', self._map, offset + 16, self._tick())
+        return self._read_payload(block, length)[KEY_LENGTH.size + len(key):]
+
+    def _add(self, key, key_hash, payload, expires):
+        if self._load(key, key_hash) is not None:
+            return False
+        return self._store(key, key_hash, payload, expires)
+
+    def _delete(self, key, key_hash):
+        slot = self._find(key, key_hash)
+        if slot is None:
+            return False
+        live = self._is_live(slot, time.time())
+        self._free(slot)
+        return live
+
+    def _touch(self, key, key_hash, expires):
+        slot = self._find(key, key_hash)
+        if slot is None or not self._is_live(slot, time.time()):
+            return False
+        self._mark_dirty()
+        struct.pack_into('<d', self._map, self._slot_offset(slot) + 8, expires or 0.0)
+        return True
+
+    def _incr(self, key, key_hash, delta):
+        slot = self._find(key, key_hash)
+        if slot is None:
+            return None
+        _, expires, _, block, length = SLOT.unpack_from(self._map, self._slot_offset(slot))
+        if expires and expires <= time.time():
+            return None
+        # A value that cannot be incremented fails here, before anything is written
+        value = pickle.loads(self._read_payload(block, length)[KEY_LENGTH.size + len(key):]) + delta
+        self._store(key, key_hash, pickle.dumps(value, self.pickle_protocol), expires)
+        return value
+
+    # Django cache API
+
+    def _key(self, key, version):
+        key = self.make_and_validate_key(key, version=version)
+        encoded = key.encode()
+        return encoded, self._hash(encoded)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, key_hash = self._key(key, version)
+        payload = pickle.dumps(value, self.pickle_protocol)
+        return self._locked(self._add, key, key_hash, payload, self.get_backend_timeout(timeout))
+
+    def get(self, key, default=None, version=None):
+        key, key_hash = self._key(key, version)
+        payload = self._locked(self._load, key, key_hash)
+        return default if payload is None else pickle.loads(payload)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, key_hash = self._key(key, version)
+        payload = pickle.dumps(value, self.pickle_protocol)
+        self._locked(self._store, key, key_hash, payload, self.get_backend_timeout(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key, key_hash = self._key(key, version)
+        return self._locked(self._touch, key, key_hash, self.get_backend_timeout(timeout))
+
+    def delete(self, key, version=None):
+        key, key_hash = self._key(key, version)
+        return self._locked(self._delete, key, key_hash)
+
+    def has_key(self, key, version=None):
+        key, key_hash = self._key(key, version)
+        return self._locked(self._load, key, key_hash) is not None
+
+    def incr(self, key, delta=1, version=None):
+        """Add ``delta`` to the value of ``key`` atomically, across processes"""
+        key_name = key
+        key, key_hash = self._key(key, version)
+        value = self._locked(self._incr, key, key_hash, delta)
+        if value is None:
+            raise ValueError(f"Key '{key_name}' not found")
+        return value
+
+    def clear(self):
+        self._locked(self._initialize)
+
+    def close(self, **kwargs):
+        # The mapping stays open for the life of the process
+        pass
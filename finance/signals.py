@@ -0,0 +1,88 @@
+"""Signal handlers keeping derived data and caches in step with writes"""
+from django.contrib.auth.models import User
+from django.db import transaction as db_transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, rollups, sharding
+from .models import Budget, Category, Transaction
+
+ROLLUP_FIELDS = ('user_id', 'category_id', 'date', 'type', 'amount')
+
+
+def _cleaned(instance, field_name):
+    """Field value coerced to its Python type (callers may assign strings)"""
+    return instance._meta.get_field(field_name).to_python(getattr(instance, field_name))
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_rollup_key(sender, instance, raw=False, using=None, **kwargs):
+    """Capture the stored row before an update so its old contribution can be reversed"""
+    instance._rollup_previous = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._rollup_previous = sender.objects.using(using).filter(pk=instance.pk).values(*ROLLUP_FIELDS).first()
+
+
+@receiver(post_save, sender=Transaction)
+def update_rollup_on_save(sender, instance, created, raw=False, using=None, **kwargs):
+    """Move the transaction's contribution to its (possibly new) rollup row"""
+    if raw:
+        return
+
+    # Rollups live on the database the transaction was written to
+    with sharding.use_shard(using), db_transaction.atomic(using=using):
+        previous = getattr(instance, '_rollup_previous', None)
+        if previous:
+            rollups.apply_delta(
+                previous['user_id'], previous['category_id'], previous['date'],
+                previous['type'], -previous['amount'], -1,
+            )
+        rollups.apply_delta(
+            instance.user_id, instance.category_id, _cleaned(instance, 'date'),
+            instance.type, _cleaned(instance, 'amount'), 1,
+        )
+    instance._rollup_previous = None
+
+
+@receiver(post_delete, sender=Transaction)
+def update_rollup_on_delete(sender, instance, using=None, **kwargs):
+    """Remove a deleted transaction's contribution from its rollup row"""
+    with sharding.use_shard(using):
+        rollups.apply_delta(
+            instance.user_id, instance.category_id, _cleaned(instance, 'date'),
+            instance.type, -_cleaned(instance, 'amount'), -1,
+        )
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_dashboard_cache(sender, instance, raw=False, **kwargs):
+    """Any change to a user's finance data invalidates their cached dashboard"""
+    if not raw:
+        caching.invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def reset_dashboard_cache_for_user(sender, instance, created, raw=False, **kwargs):
+    """New users start a fresh cache version, even if their primary key was reused"""
+    if created and not raw:
+        caching.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def copy_user_to_shard(sender, instance, raw=False, using=None, **kwargs):
+    """Keep the copy of the user's row on their shard in step, so foreign keys hold"""
+    if sharding.get_shards() and not raw and using not in sharding.get_shards():
+        sharding.copy_user(instance, sharding.shard_for(instance.pk))
+
+
+@receiver(post_delete, sender=User)
+def delete_user_from_shard(sender, instance, using=None, **kwargs):
+    """Deleting a user deletes their finance data, which lives on their shard"""
+    if sharding.get_shards() and using not in sharding.get_shards():
+        sharding.delete_user(instance.pk, sharding.shard_for(instance.pk))
@@ -1,11 +1,43 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.contrib.auth.models import User
-from django.urls import reverse
+from django.urls import include, path, reverse
 from django.utils import timezone
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.conf import settings
+from django.db import OperationalError, connection, connections, transaction as db_transaction
+from django.db.models.fields.related_descriptors import ForwardManyToOneDescriptor
+from django.db.models.signals import post_delete
+from django.template import Context, Engine
+from django.template.base import Template as DjangoTemplate
+from django.test.utils import CaptureQueriesContext
 from datetime import datetime, date, timedelta
 from decimal import Decimal
-from .models import Category, Transaction, Budget
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+import errno
+import os
+import pstats
+import json
+import re
+import runpy
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from unittest import mock, skipUnless
+from .models import Category, Transaction, Budget, MonthlyRollup
+from asgiref.sync import async_to_sync
+from . import (
+    caching, concurrency, exports, health, loadtest, metrics, periods, pool, profiling, rollups, routers, search, seeding,
+    sharedcache, sharding, views, warmup,
+)
+from .importers import ImportFileError, import_transactions
+from . import urls as finance_urls
 from .forms import CategoryForm, TransactionForm, BudgetForm, CustomUserCreationForm
 
 
@@ -177,10 +209,9 @@ class DashboardBusinessLogicTests(TestCase):
             description='Monthly rent'
         )
         
-        # Get current month/year for testing
+        # Get current month bounds for testing
         self.current_date = timezone.now().date()
-        self.current_month = self.current_date.month
-        self.current_year = self.current_date.year
+        self.current_period = periods.resolve('month', self.current_date)
         
     def test_monthly_balance_calculation(self):
         """
@@ -219,10 +250,8 @@ class DashboardBusinessLogicTests(TestCase):
         # Calculate monthly totals (simulating dashboard logic)
         from django.db.models import Sum
         monthly_transactions = Transaction.objects.filter(
-            user=self.user,
-            date__month=self.current_month,
-            date__year=self.current_year
-        )
+            user=self.user
+        ).within(self.current_period)
         
         total_income = monthly_transactions.filter(type='Income').aggregate(
             total=Sum('amount')
@@ -265,10 +294,8 @@ class DashboardBusinessLogicTests(TestCase):
         # Calculate only current month
         from django.db.models import Sum
         monthly_transactions = Transaction.objects.filter(
-            user=self.user,
-            date__month=self.current_month,
-            date__year=self.current_year
-        )
+            user=self.user
+        ).within(self.current_period)
         
         total_income = monthly_transactions.filter(type='Income').aggregate(
             total=Sum('amount')
@@ -604,3 +631,2442 @@ class PerformanceTests(TestCase):
         self.assertIsNotNone(total_income)
         self.assertIsNotNone(total_expenses)
         self.assertEqual(Transaction.objects.filter(user=self.user).count(), 100)
+
+
+class MonthlyRollupTests(TestCase):
+    """Test incremental maintenance of the dashboard rollup table"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='rollupuser',
+            email='rollup@example.com',
+            password='testpass123'
+        )
+        
+        self.groceries = Category.objects.create(user=self.user, name='Groceries')
+        self.rent = Category.objects.create(user=self.user, name='Rent')
+        self.today = timezone.now().date()
+        
+    def rollup(self, category, when, type):
+        return MonthlyRollup.objects.filter(
+            user=self.user, category=category, year=when.year, month=when.month, type=type
+        ).values_list('total', 'count').first()
+        
+    def test_create_and_delete_update_rollup(self):
+        """Test that creating and deleting transactions adjusts rollup totals"""
+        first = Transaction.objects.create(
+            user=self.user, type='Expense', amount=Decimal('40.00'),
+            date=self.today, category=self.groceries, description='Shop 1'
+        )
+        Transaction.objects.create(
+            user=self.user, type='Expense', amount=Decimal('60.00'),
+            date=self.today, category=self.groceries, description='Shop 2'
+        )
+        self.assertEqual(self.rollup(self.groceries, self.today, 'Expense'), (Decimal('100.00'), 2))
+        
+        first.delete()
+        self.assertEqual(self.rollup(self.groceries, self.today, 'Expense'), (Decimal('60.00'), 1))
+        
+    def test_edit_moves_contribution_between_rollups(self):
+        """Test that edits to date, category, type and amount move the old contribution"""
+        transaction = Transaction.objects.create(
+            user=self.user, type='Expense', amount=Decimal('40.00'),
+            date=self.today, category=self.groceries, description='Shop'
+        )
+        last_month = self.today.replace(day=1) - timedelta(days=1)
+        
+        transaction.amount = Decimal('55.00')
+        transaction.category = self.rent
+        transaction.type = 'Income'
+        transaction.date = last_month
+        transaction.save()
+        
+        self.assertEqual(self.rollup(self.groceries, self.today, 'Expense'), (Decimal('0.00'), 0))
+        self.assertEqual(self.rollup(self.rent, last_month, 'Income'), (Decimal('55.00'), 1))
+        self.assertEqual(rollups.verify(self.user), [])
+        
+    def test_rebuild_and_verify_command(self):
+        """Test that bulk loads are detected by --verify and repaired by a rebuild"""
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, type='Expense', amount=Decimal('10.00'),
+                date=self.today, category=self.groceries, description=f'Bulk {i}'
+            )
+            for i in range(3)
+        ])
+        
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--verify', stdout=StringIO())
+        
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(rollups.verify(), [])
+        self.assertEqual(self.rollup(self.groceries, self.today, 'Expense'), (Decimal('30.00'), 3))
+        
+    def test_dashboard_reads_totals_from_rollups(self):
+        """Test that dashboard totals and breakdown come from the rollup table"""
+        Transaction.objects.create(
+            user=self.user, type='Income', amount=Decimal('3000.00'),
+            date=self.today, category=self.rent, description='Salary'
+        )
+        Transaction.objects.create(
+            user=self.user, type='Expense', amount=Decimal('200.00'),
+            date=self.today, category=self.groceries, description='Groceries'
+        )
+        self.client.login(username='rollupuser', password='testpass123')
+        
+        response = self.client.get(reverse('dashboard'))
+        
+        self.assertEqual(response.context['total_income'], Decimal('3000.00'))
+        self.assertEqual(response.context['total_expenses'], Decimal('200.00'))
+        self.assertEqual(response.context['current_balance'], Decimal('2800.00'))
+        self.assertEqual(
+            list(response.context['expense_breakdown']),
+            [{'category__name': 'Groceries', 'total': Decimal('200.00')}]
+        )
+
+
+class BudgetProgressTests(TestCase):
+    """Test batch budget evaluation across all budget periods"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='budgetuser',
+            email='budget@example.com',
+            password='testpass123'
+        )
+        self.groceries = Category.objects.create(user=self.user, name='Groceries')
+        self.fun = Category.objects.create(user=self.user, name='Fun')
+        # A Wednesday in the middle of a quarter
+        self.today = date(2025, 5, 14)
+        
+    def expense(self, category, amount, when):
+        Transaction.objects.create(
+            user=self.user, type='Expense', amount=Decimal(amount),
+            date=when, category=category, description='Expense'
+        )
+        
+    def test_period_windows(self):
+        """Test that each budget period resolves to the window containing today"""
+        progress = {item['budget'].period: item for item in self.create_all_period_budgets()}
+        self.assertEqual(progress['Weekly']['period_start'], date(2025, 5, 12))
+        self.assertEqual(progress['Monthly']['period_start'], date(2025, 5, 1))
+        self.assertEqual(progress['Quarterly']['period_end'], date(2025, 7, 1))
+        self.assertEqual(progress['Yearly']['period_end'], date(2026, 1, 1))
+        
+    def create_all_period_budgets(self):
+        for period, limit in [('Weekly', '50.00'), ('Monthly', '100.00'), ('Quarterly', '300.00'), ('Yearly', '1000.00')]:
+            Budget.objects.create(user=self.user, category=self.groceries, limit=Decimal(limit), period=period)
+        return Budget.objects.filter(user=self.user).progress(self.today)
+        
+    def test_progress_evaluates_every_period(self):
+        """Test that spending is summed over each budget's own period window"""
+        self.create_all_period_budgets()
+        
+        self.expense(self.groceries, '30.00', self.today)               # this week
+        self.expense(self.groceries, '40.00', date(2025, 5, 2))         # this month
+        self.expense(self.groceries, '80.00', date(2025, 4, 20))        # this quarter
+        self.expense(self.groceries, '200.00', date(2025, 2, 1))        # this year
+        self.expense(self.groceries, '999.00', date(2024, 12, 31))      # last year
+        
+        progress = {item['budget'].period: item for item in Budget.objects.filter(user=self.user).progress(self.today)}
+        
+        self.assertEqual(progress['Weekly']['spent'], Decimal('30.00'))
+        self.assertEqual(progress['Monthly']['spent'], Decimal('70.00'))
+        self.assertEqual(progress['Quarterly']['spent'], Decimal('150.00'))
+        self.assertEqual(progress['Yearly']['spent'], Decimal('350.00'))
+        self.assertEqual(progress['Monthly']['remaining'], Decimal('30.00'))
+        self.assertEqual(progress['Monthly']['percentage'], 70.0)
+        self.assertFalse(progress['Yearly']['is_over_budget'])
+        
+    def test_progress_flags_over_budget(self):
+        """Test over-budget detection and percentage capping"""
+        Budget.objects.create(user=self.user, category=self.fun, limit=Decimal('20.00'), period='Weekly')
+        self.expense(self.fun, '25.00', self.today)
+        
+        [item] = Budget.objects.filter(user=self.user).progress(self.today)
+        
+        self.assertTrue(item['is_over_budget'])
+        self.assertEqual(item['percentage'], 100)
+        self.assertEqual(item['remaining'], Decimal('-5.00'))
+        
+    def test_progress_uses_constant_number_of_queries(self):
+        """Test that evaluation cost does not grow with the number of budgets"""
+        for index in range(6):
+            category = Category.objects.create(user=self.user, name=f'Category {index}')
+            for period, _ in Budget.PERIOD_CHOICES:
+                Budget.objects.create(user=self.user, category=category, limit=Decimal('100.00'), period=period)
+            self.expense(category, '10.00', self.today)
+        
+        with self.assertNumQueries(2):
+            progress = Budget.objects.filter(user=self.user).progress(self.today)
+            names = [item['budget'].category.name for item in progress]
+        
+        self.assertEqual(len(names), 24)
+        
+    def test_budget_list_shows_progress(self):
+        """Test that the budget list view renders spending progress"""
+        Budget.objects.create(user=self.user, category=self.groceries, limit=Decimal('100.00'), period='Yearly')
+        self.expense(self.groceries, '25.00', timezone.now().date())
+        self.client.login(username='budgetuser', password='testpass123')
+        
+        response = self.client.get(reverse('budget-list'))
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['budget_data'][0]['spent'], Decimal('25.00'))
+        self.assertContains(response, '$25.00 spent')
+
+
+class TransactionQueryPlanTests(TestCase):
+    """EXPLAIN every query a view runs against finance_transaction and reject sequential scans"""
+    
+    SEQUENTIAL_SCAN_PATTERNS = {
+        'sqlite': re.compile(r'\bSCAN finance_transaction\b'),
+        'postgresql': re.compile(r'Seq Scan on finance_transaction\b'),
+    }
+    SORT_PATTERNS = {
+        'sqlite': re.compile(r'USE TEMP B-TREE FOR .*ORDER BY'),
+        'postgresql': re.compile(r'\bSort\b'),
+    }
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='planuser',
+            email='plan@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(user=self.user, name='Groceries')
+        Budget.objects.create(user=self.user, category=self.category, limit=Decimal('100.00'), period='Monthly')
+        today = timezone.now().date()
+        for index in range(50):
+            self.transaction = Transaction.objects.create(
+                user=self.user,
+                type='Expense' if index % 2 else 'Income',
+                amount=Decimal('10.00'),
+                date=today - timedelta(days=index),
+                category=self.category,
+                description=f'Transaction {index}'
+            )
+        self.client.login(username='planuser', password='testpass123')
+        
+    def explain(self, sql):
+        vendor = connection.vendor
+        with connection.cursor() as cursor:
+            if vendor == 'postgresql':
+                # Small test tables make seq scans cheapest; ask whether an index path exists at all
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql)
+                return '\n'.join(row[0] for row in cursor.fetchall())
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+        
+    def assertNoSequentialScan(self, method, url, data=None, allow_sort=True):
+        pattern = self.SEQUENTIAL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            self.skipTest(f'No plan check for {connection.vendor}')
+        sort_pattern = self.SORT_PATTERNS[connection.vendor]
+        
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(self.client, method)(url, data or {})
+        self.assertLess(response.status_code, 400, url)
+        
+        checked = 0
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if 'finance_transaction' not in sql or not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = self.explain(sql)
+            checked += 1
+            self.assertIsNone(
+                pattern.search(plan),
+                f'Sequential scan of finance_transaction for {method.upper()} {url}:\n{sql}\n{plan}'
+            )
+            if not allow_sort and 'ORDER BY' in sql:
+                self.assertIsNone(
+                    sort_pattern.search(plan),
+                    f'Ordering not served by an index for {method.upper()} {url}:\n{sql}\n{plan}'
+                )
+        return checked
+        
+    def test_dashboard_uses_indexes(self):
+        """Test dashboard queries against transactions are index scans"""
+        self.assertGreater(self.assertNoSequentialScan('get', reverse('dashboard')), 0)
+        
+    def test_transaction_list_uses_indexes(self):
+        """Test transaction list queries, with and without filters, are index scans"""
+        url = reverse('transaction-list')
+        for params in [{}, {'page': 2}, {'type': 'Expense'}, {'category': self.category.id}]:
+            self.assertGreater(self.assertNoSequentialScan('get', url, params, allow_sort=False), 0)
+        self.assertNoSequentialScan('get', url, {'type': 'Income', 'category': self.category.id})
+        self.assertNoSequentialScan('get', url, {'ledger': 1, 'page': 2})
+        self.assertGreater(self.assertNoSequentialScan('get', url, {'q': 'transaction 4', 'type': 'Expense'}), 0)
+        
+    def test_api_uses_indexes(self):
+        """Test JSON API pages and their freshness checks are index scans"""
+        url = reverse('api-transactions')
+        for params in [{}, {'type': 'Expense'}, {'category': self.category.id}, {'page_size': 10}]:
+            self.assertGreater(self.assertNoSequentialScan('get', url, params, allow_sort=False), 0)
+        
+    def test_cursor_pages_use_indexes(self):
+        """Test keyset pages seek through an index instead of scanning"""
+        url = reverse('transaction-list')
+        for params in [{}, {'type': 'Expense'}, {'category': self.category.id}]:
+            first = self.client.get(url, {'pagination': 'cursor', **params})
+            next_url = url + first.context['next_page_url']
+            self.assertGreater(self.assertNoSequentialScan('get', next_url, allow_sort=False), 0)
+        
+    def test_budget_list_uses_indexes(self):
+        """Test budget progress queries are index scans"""
+        self.assertGreater(self.assertNoSequentialScan('get', reverse('budget-list')), 0)
+        
+    def test_transaction_write_views_use_indexes(self):
+        """Test create, edit and delete views only touch transactions through indexes"""
+        form_data = {
+            'type': 'Expense',
+            'amount': '12.50',
+            'date': timezone.now().date().isoformat(),
+            'category': self.category.id,
+            'description': 'Plan check',
+        }
+        self.assertNoSequentialScan('post', reverse('transaction-create'), form_data)
+        self.assertNoSequentialScan('get', reverse('transaction-edit', kwargs={'pk': self.transaction.pk}))
+        self.assertNoSequentialScan('post', reverse('transaction-edit', kwargs={'pk': self.transaction.pk}), form_data)
+        self.assertNoSequentialScan('post', reverse('transaction-delete', kwargs={'pk': self.transaction.pk}))
+
+
+class PeriodResolutionTests(TestCase):
+    """Test resolution of reporting periods into half-open date bounds"""
+    
+    def test_resolve_units(self):
+        """Test week, month, quarter and year bounds, including Budget spellings"""
+        today = date(2025, 11, 5)
+        self.assertEqual(periods.resolve('week', today), (date(2025, 11, 3), date(2025, 11, 10)))
+        self.assertEqual(periods.resolve('Monthly', today), (date(2025, 11, 1), date(2025, 12, 1)))
+        self.assertEqual(periods.resolve('quarter', today), (date(2025, 10, 1), date(2026, 1, 1)))
+        self.assertEqual(periods.resolve('Yearly', today), (date(2025, 1, 1), date(2026, 1, 1)))
+        
+    def test_resolve_across_year_boundary(self):
+        """Test December months and weeks that start in the previous year"""
+        self.assertEqual(periods.resolve('month', date(2025, 12, 31)).end, date(2026, 1, 1))
+        self.assertEqual(periods.resolve('week', date(2026, 1, 1)).start, date(2025, 12, 29))
+        
+    def test_custom_range_is_half_open(self):
+        """Test that custom ranges include their last day and nothing after it"""
+        period = periods.custom(date(2025, 3, 1), date(2025, 3, 31))
+        self.assertEqual(period.end, date(2025, 4, 1))
+        self.assertEqual(period.last_day, date(2025, 3, 31))
+        self.assertIn(date(2025, 3, 31), period)
+        self.assertNotIn(date(2025, 4, 1), period)
+        with self.assertRaises(ValueError):
+            periods.custom(date(2025, 3, 2), date(2025, 3, 1))
+        
+    def test_unknown_period(self):
+        """Test that unknown period names are rejected"""
+        with self.assertRaises(ValueError):
+            periods.resolve('fortnight')
+        
+    def test_within_filters_with_range_lookups(self):
+        """Test that period filtering compiles to a range, not EXTRACT"""
+        queryset = Transaction.objects.within(periods.month(2025, 2))
+        sql = str(queryset.query).lower()
+        self.assertIn('"date" >= 2025-02-01', sql)
+        self.assertIn('"date" < 2025-03-01', sql)
+        self.assertNotIn('extract', sql)
+
+
+@override_settings(TRANSACTION_LIST_PAGINATION='cursor')
+class CursorPaginationTests(TestCase):
+    """Test keyset pagination of the transaction list"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='cursoruser',
+            email='cursor@example.com',
+            password='testpass123'
+        )
+        self.groceries = Category.objects.create(user=self.user, name='Groceries')
+        self.salary = Category.objects.create(user=self.user, name='Salary')
+        today = timezone.now().date()
+        # Several rows share a date so the created_at/id tie-breakers matter
+        for index in range(45):
+            Transaction.objects.create(
+                user=self.user,
+                type='Expense' if index % 3 else 'Income',
+                amount=Decimal('10.00'),
+                date=today - timedelta(days=index // 4),
+                category=self.groceries if index % 3 else self.salary,
+                description=f'Transaction {index}'
+            )
+        self.client.login(username='cursoruser', password='testpass123')
+        self.url = reverse('transaction-list')
+        
+    def walk(self, params):
+        """Follow next links from the first page and collect every row"""
+        response = self.client.get(self.url, params)
+        pages = [response]
+        while 'next_page_url' in response.context:
+            response = self.client.get(self.url + response.context['next_page_url'])
+            pages.append(response)
+        return pages
+        
+    def test_pages_cover_every_row_in_order(self):
+        """Test that following cursors returns each transaction exactly once, in list order"""
+        pages = self.walk({})
+        seen = [transaction.pk for page in pages for transaction in page.context['transactions']]
+        expected = list(
+            Transaction.objects.filter(user=self.user).order_by('-date', '-created_at', '-id').values_list('pk', flat=True)
+        )
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages[0].context['paginator'].count, 45)
+        self.assertNotIn('previous_page_url', pages[0].context)
+        
+    def test_previous_cursor_returns_previous_page(self):
+        """Test that the previous link of page two returns page one"""
+        first = self.client.get(self.url)
+        second = self.client.get(self.url + first.context['next_page_url'])
+        back = self.client.get(self.url + second.context['previous_page_url'])
+        self.assertEqual(
+            [t.pk for t in back.context['transactions']],
+            [t.pk for t in first.context['transactions']]
+        )
+        
+    def test_cursor_keeps_filters(self):
+        """Test that filters are carried inside the opaque cursor"""
+        pages = self.walk({'type': 'Expense', 'category': self.groceries.id})
+        rows = [transaction for page in pages for transaction in page.context['transactions']]
+        self.assertEqual(len(rows), 30)
+        self.assertTrue(all(t.type == 'Expense' for t in rows))
+        self.assertEqual(pages[-1].context['selected_type'], 'Expense')
+        self.assertEqual(pages[0].context['paginator'].count, 30)
+        self.assertNotIn('Expense', pages[0].context['next_page_url'])
+        
+    def test_invalid_cursor_returns_404(self):
+        """Test that tampered cursors are rejected"""
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+        
+    def test_deep_pages_do_not_count_or_offset(self):
+        """Test that cursor pages issue no COUNT or OFFSET against transactions"""
+        first = self.client.get(self.url)
+        second = self.client.get(self.url + first.context['next_page_url'])
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(self.url + second.context['next_page_url'])
+        transaction_sql = [q['sql'] for q in captured.captured_queries if 'FROM "finance_transaction"' in q['sql']]
+        self.assertEqual(len(transaction_sql), 1)
+        self.assertNotIn('COUNT(', transaction_sql[0].upper())
+        self.assertNotIn('OFFSET', transaction_sql[0].upper())
+        
+    def test_offset_mode_still_available(self):
+        """Test that pagination=offset keeps the page-number paginator"""
+        response = self.client.get(self.url, {'pagination': 'offset', 'page': 2})
+        self.assertFalse(response.context['cursor_pagination'])
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+
+class LazyRelationLoadDetector:
+    """Record foreign keys loaded lazily while a template is rendering"""
+    
+    def __init__(self):
+        self.violations = []
+        self.rendering = 0
+        
+    def __enter__(self):
+        detector = self
+        original_render = DjangoTemplate.render
+        original_get_object = ForwardManyToOneDescriptor.get_object
+        
+        def render(template, context):
+            detector.rendering += 1
+            try:
+                return original_render(template, context)
+            finally:
+                detector.rendering -= 1
+        
+        def get_object(descriptor, instance):
+            if detector.rendering:
+                detector.violations.append(f'{type(instance).__name__}.{descriptor.field.name}')
+            return original_get_object(descriptor, instance)
+        
+        self.patches = [
+            mock.patch.object(DjangoTemplate, 'render', render),
+            mock.patch.object(ForwardManyToOneDescriptor, 'get_object', get_object),
+        ]
+        for patch in self.patches:
+            patch.start()
+        return self
+        
+    def __exit__(self, *exc_info):
+        for patch in reversed(self.patches):
+            patch.stop()
+
+
+@override_settings(READINESS_CACHE_SECONDS=3600, METRICS_TOKEN='budget-token')
+class QueryBudgetTests(TestCase):
+    """Enforce a maximum query count for every URL in finance/urls.py.
+    
+    Each URL is requested for a user with a small and a large history; the
+    counts must stay within the declared budget and must not grow with the
+    data, and no template may lazily load a foreign key.
+    """
+    
+    # Maximum queries per URL name, including session and user lookups;
+    # health checks serve the readiness report checked in setUp
+    QUERY_BUDGETS = {
+        'health-check': 0,
+        'health-live': 0,
+        'health-ready': 0,
+        'health-database': 0,
+        'metrics': 0,
+        'dashboard': 7,
+        'register': 2,
+        'transaction-list': 5,
+        'transaction-create': 3,
+        'transaction-edit': 4,
+        'transaction-delete': 3,
+        'transaction-import': 2,
+        'transaction-export': 3,
+        'category-list': 3,
+        'category-create': 2,
+        'budget-list': 4,
+        'budget-create': 3,
+        'api-transactions': 5,
+        'api-transactions-batch': 18,
+        'api-categories': 4,
+        'api-budgets': 5,
+    }
+    SMALL, LARGE = 10, 1000
+    
+    def setUp(self):
+        self.users = {size: self.create_user_with_history(size) for size in (self.SMALL, self.LARGE)}
+        health.readiness(refresh=True)
+        
+    def create_user_with_history(self, size):
+        user = User.objects.create_user(username=f'budget{size}', password='testpass123')
+        categories = [Category.objects.create(user=user, name=f'Category {index}') for index in range(5)]
+        for period, _ in Budget.PERIOD_CHOICES:
+            for category in categories:
+                Budget.objects.create(user=user, category=category, limit=Decimal('100.00'), period=period)
+        today = timezone.now().date()
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=user,
+                type='Expense' if index % 4 else 'Income',
+                amount=Decimal('12.50'),
+                date=today - timedelta(days=index % 60),
+                category=categories[index % len(categories)],
+                description=f'Transaction {index}'
+            )
+            for index in range(size)
+        ])
+        rollups.rebuild(user)
+        return user
+        
+    def url_for(self, pattern, user):
+        if 'pk' in pattern.pattern.converters:
+            transaction = Transaction.objects.filter(user=user).first()
+            return reverse(pattern.name, kwargs={'pk': transaction.pk})
+        return reverse(pattern.name)
+        
+    def request_for(self, pattern, user, url):
+        """Callable issuing a representative request; most URLs are plain GETs"""
+        if pattern.name == 'api-transactions-batch':
+            category = Category.objects.filter(user=user).first()
+            transactions = list(Transaction.objects.filter(user=user).values_list('pk', flat=True)[:3])
+            data = {'type': 'Expense', 'amount': '4.20', 'date': '2024-03-01', 'category': category.pk, 'description': 'Batch'}
+            body = json.dumps({'operations': [
+                {'op': 'create', 'data': data},
+                {'op': 'create', 'data': data},
+                {'op': 'update', 'id': transactions[0], 'data': {'amount': '7.00'}},
+                {'op': 'update', 'id': transactions[1], 'data': {'description': 'Renamed'}},
+                {'op': 'delete', 'id': transactions[2]},
+            ]})
+            return lambda: self.client.post(url, body, content_type='application/json')
+        if pattern.name in ('health-database', 'health-ready', 'metrics'):
+            # As a monitor scrapes them, with the metrics token
+            return lambda: self.client.get(url, HTTP_AUTHORIZATION='Bearer budget-token')
+        return lambda: self.client.get(url)
+        
+    def measure(self, pattern, user):
+        self.client.force_login(user)
+        url = self.url_for(pattern, user)
+        send = self.request_for(pattern, user, url)
+        with CaptureQueriesContext(connection) as captured, LazyRelationLoadDetector() as detector:
+            response = send()
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.client.logout()
+        self.assertLess(response.status_code, 400, url)
+        self.assertEqual(detector.violations, [], f'Lazy foreign key loads while rendering {url}')
+        return len(captured)
+        
+    def test_every_url_has_a_budget(self):
+        """Test that new URLs cannot be added without declaring a query budget"""
+        names = {pattern.name for pattern in finance_urls.urlpatterns}
+        self.assertEqual(names - set(self.QUERY_BUDGETS), set())
+        
+    def test_query_counts_within_budget_and_independent_of_data(self):
+        """Test query counts for small and large histories against each URL's budget"""
+        for pattern in finance_urls.urlpatterns:
+            with self.subTest(url=pattern.name):
+                small = self.measure(pattern, self.users[self.SMALL])
+                large = self.measure(pattern, self.users[self.LARGE])
+                self.assertLessEqual(large, self.QUERY_BUDGETS[pattern.name])
+                self.assertEqual(small, large, 'Query count grows with the amount of data')
+        
+    def test_detector_catches_lazy_loads(self):
+        """Test that the harness notices a template reading an unselected foreign key"""
+        transaction = Transaction.objects.filter(user=self.users[self.SMALL]).first()
+        template = Engine.get_default().from_string('{{ transaction.category.name }}')
+        with LazyRelationLoadDetector() as detector:
+            template.render(Context({'transaction': Transaction.objects.get(pk=transaction.pk)}))
+        self.assertEqual(detector.violations, ['Transaction.category'])
+
+
+class DashboardCacheTests(TestCase):
+    """Test the per-user dashboard cache and its invalidation"""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='cacheuser',
+            email='cache@example.com',
+            password='testpass123'
+        )
+        self.category = Category.objects.create(user=self.user, name='Groceries')
+        self.today = timezone.now().date()
+        self.client.login(username='cacheuser', password='testpass123')
+        
+    def add_expense(self, amount):
+        return Transaction.objects.create(
+            user=self.user, type='Expense', amount=Decimal(amount),
+            date=self.today, category=self.category, description='Expense'
+        )
+        
+    def test_cache_hit_skips_dashboard_queries(self):
+        """Test that a repeated dashboard request only loads the session and user"""
+        self.client.get(reverse('dashboard'))
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        
+    def test_writes_invalidate_cached_dashboard(self):
+        """Test that transaction, budget and category writes are visible immediately"""
+        self.client.get(reverse('dashboard'))
+        
+        transaction = self.add_expense('25.00')
+        self.assertEqual(self.client.get(reverse('dashboard')).context['total_expenses'], Decimal('25.00'))
+        
+        budget = Budget.objects.create(user=self.user, category=self.category, limit=Decimal('50.00'))
+        self.assertEqual(len(self.client.get(reverse('dashboard')).context['budget_data']), 1)
+        
+        self.category.name = 'Food'
+        self.category.save()
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['budget_data'][0]['budget'].category.name, 'Food')
+        
+        budget.delete()
+        transaction.delete()
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['budget_data'], [])
+        self.assertEqual(response.context['total_expenses'], Decimal('0.00'))
+        
+    def test_cache_is_per_user(self):
+        """Test that one user's writes do not invalidate another user's dashboard"""
+        other = User.objects.create_user(username='othercache', password='testpass123')
+        version = caching.get_version(other.pk)
+        self.add_expense('10.00')
+        self.assertEqual(caching.get_version(other.pk), version)
+        self.assertNotEqual(caching.get_version(self.user.pk), version)
+        
+    def assertSingleFlight(self):
+        calls = []
+        barrier = threading.Barrier(8)
+        results = []
+        
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'value': 42}
+        
+        def worker():
+            barrier.wait()
+            results.append(caching.get_or_compute('finance:test:single-flight', compute))
+        
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'value': 42}] * 8)
+        
+    def test_single_flight_with_locmem_backend(self):
+        """Test that concurrent misses compute once with the local-memory cache"""
+        self.assertSingleFlight()
+        
+    def test_single_flight_with_file_backend(self):
+        """Test that concurrent misses compute once with the file-based cache"""
+        with tempfile.TemporaryDirectory() as directory:
+            file_cache = {'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': directory,
+            }}
+            with self.settings(CACHES=file_cache):
+                self.assertSingleFlight()
+        
+    def test_waits_for_computation_in_another_process(self):
+        """Test that a miss waits for a result when another process holds the lock"""
+        key = 'finance:test:other-process'
+        cache.add(key + caching.LOCK_SUFFIX, True, timeout=5)
+        timer = threading.Timer(0.1, lambda: cache.set(key, 'from elsewhere'))
+        timer.start()
+        try:
+            value = caching.get_or_compute(key, lambda: self.fail('computed despite lock'))
+        finally:
+            timer.join()
+        self.assertEqual(value, 'from elsewhere')
+
+
+class TransactionImportTests(TestCase):
+    """Test the streaming CSV import"""
+    
+    HEADER = 'date,type,amount,category,description\n'
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='importer', password='testpass123')
+        self.groceries = Category.objects.create(user=self.user, name='Groceries')
+        
+    def run_import(self, body, **kwargs):
+        return import_transactions(self.user, StringIO(self.HEADER + body), **kwargs)
+        
+    def test_valid_rows_are_imported(self):
+        """Test that valid rows become transactions with existing and new categories"""
+        result = self.run_import(
+            '2024-01-05,Expense,12.50,Groceries,Milk\n'
+            '2024-01-06,Income,1000.00,Salary,January\n'
+            '2024-01-07,Expense,3.20,Groceries,Bread\n'
+        )
+        self.assertEqual(result.created, 3)
+        self.assertEqual(result.categories_created, 1)
+        self.assertEqual(result.errors, [])
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Transaction.objects.filter(user=self.user, category=self.groceries).count(), 2)
+        
+    def test_invalid_rows_are_reported_with_line_numbers(self):
+        """Test that invalid rows are skipped and reported while valid ones are kept"""
+        result = self.run_import(
+            '2024-01-05,Expense,12.50,Groceries,Milk\n'
+            'not-a-date,Expense,1.00,Groceries,Bad date\n'
+            '2024-01-07,Gift,-4,,Bad everything\n'
+        )
+        self.assertEqual(result.created, 1)
+        self.assertEqual([error['line'] for error in result.errors], [3, 4])
+        self.assertEqual(set(result.errors[0]['errors']), {'date'})
+        self.assertEqual(set(result.errors[1]['errors']), {'type', 'amount', 'category'})
+        
+    def test_categories_are_created_once_across_chunks(self):
+        """Test that a new category spanning several chunks is created only once"""
+        rows = ''.join(f'2024-02-{day:02d},Expense,1.00,Travel,Trip {day}\n' for day in range(1, 11))
+        result = self.run_import(rows, chunk_size=3, batch_size=2)
+        self.assertEqual(result.created, 10)
+        self.assertEqual(Category.objects.filter(user=self.user, name='Travel').count(), 1)
+        
+    def test_rollups_stay_consistent(self):
+        """Test that imported rows are folded into the monthly rollups"""
+        Transaction.objects.create(
+            user=self.user, type='Expense', amount=Decimal('5.00'),
+            date=date(2024, 1, 1), category=self.groceries, description='Existing'
+        )
+        self.run_import(
+            '2024-01-05,Expense,12.50,Groceries,Milk\n'
+            '2024-01-06,Expense,0.10,Groceries,Gum\n'
+            '2024-02-06,Income,100.00,Salary,Pay\n',
+            chunk_size=2,
+        )
+        self.assertEqual(rollups.verify(self.user), [])
+        self.assertEqual(rollups.monthly_totals(self.user, 2024, 1), (Decimal('0.00'), Decimal('17.60')))
+        
+    def test_missing_column_rejects_the_file(self):
+        """Test that a header without a required column raises ImportFileError"""
+        with self.assertRaises(ImportFileError):
+            import_transactions(self.user, StringIO('date,type,amount\n2024-01-01,Expense,1\n'))
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+        
+    def test_upload_view(self):
+        """Test importing through the upload form"""
+        self.client.login(username='importer', password='testpass123')
+        upload = SimpleUploadedFile(
+            'transactions.csv',
+            (self.HEADER + '2024-01-05,Expense,12.50,Groceries,Milk\n2024-01-05,Expense,x,Groceries,Bad\n').encode('utf-8-sig'),
+            content_type='text/csv',
+        )
+        response = self.client.post(reverse('transaction-import'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].created, 1)
+        self.assertEqual(response.context['result'].error_count, 1)
+        self.assertContains(response, 'Enter a number.')
+        
+    def test_upload_view_rejects_non_utf8_file(self):
+        """Test that an undecodable upload is reported as a form error"""
+        self.client.login(username='importer', password='testpass123')
+        upload = SimpleUploadedFile('transactions.csv', b'\xff\xfe\x00d\x00a', content_type='text/csv')
+        response = self.client.post(reverse('transaction-import'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+        
+    def test_management_command(self):
+        """Test the import_transactions command reading a file"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(self.HEADER + '2024-01-05,Expense,12.50,Groceries,Milk\n')
+        self.addCleanup(os.unlink, handle.name)
+        out = StringIO()
+        call_command('import_transactions', 'importer', handle.name, stdout=out)
+        self.assertIn('Imported 1 transactions', out.getvalue())
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+
+
+class TransactionExportTests(TestCase):
+    """Test the streaming CSV/NDJSON export"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', password='testpass123')
+        self.food = Category.objects.create(user=self.user, name='Food')
+        self.salary = Category.objects.create(user=self.user, name='Salary')
+        Transaction.objects.create(
+            user=self.user, type='Expense', amount=Decimal('12.50'),
+            date=date(2024, 1, 5), category=self.food, description='Lunch, with "friends"'
+        )
+        Transaction.objects.create(
+            user=self.user, type='Income', amount=Decimal('1000.00'),
+            date=date(2024, 2, 1), category=self.salary, description='Pay'
+        )
+        other = User.objects.create_user(username='otherexporter', password='testpass123')
+        Transaction.objects.create(
+            user=other, type='Expense', amount=Decimal('1.00'), date=date(2024, 1, 5),
+            category=Category.objects.create(user=other, name='Food'), description='Not mine'
+        )
+        self.client.login(username='exporter', password='testpass123')
+        
+    def export(self, **params):
+        response = self.client.get(reverse('transaction-export'), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+        
+    def test_csv_export(self):
+        """Test that the CSV export holds the user's rows in date order"""
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment;', response['Content-Disposition'])
+        self.assertEqual(content.splitlines(), [
+            'date,type,amount,category,description',
+            '2024-01-05,Expense,12.50,Food,"Lunch, with ""friends"""',
+            '2024-02-01,Income,1000.00,Salary,Pay',
+        ])
+        
+    def test_csv_export_can_be_imported(self):
+        """Test that an exported file imports back into the same transactions"""
+        _, content = self.export()
+        copy = User.objects.create_user(username='copy', password='testpass123')
+        result = import_transactions(copy, StringIO(content))
+        self.assertEqual((result.created, result.errors), (2, []))
+        self.assertEqual(
+            list(Transaction.objects.filter(user=copy).order_by('date').values_list('amount', 'category__name', 'description')),
+            list(Transaction.objects.filter(user=self.user).order_by('date').values_list('amount', 'category__name', 'description')),
+        )
+        
+    def test_ndjson_export(self):
+        """Test that NDJSON lines carry exact amounts as strings"""
+        response, content = self.export(format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(rows[1], {
+            'date': '2024-02-01', 'type': 'Income', 'amount': '1000.00',
+            'category': 'Salary', 'description': 'Pay',
+        })
+        
+    def test_filters(self):
+        """Test the type, category and inclusive date range filters"""
+        self.assertEqual(len(self.export(type='Income')[1].splitlines()), 2)
+        self.assertEqual(len(self.export(category=self.food.pk)[1].splitlines()), 2)
+        self.assertEqual(len(self.export(start='2024-01-06', end='2024-02-01')[1].splitlines()), 2)
+        self.assertEqual(len(self.export(end='2024-01-05')[1].splitlines()), 2)
+        
+    def test_invalid_parameters(self):
+        """Test that malformed filters are rejected with a 400"""
+        for params in ({'start': 'yesterday'}, {'start': '2024-02-01', 'end': '2024-01-01'}, {'format': 'xml'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('transaction-export'), params).status_code, 400)
+                
+    def peak_export_memory(self, rows):
+        user = User.objects.create_user(username=f'bulkexporter{rows}', password='testpass123')
+        category = Category.objects.create(user=user, name='Bulk')
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=user, type='Expense', amount=Decimal('9.99'),
+                date=date(2024, 1, 1) + timedelta(days=index % 365),
+                category=category, description=f'Transaction number {index}'
+            )
+            for index in range(rows)
+        ])
+        queryset = Transaction.objects.filter(user=user)
+        tracemalloc.start()
+        try:
+            lines = sum(chunk.count('\n') for chunk in exports.stream(queryset, 'csv', chunk_size=100))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(lines, rows + 1)
+        return peak
+        
+    def test_memory_stays_flat(self):
+        """Test that peak memory does not grow with the number of exported rows"""
+        small = self.peak_export_memory(1000)
+        large = self.peak_export_memory(10000)
+        self.assertLess(large, small * 2)
+
+
+class LedgerTests(TestCase):
+    """Test running balances in the transaction list's ledger mode"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='ledger', password='testpass123')
+        self.food = Category.objects.create(user=self.user, name='Food')
+        self.salary = Category.objects.create(user=self.user, name='Salary')
+        start = date(2024, 1, 1)
+        for index in range(75):
+            income = index % 5 == 0
+            Transaction.objects.create(
+                user=self.user,
+                type='Income' if income else 'Expense',
+                amount=Decimal('100.00') if income else Decimal(index) + Decimal('0.25'),
+                # Several rows share a date, so created_at and id break ties
+                date=start + timedelta(days=index // 3 * 5),
+                category=self.salary if income else self.food,
+                description=f'Row {index}',
+            )
+        self.client.login(username='ledger', password='testpass123')
+        
+    def expected_balances(self, **filters):
+        balance = Decimal('0.00')
+        balances = {}
+        for row in Transaction.objects.filter(user=self.user, **filters).order_by('date', 'created_at', 'id'):
+            balance += row.amount if row.type == 'Income' else -row.amount
+            balances[row.pk] = balance
+        return balances
+        
+    def assertBalances(self, response, expected):
+        rows = response.context['transactions']
+        self.assertTrue(rows)
+        self.assertEqual({row.pk: row.balance for row in rows}, {row.pk: expected[row.pk] for row in rows})
+        
+    def test_offset_pages(self):
+        """Test balances on the first, a middle and the last numbered page"""
+        expected = self.expected_balances()
+        for page in (1, 2, 4):
+            response = self.client.get(reverse('transaction-list'), {'ledger': 1, 'page': page})
+            self.assertBalances(response, expected)
+        self.assertContains(response, 'Balance')
+        
+    def test_cursor_pages(self):
+        """Test balances on every keyset page, following next links"""
+        expected = self.expected_balances()
+        url = reverse('transaction-list') + '?pagination=cursor&ledger=1'
+        seen = 0
+        while url:
+            response = self.client.get(url)
+            self.assertBalances(response, expected)
+            seen += len(response.context['transactions'])
+            next_url = response.context.get('next_page_url')
+            url = reverse('transaction-list') + next_url if next_url else None
+        self.assertEqual(seen, len(expected))
+        
+    def test_filtered_running_totals(self):
+        """Test that filters apply to both the opening balance and the window"""
+        response = self.client.get(reverse('transaction-list'), {'ledger': 1, 'type': 'Expense', 'page': 2})
+        self.assertBalances(response, self.expected_balances(type='Expense'))
+        response = self.client.get(reverse('transaction-list'), {'ledger': 1, 'category': self.salary.pk})
+        self.assertBalances(response, self.expected_balances(category=self.salary))
+        
+    def test_deep_pages_cost_the_same(self):
+        """Test that the last page runs the same queries as the first"""
+        counts = []
+        for page in (1, 4):
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get(reverse('transaction-list'), {'ledger': 1, 'page': page})
+            counts.append(len(captured))
+        self.assertEqual(counts[0], counts[1])
+        
+    def test_page_links_keep_filters(self):
+        """Test that numbered page links carry the filters and ledger flag"""
+        response = self.client.get(reverse('transaction-list'), {'ledger': 1, 'type': 'Expense'})
+        self.assertContains(response, '?page=2&amp;type=Expense&amp;ledger=1')
+
+
+class TransactionSearchTests(TestCase):
+    """Test full-text search on transaction descriptions"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='testpass123')
+        self.category = Category.objects.create(user=self.user, name='General')
+        for description in ['Coffee at the station', 'Weekly groceries', 'Coffee beans and coffee filters',
+                            'Café crème', 'Train ticket']:
+            self.add(description)
+        other = User.objects.create_user(username='othersearcher', password='testpass123')
+        Transaction.objects.create(
+            user=other, type='Expense', amount=Decimal('1.00'), date=date(2024, 1, 1),
+            category=Category.objects.create(user=other, name='General'), description='Coffee elsewhere'
+        )
+        
+    def add(self, description, type='Expense'):
+        return Transaction.objects.create(
+            user=self.user, type=type, amount=Decimal('3.00'), date=date(2024, 1, 1),
+            category=self.category, description=description
+        )
+        
+    def descriptions(self, text):
+        return [row.description for row in Transaction.objects.filter(user=self.user).search(text).order_by('-search_rank', 'id')]
+        
+    def test_matches_words_and_prefixes(self):
+        """Test that every word must match, as a case-insensitive prefix"""
+        self.assertEqual(set(self.descriptions('coffee')), {'Coffee at the station', 'Coffee beans and coffee filters'})
+        self.assertEqual(self.descriptions('COFF stat'), ['Coffee at the station'])
+        self.assertEqual(self.descriptions('groceries coffee'), [])
+        self.assertEqual(self.descriptions('!!!'), [])
+        
+    def test_ranks_better_matches_first(self):
+        """Test that a description mentioning a word twice ranks higher"""
+        self.assertEqual(self.descriptions('coffee')[0], 'Coffee beans and coffee filters')
+        
+    @skipUnless(connection.vendor == 'sqlite', 'Accent folding is configured for the SQLite tokenizer')
+    def test_ignores_accents(self):
+        """Test that accented words match their unaccented spelling"""
+        self.assertEqual(self.descriptions('cafe creme'), ['Café crème'])
+        
+    def test_index_follows_writes(self):
+        """Test that bulk inserts, edits and deletes are reflected in results"""
+        Transaction.objects.bulk_create([Transaction(
+            user=self.user, type='Expense', amount=Decimal('2.00'), date=date(2024, 1, 2),
+            category=self.category, description='Bulk loaded bagel'
+        )])
+        self.assertEqual(self.descriptions('bagel'), ['Bulk loaded bagel'])
+        
+        ticket = Transaction.objects.get(description='Train ticket')
+        ticket.description = 'Bus ticket'
+        ticket.save()
+        self.assertEqual(self.descriptions('train'), [])
+        self.assertEqual(self.descriptions('bus'), ['Bus ticket'])
+        
+        ticket.delete()
+        self.assertEqual(self.descriptions('ticket'), [])
+        
+    @skipUnless(connection.vendor == 'sqlite', 'Triggers are only used on SQLite')
+    def test_ensure_index_restores_dropped_triggers(self):
+        """Test that triggers dropped by a table rebuild are recreated with the index"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {search.FTS_TABLE}_insert')
+        self.add('Missed while unindexed')
+        self.assertEqual(self.descriptions('unindexed'), [])
+        search.ensure_index(using=connection.alias)
+        self.assertEqual(self.descriptions('unindexed'), ['Missed while unindexed'])
+        self.add('Indexed again')
+        self.assertEqual(self.descriptions('again'), ['Indexed again'])
+        
+    def test_list_view_combines_search_with_filters_and_pages(self):
+        """Test the list's q parameter with type filters and both pagination modes"""
+        for index in range(30):
+            self.add(f'Lunch {index}', type='Income' if index % 5 == 0 else 'Expense')
+        self.client.login(username='searcher', password='testpass123')
+        url = reverse('transaction-list')
+        
+        response = self.client.get(url, {'q': 'lunch', 'type': 'Expense'})
+        self.assertEqual(response.context['paginator'].count, 24)
+        self.assertTrue(all(row.type == 'Expense' for row in response.context['transactions']))
+        second = self.client.get(url, {'q': 'lunch', 'type': 'Expense', 'page': 2})
+        self.assertEqual(len(second.context['transactions']), 4)
+        
+        response = self.client.get(url, {'q': 'lunch', 'pagination': 'cursor', 'ledger': 1})
+        self.assertEqual(response.context['paginator'].count, 30)
+        self.assertFalse(response.context['ledger'])
+        following = self.client.get(url + response.context['next_page_url'])
+        self.assertEqual(len(following.context['transactions']), 10)
+        self.assertTrue(all(row.description.startswith('Lunch') for row in following.context['transactions']))
+        
+        response = self.client.get(url, {'q': 'coffee'})
+        self.assertNotContains(response, 'Coffee elsewhere')
+        
+    def test_admin_search_uses_index(self):
+        """Test that admin search finds descriptions alongside usernames"""
+        User.objects.create_superuser(username='searchadmin', password='testpass123')
+        self.client.login(username='searchadmin', password='testpass123')
+        response = self.client.get(reverse('admin:finance_transaction_changelist'), {'q': 'coffee'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+        response = self.client.get(reverse('admin:finance_transaction_changelist'), {'q': 'othersearcher'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+class ApiTests(TestCase):
+    """Test the versioned JSON API"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='apiuser', password='testpass123')
+        self.food = Category.objects.create(user=self.user, name='Food')
+        self.rent = Category.objects.create(user=self.user, name='Rent')
+        self.budget = Budget.objects.create(user=self.user, category=self.food, limit=Decimal('200.00'))
+        self.transactions = [
+            Transaction.objects.create(
+                user=self.user, type='Expense', amount=Decimal('10.00') + index,
+                date=date(2024, 1, 1) + timedelta(days=index),
+                category=self.food if index % 2 else self.rent, description=f'Item {index}'
+            )
+            for index in range(5)
+        ]
+        other = User.objects.create_user(username='otherapi', password='testpass123')
+        Category.objects.create(user=other, name='Hidden')
+        self.client.login(username='apiuser', password='testpass123')
+        
+    def get(self, name, **params):
+        return self.client.get(reverse(name), params)
+        
+    def test_requires_authentication(self):
+        """Test that anonymous requests get a 401 JSON error, not a redirect"""
+        self.client.logout()
+        response = self.get('api-transactions')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'detail': 'Authentication required.'})
+        
+    def test_lists_transactions(self):
+        """Test the transaction listing, newest first, with exact amounts"""
+        body = self.get('api-transactions').json()
+        self.assertEqual(body['version'], 'v1')
+        self.assertEqual([row['id'] for row in body['results']], [row.pk for row in reversed(self.transactions)])
+        self.assertEqual(body['results'][0]['amount'], '14.00')
+        self.assertEqual(body['results'][0]['date'], '2024-01-05')
+        self.assertEqual(body['results'][0]['category_name'], 'Rent')
+        self.assertIsNone(body['next'])
+        
+    def test_lists_categories_and_budgets(self):
+        """Test that categories and budgets list only the user's rows"""
+        self.assertEqual([row['name'] for row in self.get('api-categories').json()['results']], ['Food', 'Rent'])
+        budgets = self.get('api-budgets').json()['results']
+        self.assertEqual(len(budgets), 1)
+        self.assertEqual((budgets[0]['category_name'], budgets[0]['limit']), ('Food', '200.00'))
+        
+    def test_sparse_fields(self):
+        """Test that fields= limits the keys of every row"""
+        body = self.get('api-transactions', fields='id,amount').json()
+        self.assertEqual(set(body['results'][0]), {'id', 'amount'})
+        response = self.get('api-transactions', fields='id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['detail'])
+        
+    def test_cursor_pagination_keeps_filters_and_fields(self):
+        """Test walking every page with a filter carried by the cursor"""
+        response = self.get('api-transactions', category=self.rent.pk, page_size=2, fields='id')
+        ids = []
+        while True:
+            body = response.json()
+            ids += [row['id'] for row in body['results']]
+            self.assertTrue(all(set(row) == {'id'} for row in body['results']))
+            if not body['next']:
+                break
+            response = self.client.get(body['next'])
+        expected = [row.pk for row in reversed(self.transactions) if row.category_id == self.rent.pk]
+        self.assertEqual(ids, expected)
+        
+    def test_invalid_parameters(self):
+        """Test that bad filters, page sizes and cursors are rejected with 400"""
+        for params in ({'start': 'soon'}, {'page_size': 0}, {'page_size': 'many'}, {'cursor': 'forged'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.get('api-transactions', **params).status_code, 400)
+        
+    def test_unchanged_poll_returns_304_without_serialising(self):
+        """Test that If-None-Match answers 304 after only the freshness queries"""
+        response = self.get('api-transactions')
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('api-transactions'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertFalse([query for query in captured if 'ORDER BY' in query['sql']])
+        
+        response = self.client.get(reverse('api-categories'))
+        response = self.client.get(reverse('api-categories'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        
+    def test_etag_changes_with_data(self):
+        """Test that edits, deletions and category renames change the ETag"""
+        def etag(**params):
+            return self.get('api-transactions', **params)['ETag']
+        
+        seen = {etag()}
+        self.assertNotIn(etag(fields='id'), seen)
+        
+        changed = self.transactions[0]
+        changed.description = 'Edited'
+        changed.save()
+        seen.add(etag())
+        self.assertEqual(len(seen), 2)
+        
+        self.transactions[1].delete()
+        seen.add(etag())
+        self.assertEqual(len(seen), 3)
+        
+        self.food.name = 'Groceries'
+        self.food.save()
+        seen.add(etag())
+        self.assertEqual(len(seen), 4)
+        self.assertEqual(self.get('api-budgets').json()['results'][0]['category_name'], 'Groceries')
+
+
+class TransactionBatchTests(TestCase):
+    """Test the batch create/update/delete endpoint"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='batcher', password='testpass123')
+        self.food = Category.objects.create(user=self.user, name='Food')
+        self.rent = Category.objects.create(user=self.user, name='Rent')
+        other = User.objects.create_user(username='otherbatcher', password='testpass123')
+        self.foreign_category = Category.objects.create(user=other, name='Theirs')
+        self.foreign_transaction = Transaction.objects.create(
+            user=other, type='Expense', amount=Decimal('1.00'), date=date(2024, 1, 1),
+            category=self.foreign_category, description='Not yours'
+        )
+        self.existing = [
+            Transaction.objects.create(
+                user=self.user, type='Expense', amount=Decimal('10.00'), date=date(2024, 1, 1 + index),
+                category=self.food, description=f'Existing {index}'
+            )
+            for index in range(3)
+        ]
+        self.client.login(username='batcher', password='testpass123')
+        
+    def create_op(self, **overrides):
+        data = {'type': 'Expense', 'amount': '12.34', 'date': '2024-02-01', 'category': self.rent.pk, 'description': 'New'}
+        data.update(overrides)
+        return {'op': 'create', 'data': data}
+        
+    def post(self, operations):
+        return self.client.post(
+            reverse('api-transactions-batch'),
+            json.dumps({'operations': operations}),
+            content_type='application/json',
+        )
+        
+    def test_mixed_batch(self):
+        """Test creates, updates and deletes with per-item results"""
+        response = self.post([
+            self.create_op(),
+            {'op': 'update', 'id': self.existing[0].pk, 'data': {'amount': '99.99', 'category': self.rent.pk}},
+            {'op': 'delete', 'id': self.existing[1].pk},
+        ])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['created'], body['updated'], body['deleted'], body['errors']), (1, 1, 1, 0))
+        self.assertEqual([result['status'] for result in body['results']], ['created', 'updated', 'deleted'])
+        
+        created = Transaction.objects.get(pk=body['results'][0]['id'])
+        self.assertEqual((created.amount, created.category, created.user), (Decimal('12.34'), self.rent, self.user))
+        updated = Transaction.objects.get(pk=self.existing[0].pk)
+        self.assertEqual((updated.amount, updated.category, updated.description), (Decimal('99.99'), self.rent, 'Existing 0'))
+        self.assertGreater(updated.updated_at, self.existing[0].updated_at)
+        self.assertFalse(Transaction.objects.filter(pk=self.existing[1].pk).exists())
+        self.assertEqual(rollups.verify(self.user), [])
+        
+    def test_invalid_items_are_reported_and_skipped(self):
+        """Test that validation and ownership errors do not block valid operations"""
+        body = self.post([
+            self.create_op(amount='-5'),
+            self.create_op(category=self.foreign_category.pk),
+            self.create_op(type='Gift', extra='x'),
+            {'op': 'create', 'data': {'amount': '1.00'}},
+            {'op': 'update', 'id': self.foreign_transaction.pk, 'data': {'amount': '2.00'}},
+            {'op': 'delete', 'id': 987654},
+            {'op': 'rename'},
+            {'op': 'delete', 'id': self.existing[2].pk},
+            {'op': 'update', 'id': self.existing[2].pk, 'data': {'amount': '2.00'}},
+            self.create_op(),
+        ]).json()
+        self.assertEqual(
+            [result['status'] for result in body['results']],
+            ['error'] * 7 + ['deleted', 'error', 'created'],
+        )
+        errors = [result.get('errors', {}) for result in body['results']]
+        self.assertEqual(set(errors[0]), {'amount'})
+        self.assertEqual(set(errors[1]), {'category'})
+        self.assertEqual(set(errors[2]), {'type', 'data'})
+        self.assertEqual(set(errors[3]), {'type', 'date', 'category', 'description'})
+        self.assertEqual(set(errors[4]), {'id'})
+        self.assertEqual(set(errors[8]), {'id'})
+        self.assertTrue(Transaction.objects.filter(pk=self.foreign_transaction.pk, amount=Decimal('1.00')).exists())
+        self.assertEqual(rollups.verify(self.user), [])
+        
+    def test_queries_do_not_grow_with_batch_size(self):
+        """Test that query counts grow with insert batches, not with rows"""
+        def count(size):
+            operations = [self.create_op(description=f'Row {index}') for index in range(size)]
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.post(operations).json()['created'], size)
+            return len(captured)
+        
+        # Only INSERT batches are added (SQLite allows ~100 rows per statement), never a query per row
+        self.assertLess(count(1000) - count(10), 1000 // 100)
+        self.assertEqual(rollups.verify(self.user), [])
+        
+    def test_rows_are_locked_inside_the_batch_transaction(self):
+        """Test that updated and deleted rows are read for update within the transaction writing them"""
+        from . import batch
+        from django.db.models import QuerySet
+        locked = []
+        select_for_update = QuerySet.select_for_update
+        
+        def spy(queryset, *args, **kwargs):
+            if queryset.model is Transaction:
+                locked.append(len(connection.savepoint_ids))
+            return select_for_update(queryset, *args, **kwargs)
+        
+        depth = len(connection.savepoint_ids)
+        with mock.patch.object(QuerySet, 'select_for_update', spy):
+            results = batch.apply_batch(self.user, [
+                {'op': 'update', 'id': self.existing[0].pk, 'data': {'amount': '5.00'}},
+                {'op': 'delete', 'id': self.existing[1].pk},
+            ])
+        self.assertEqual([result['status'] for result in results], ['updated', 'deleted'])
+        self.assertEqual(len(locked), 1)
+        self.assertGreater(locked[0], depth)
+        self.assertEqual(rollups.verify(self.user), [])
+        
+    def test_dashboard_cache_invalidated_once(self):
+        """Test that a batch bumps the user's cache version once, not per row"""
+        with mock.patch.object(caching, 'bump_version', wraps=caching.bump_version) as bump:
+            self.post([self.create_op() for _ in range(20)])
+        # Once immediately and once more when the surrounding transaction commits
+        self.assertLessEqual(bump.call_count, 2)
+        
+    def test_rejects_malformed_requests(self):
+        """Test that non-JSON bodies, missing lists and oversized batches get 400"""
+        url = reverse('api-transactions-batch')
+        self.assertEqual(self.client.post(url, 'nope', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post(url, '{}', content_type='application/json').status_code, 400)
+        self.assertEqual(self.post('all of them').status_code, 400)
+        self.assertEqual(self.post([{'op': 'delete', 'id': 1}] * 5001).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+
+class AsyncUrls:
+    """URLconf serving the app with its async views, as under ASGI"""
+    urlpatterns = [
+        path('accounts/', include('django.contrib.auth.urls')),
+        path('', include(finance_urls.get_urlpatterns(async_views=True))),
+    ]
+
+
+@override_settings(ROOT_URLCONF=AsyncUrls)
+class AsyncViewTests(TestCase):
+    """Test the async dashboard and list views through the ASGI handler"""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='asyncuser', password='testpass123')
+        self.food = Category.objects.create(user=self.user, name='Food')
+        self.salary = Category.objects.create(user=self.user, name='Salary')
+        Budget.objects.create(user=self.user, category=self.food, limit=Decimal('100.00'), period='Monthly')
+        today = timezone.now().date()
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, type='Expense' if index % 3 else 'Income', amount=Decimal('10.00'),
+                date=today - timedelta(days=index % 20), category=self.salary if index % 3 == 0 else self.food,
+                description=f'Coffee {index}'
+            )
+            for index in range(45)
+        ])
+        rollups.rebuild(self.user)
+        self.async_client.force_login(self.user)
+        
+    def get(self, url):
+        return async_to_sync(self.async_client.get)(url)
+        
+    def test_dashboard_matches_sync_context(self):
+        """Test that the concurrent dashboard builds the same context as the sync one"""
+        response = self.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        expected = views.build_dashboard_context(self.user, timezone.now().date())
+        for name in ('total_income', 'total_expenses', 'current_balance', 'recent_transactions', 'expense_breakdown'):
+            self.assertEqual(response.context[name], expected[name], name)
+        self.assertEqual(
+            [row['spent'] for row in response.context['budget_data']],
+            [row['spent'] for row in expected['budget_data']],
+        )
+        
+    def test_transaction_list_pages(self):
+        """Test offset, cursor, ledger and search pages of the async list"""
+        expected = list(Transaction.objects.filter(user=self.user).order_by('-date', '-created_at', '-id'))
+        
+        response = self.get(reverse('transaction-list') + '?page=2')
+        self.assertEqual(list(response.context['transactions']), expected[20:40])
+        self.assertEqual(response.context['paginator'].count, 45)
+        self.assertEqual(response.context['categories'], [self.food, self.salary])
+        self.assertEqual(list(self.get(reverse('transaction-list') + '?page=last').context['transactions']), expected[40:])
+        
+        response = self.get(reverse('transaction-list') + '?pagination=cursor')
+        self.assertEqual(list(response.context['transactions']), expected[:20])
+        self.assertEqual(response.context['paginator'].count, 45)
+        self.assertContains(self.get(response.context['next_page_url'].replace('?', reverse('transaction-list') + '?')), 'Coffee')
+        
+        response = self.get(reverse('transaction-list') + '?ledger=1')
+        self.assertTrue(all(hasattr(row, 'balance') for row in response.context['transactions']))
+        
+        response = self.get(reverse('transaction-list') + '?q=coffee')
+        self.assertEqual(response.context['paginator'].count, 45)
+        
+    def test_invalid_pages_return_404(self):
+        """Test that out-of-range pages and broken cursors are not found"""
+        self.assertEqual(self.get(reverse('transaction-list') + '?page=9').status_code, 404)
+        self.assertEqual(self.get(reverse('transaction-list') + '?cursor=broken').status_code, 404)
+        
+    def test_category_and_budget_lists(self):
+        """Test that the other list pages render through their async views"""
+        self.assertContains(self.get(reverse('category-list')), 'Salary')
+        self.assertContains(self.get(reverse('budget-list')), 'Food')
+        
+    def test_query_counts_match_sync_budgets(self):
+        """Test that the async views run no more queries than the sync budgets allow"""
+        for name in ('dashboard', 'transaction-list', 'category-list', 'budget-list'):
+            with self.subTest(url=name):
+                cache.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    self.assertEqual(self.get(reverse(name)).status_code, 200)
+                self.assertLessEqual(len(captured), QueryBudgetTests.QUERY_BUDGETS[name])
+        
+    def test_anonymous_users_are_redirected(self):
+        """Test that the async views require a login"""
+        self.async_client.logout()
+        for name in ('dashboard', 'transaction-list', 'category-list', 'budget-list'):
+            response = self.get(reverse(name))
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response.url.startswith(settings.LOGIN_URL))
+
+
+class ConcurrentQueryTests(TransactionTestCase):
+    """Test that ``concurrency.gather`` overlaps queries outside transactions"""
+    
+    def test_queries_run_in_parallel_threads(self):
+        """Test that every callable gets its own thread and connection"""
+        barrier = threading.Barrier(3, timeout=10)
+        
+        def query():
+            # Each call waits for the others, so this only passes if they run at the same time
+            barrier.wait()
+            return threading.get_ident(), User.objects.count()
+        
+        results = async_to_sync(concurrency.gather)(query, query, query)
+        self.assertEqual(len({ident for ident, _ in results}), 3)
+        self.assertEqual([count for _, count in results], [0, 0, 0])
+        
+    def test_transactions_run_serially_on_their_connection(self):
+        """Test that callables inside an atomic block share its connection"""
+        with db_transaction.atomic():
+            user = User.objects.create_user(username='uncommitted')
+            results = async_to_sync(concurrency.gather)(
+                lambda: User.objects.filter(pk=user.pk).exists(),
+                lambda: threading.get_ident(),
+            )
+        self.assertEqual(results, [True, threading.get_ident()])
+
+
+class FakeConnection:
+    """Stand-in for a DB-API connection, recording rollbacks and closes"""
+    
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.rollbacks = 0
+        self.closed = False
+        
+    def rollback(self):
+        self.rollbacks += 1
+        
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(TestCase):
+    """Test the in-process connection pool and the pooled SQLite backend"""
+    
+    def make_pool(self, **kwargs):
+        self.now = 0.0
+        
+        def ping(connection):
+            if not connection.alive:
+                raise OSError('server closed the connection')
+        
+        return pool.ConnectionPool(ping=ping, clock=lambda: self.now, **kwargs)
+        
+    def test_connections_are_reused(self):
+        """Test that a returned connection is handed out again, rolled back"""
+        connection_pool = self.make_pool()
+        first = connection_pool.checkout(FakeConnection)
+        connection_pool.checkin(first)
+        self.assertIs(connection_pool.checkout(FakeConnection), first)
+        self.assertEqual(first.rollbacks, 1)
+        stats = connection_pool.stats()
+        self.assertEqual((stats['created'], stats['checkouts'], stats['in_use']), (1, 2, 1))
+        
+    def test_exhausted_pool_times_out(self):
+        """Test that checkouts beyond max_size wait and then fail"""
+        connection_pool = pool.ConnectionPool(max_size=1, timeout=0.05)
+        connection_pool.checkout(FakeConnection)
+        with self.assertRaises(pool.PoolTimeout):
+            connection_pool.checkout(FakeConnection)
+        self.assertEqual(connection_pool.stats()['timeouts'], 1)
+        
+    def test_waiting_checkout_gets_returned_connection(self):
+        """Test that a waiting thread receives the next connection checked in"""
+        connection_pool = pool.ConnectionPool(max_size=1, timeout=5)
+        held = connection_pool.checkout(FakeConnection)
+        threading.Timer(0.05, connection_pool.checkin, [held]).start()
+        self.assertIs(connection_pool.checkout(FakeConnection), held)
+        stats = connection_pool.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['max_wait_time_ms'], 0)
+        
+    def test_idle_connections_are_health_checked(self):
+        """Test that a dead idle connection is replaced after check_after"""
+        connection_pool = self.make_pool(check_after=30)
+        dead = connection_pool.checkout(FakeConnection)
+        connection_pool.checkin(dead)
+        dead.alive = False
+        self.now = 10.0
+        self.assertIs(connection_pool.checkout(FakeConnection), dead)  # Not checked yet
+        connection_pool.checkin(dead)
+        self.now = 50.0
+        replacement = connection_pool.checkout(FakeConnection)
+        self.assertIsNot(replacement, dead)
+        self.assertTrue(dead.closed)
+        self.assertEqual(connection_pool.stats()['size'], 1)
+        
+    def test_old_and_idle_connections_are_closed(self):
+        """Test max_lifetime on checkin and max_idle on checkout"""
+        connection_pool = self.make_pool(max_idle=60, max_lifetime=100)
+        old = connection_pool.checkout(FakeConnection)
+        self.now = 150.0
+        connection_pool.checkin(old)
+        self.assertTrue(old.closed)
+        
+        idle = connection_pool.checkout(FakeConnection)
+        connection_pool.checkin(idle)
+        self.now = 250.0
+        self.assertIsNot(connection_pool.checkout(FakeConnection), idle)
+        self.assertTrue(idle.closed)
+        self.assertEqual(connection_pool.stats()['discarded'], 2)
+        
+    def test_pooled_sqlite_backend(self):
+        """Test that closing a pooled connection returns it for the next request"""
+        with tempfile.TemporaryDirectory() as directory:
+            alias = 'pooled_test'
+            connections.settings[alias] = {
+                **connections.settings['default'],
+                'ENGINE': 'finance.backends.sqlite3',
+                'NAME': os.path.join(directory, 'pooled.sqlite3'),
+                'CONN_MAX_AGE': 0,
+                'POOL': {'MAX_SIZE': 2},
+            }
+            try:
+                wrapper = connections[alias]
+                connects = pool.connection_stats()[alias]['connects']
+                for _ in range(3):
+                    with wrapper.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                    # What request_finished does
+                    wrapper.close_if_unusable_or_obsolete()
+                self.assertIsNone(wrapper.connection)
+                stats = pool.connection_stats()[alias]['pool']
+                self.assertEqual((stats['created'], stats['checkouts'], stats['idle']), (1, 3, 1))
+                # Connections opened, not checkouts
+                self.assertEqual(pool.connection_stats()[alias]['connects'] - connects, 1)
+            finally:
+                pool.get_pool(alias, connections.settings[alias]).close()
+                del connections[alias]
+                del connections.settings[alias]
+        
+    def test_database_stats_endpoint(self):
+        """Test that connection settings and counters are reported as JSON to staff and the metrics token only"""
+        url = reverse('health-database')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        user = User.objects.create_user(username='statsuser', password='testpass123')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.logout()
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        user.is_staff = True
+        user.save()
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()['databases']['default']
+        self.assertEqual(stats['vendor'], 'sqlite')
+        self.assertTrue(stats['health_checks'])
+        self.assertIsNone(stats['pool'])
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """Test the read-replica router with a SQLite file standing in for the replica"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='replicauser', password='testpass123')
+        self.category = Category.objects.create(user=self.user, name='Food')
+        self.add_transaction('Replicated coffee')
+        # Log in before copying, so the session exists on the replica too
+        self.client.force_login(self.user)
+        
+        self.directory = tempfile.TemporaryDirectory()
+        connections.settings['replica_test'] = {
+            **connections.settings['default'],
+            'NAME': os.path.join(self.directory.name, 'replica.sqlite3'),
+        }
+        routers.copy_sqlite_database('default', 'replica_test')
+        # Written after the copy: only the primary has it, as if the replica lagged
+        self.add_transaction('Primary-only tea')
+        
+        replicas = override_settings(REPLICA_DATABASES=['replica_test'], REPLICA_PIN_SECONDS=5)
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+        
+    def tearDown(self):
+        connections['replica_test'].close()
+        del connections['replica_test']
+        del connections.settings['replica_test']
+        self.directory.cleanup()
+        
+    def add_transaction(self, description):
+        return Transaction.objects.create(
+            user=self.user, type='Expense', amount=Decimal('3.00'), date=date(2024, 5, 1),
+            category=self.category, description=description
+        )
+        
+    def test_get_requests_read_from_replica(self):
+        """Test that list pages and streamed exports are served from the replica"""
+        response = self.client.get(reverse('transaction-list'))
+        self.assertContains(response, 'Replicated coffee')
+        self.assertNotContains(response, 'Primary-only tea')
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+        
+        export = b''.join(self.client.get(reverse('transaction-export')).streaming_content).decode()
+        self.assertIn('Replicated coffee', export)
+        self.assertNotIn('Primary-only tea', export)
+        
+    def test_writes_pin_client_to_primary(self):
+        """Test that after a write the same client reads its own writes until the pin expires"""
+        response = self.client.post(reverse('transaction-create'), {
+            'type': 'Expense', 'amount': '4.50', 'date': '2024-05-02',
+            'category': self.category.pk, 'description': 'Fresh juice',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], 5)
+        
+        response = self.client.get(reverse('transaction-list'))
+        self.assertContains(response, 'Fresh juice')
+        self.assertContains(response, 'Primary-only tea')
+        
+        # Once the cookie expires, reads go back to the (still lagging) replica
+        del self.client.cookies[routers.PIN_COOKIE]
+        self.assertNotContains(self.client.get(reverse('transaction-list')), 'Fresh juice')
+        
+    def test_router_uses_primary_outside_requests_and_transactions(self):
+        """Test the cases in which reads must not go to a replica"""
+        router = routers.ReplicaRouter()
+        self.assertEqual(router.db_for_read(Transaction), 'default')
+        
+        token = routers._routing.set(routers.RequestRouting(use_replicas=True))
+        try:
+            self.assertEqual(router.db_for_read(Transaction), 'replica_test')
+            with db_transaction.atomic():
+                self.assertEqual(router.db_for_read(Transaction), 'default')
+            self.assertEqual(router.db_for_write(Transaction), 'default')
+            # Reads later in a request that wrote see the write
+            self.assertEqual(router.db_for_read(Transaction), 'default')
+        finally:
+            routers._routing.reset(token)
+        self.assertFalse(router.allow_migrate('replica_test', 'finance'))
+
+
+class ShardingTests(TransactionTestCase):
+    """Test user sharding with two SQLite files as the shards"""
+    
+    SHARDS = ['shard_a', 'shard_b']
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        for alias in self.SHARDS:
+            connections.settings[alias] = {
+                **connections.settings['default'],
+                'NAME': os.path.join(self.directory.name, f'{alias}.sqlite3'),
+            }
+            call_command('migrate', database=alias, verbosity=0)
+        
+    def tearDown(self):
+        for alias in self.SHARDS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        self.directory.cleanup()
+        
+    def enable_sharding(self):
+        shards = override_settings(SHARD_DATABASES=self.SHARDS)
+        shards.enable()
+        self.addCleanup(shards.disable)
+        
+    def create_users(self):
+        """Create users until there is one on each shard"""
+        users = {}
+        while len(users) < len(self.SHARDS):
+            user = User.objects.create_user(username=f'sharded{User.objects.count()}', password='testpass123')
+            users.setdefault(sharding.shard_for(user.pk, self.SHARDS), user)
+        return users['shard_a'], users['shard_b']
+        
+    def add_data(self, user, description):
+        # Outside a request, creating through a manager needs the shard selected
+        with sharding.for_user(user.pk):
+            category = Category.objects.create(user=user, name='Food')
+            Budget.objects.create(user=user, category=category, limit=Decimal('100.00'), period='Monthly')
+            return Transaction.objects.create(
+                user=user, type='Expense', amount=Decimal('12.50'), date=date.today(),
+                category=category, description=description
+            )
+        
+    def test_shard_choice_is_stable(self):
+        """Test that the hash is deterministic and a new shard only takes users from the others"""
+        self.assertEqual(sharding.shard_for(42, ['s1', 's2']), sharding.shard_for(42, ['s2', 's1']))
+        self.assertEqual(sharding.shard_for(42, []), 'default')
+        for user_id in range(1, 300):
+            before = sharding.shard_for(user_id, ['s1', 's2'])
+            self.assertIn(sharding.shard_for(user_id, ['s1', 's2', 's3']), (before, 's3'))
+        spread = {sharding.shard_for(user_id, ['s1', 's2', 's3']) for user_id in range(1, 300)}
+        self.assertEqual(spread, {'s1', 's2', 's3'})
+        
+    def test_data_lives_on_the_users_shard(self):
+        """Test that each user's rows, rollups and user copy are written to their shard only"""
+        self.enable_sharding()
+        user_a, user_b = self.create_users()
+        self.add_data(user_a, 'Shard A lunch')
+        self.add_data(user_b, 'Shard B lunch')
+        
+        for user, home, other in ((user_a, 'shard_a', 'shard_b'), (user_b, 'shard_b', 'shard_a')):
+            for model in (Category, Transaction, Budget, MonthlyRollup):
+                self.assertEqual(model.objects.using(home).filter(user=user).count(), 1)
+                self.assertFalse(model.objects.using(other).filter(user=user).exists())
+                self.assertFalse(model.objects.using('default').exists())
+            self.assertTrue(User.objects.using(home).filter(pk=user.pk, username=user.username).exists())
+        
+        with self.assertRaises(sharding.ShardingError):
+            Transaction.objects.count()
+        with sharding.for_user(user_a.pk):
+            self.assertEqual(Transaction.objects.get().description, 'Shard A lunch')
+        
+    def test_requests_use_the_logged_in_users_shard(self):
+        """Test that list views, forms and the dashboard read and write the user's shard"""
+        self.enable_sharding()
+        user_a, user_b = self.create_users()
+        self.add_data(user_b, 'Shard B lunch')
+        category = user_a.categories.create(name='Travel')
+        
+        self.client.force_login(user_a)
+        response = self.client.post(reverse('transaction-create'), {
+            'type': 'Expense', 'amount': '30.00', 'date': date.today().isoformat(),
+            'category': category.pk, 'description': 'Shard A train',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Transaction.objects.using('shard_a').filter(description='Shard A train').exists())
+        
+        response = self.client.get(reverse('transaction-list'))
+        self.assertContains(response, 'Shard A train')
+        self.assertNotContains(response, 'Shard B lunch')
+        self.assertContains(self.client.get(reverse('dashboard')), '30.00')
+        
+        self.client.force_login(user_b)
+        response = self.client.get(reverse('transaction-list'))
+        self.assertContains(response, 'Shard B lunch')
+        self.assertNotContains(response, 'Shard A train')
+        
+    def test_rebalance_moves_data_to_its_shard(self):
+        """Test enabling sharding on existing data, keeping timestamps and rollups"""
+        user_a, user_b = self.create_users()
+        self.enable_sharding()
+        # Written to default while sharding was off
+        with override_settings(SHARD_DATABASES=[]):
+            original = self.add_data(user_a, 'Unsharded lunch')
+        
+        out = StringIO()
+        call_command('rebalance_shards', '--dry-run', stdout=out)
+        self.assertIn(f'user={user_a.pk}: default -> shard_a', out.getvalue())
+        self.assertTrue(Transaction.objects.using('default').exists())
+        
+        call_command('rebalance_shards', stdout=StringIO())
+        for model in (Category, Transaction, Budget, MonthlyRollup):
+            self.assertFalse(model.objects.using('default').exists())
+        moved = Transaction.objects.using('shard_a').get(user=user_a)
+        self.assertEqual(moved.description, 'Unsharded lunch')
+        self.assertEqual(moved.created_at, original.created_at)
+        self.assertEqual(moved.category.name, 'Food')
+        self.assertEqual(Budget.objects.using('shard_a').get(user=user_a).category_id, moved.category_id)
+        with sharding.for_user(user_a.pk):
+            self.assertEqual(rollups.verify(user_a), [])
+        
+        out = StringIO()
+        call_command('rebalance_shards', stdout=out)
+        self.assertIn('Moved 0 user(s).', out.getvalue())
+        
+    def test_deleting_user_deletes_shard_data(self):
+        """Test that deleting a user on default cascades on their shard"""
+        self.enable_sharding()
+        user_a, _ = self.create_users()
+        self.add_data(user_a, 'Doomed lunch')
+        
+        user_id = user_a.pk
+        user_a.delete()
+        self.assertFalse(User.objects.using('shard_a').filter(pk=user_id).exists())
+        for model in (Category, Transaction, Budget, MonthlyRollup):
+            self.assertFalse(model.objects.using('shard_a').filter(user_id=user_id).exists())
+        
+    def test_raw_delete(self):
+        """Test that raw_delete, built on Django's private QuerySet._raw_delete, issues one DELETE and no signals"""
+        self.enable_sharding()
+        user_a, user_b = self.create_users()
+        self.add_data(user_a, 'Doomed lunch')
+        self.add_data(user_b, 'Kept lunch')
+        handler = mock.Mock()
+        post_delete.connect(handler, sender=Transaction, weak=False)
+        self.addCleanup(post_delete.disconnect, handler, sender=Transaction)
+        
+        with CaptureQueriesContext(connections['shard_a']) as captured:
+            deleted = sharding.raw_delete(Transaction.objects.using('shard_a').filter(user=user_a), 'shard_a')
+        self.assertEqual(deleted, 1)
+        self.assertEqual([query['sql'].split()[0] for query in captured], ['DELETE'])
+        handler.assert_not_called()
+        self.assertFalse(Transaction.objects.using('shard_a').filter(user=user_a).exists())
+        self.assertTrue(Transaction.objects.using('shard_b').filter(user=user_b).exists())
+        # Left for the caller to adjust
+        self.assertTrue(MonthlyRollup.objects.using('shard_a').filter(user=user_a).exists())
+        
+    def test_migrate_all_shards(self):
+        """Test that the command migrates default and every shard"""
+        self.enable_sharding()
+        out = StringIO()
+        call_command('migrate_all_shards', stdout=out)
+        for alias in ['default'] + self.SHARDS:
+            self.assertIn(f'Database {alias}:', out.getvalue())
+
+
+class GunicornConfigTests(TestCase):
+    """Test worker sizing in gunicorn.conf.py and the worker warm-up"""
+    
+    def load_config(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+        
+    def test_worker_sizing_per_mode(self):
+        """Test that each mode is sized from CPUs and capped by memory"""
+        worker_sizing = self.load_config()['worker_sizing']
+        self.assertEqual(worker_sizing('wsgi', 4, None), (9, 1))
+        self.assertEqual(worker_sizing('gthread', 4, None), (5, 4))
+        self.assertEqual(worker_sizing('gthread', 4, None, threads=8), (5, 8))
+        self.assertEqual(worker_sizing('asgi', 4, None), (4, 1))
+        # 1 GiB leaves room for five 150 MiB sync workers, or four threaded ones
+        self.assertEqual(worker_sizing('wsgi', 16, 1024), (5, 1))
+        self.assertEqual(worker_sizing('gthread', 16, 1024), (4, 4))
+        self.assertEqual(worker_sizing('wsgi', 1, 64), (1, 1))
+        
+    def test_mode_selects_worker_class_and_application(self):
+        """Test the settings each SERVER_MODE produces and the environment overrides"""
+        config = self.load_config(SERVER_MODE='asgi', WEB_CONCURRENCY='7', GUNICORN_MAX_REQUESTS='500')
+        self.assertEqual(config['worker_class'], 'uvicorn.workers.UvicornWorker')
+        self.assertEqual(config['wsgi_app'], 'FinanceTracker.asgi:application')
+        self.assertEqual(config['workers'], 7)
+        self.assertEqual((config['max_requests'], config['max_requests_jitter']), (500, 50))
+        self.assertTrue(config['preload_app'])
+        
+        config = self.load_config(SERVER_MODE='gthread')
+        self.assertEqual((config['worker_class'], config['wsgi_app']), ('gthread', 'FinanceTracker.wsgi:application'))
+        self.assertGreaterEqual(config['workers'], 1)
+        with self.assertRaises(RuntimeError):
+            self.load_config(SERVER_MODE='threads')
+        
+    def test_warm_up_loads_templates_and_connects(self):
+        """Test that warming up compiles templates and fills the connection pool"""
+        self.assertGreaterEqual(warmup.warm_code(), 0)
+        
+        alias = 'warmup_pooled'
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections.settings[alias] = {
+            **connections.settings['default'],
+            'ENGINE': 'finance.backends.sqlite3',
+            'NAME': os.path.join(directory.name, 'warmup.sqlite3'),
+            'POOL': {'MAX_SIZE': 2},
+        }
+        try:
+            with mock.patch.object(warmup.logger, 'warning') as warning:
+                warmup.warm_connections()
+            warning.assert_not_called()
+            self.assertEqual(pool.get_pool(alias, connections.settings[alias]).stats()['idle'], 1)
+        finally:
+            pool.get_pool(alias, connections.settings[alias]).close()
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+
+
+class WaitForDbCommandTests(TestCase):
+    """Test the wait_for_db startup command"""
+    
+    def test_retries_with_exponential_backoff(self):
+        """Test that failed connections are retried with doubling, capped delays"""
+        failures = [OperationalError('starting up')] * 4
+        
+        def ensure_connection():
+            if failures:
+                raise failures.pop()
+        
+        out, err = StringIO(), StringIO()
+        with mock.patch.object(connections['default'], 'ensure_connection', side_effect=ensure_connection), \
+                mock.patch('finance.management.commands.wait_for_db.random.uniform', side_effect=lambda low, high: high), \
+                mock.patch('finance.management.commands.wait_for_db.time.sleep') as sleep:
+            call_command('wait_for_db', '--initial-delay', '1', '--max-delay', '4', stdout=out, stderr=err)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [1, 2, 4, 4])
+        self.assertIn('ready after 5 attempt(s)', out.getvalue())
+        self.assertEqual(err.getvalue().count('Database not ready'), 4)
+        
+    def test_gives_up_after_timeout(self):
+        """Test that an unreachable database fails the command once the timeout passes"""
+        with mock.patch.object(connections['default'], 'ensure_connection', side_effect=OperationalError('refused')), \
+                mock.patch('finance.management.commands.wait_for_db.time.sleep'):
+            with self.assertRaisesMessage(CommandError, 'unavailable after'):
+                call_command('wait_for_db', '--timeout', '0', stdout=StringIO(), stderr=StringIO())
+        
+    def test_migrate_skipped_when_nothing_is_pending(self):
+        """Test that --migrate only runs migrate when the plan is not empty"""
+        out = StringIO()
+        with mock.patch('finance.management.commands.wait_for_db.call_command') as migrate:
+            call_command('wait_for_db', '--migrate', stdout=out)
+        migrate.assert_not_called()
+        self.assertIn('No migrations pending on default', out.getvalue())
+
+
+class LoadTestTests(TestCase):
+    """Test the load generator behind the benchmark commands"""
+    
+    def serve(self):
+        """Start a local HTTP server echoing 200, except 500 for /fail/; returns its URL and the request log"""
+        log = []
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                log.append((self.command, self.path, self.headers.get('Cookie'), self.rfile.read(length)))
+                self.send_response(500 if self.path == '/fail/' else 200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            
+            do_GET = do_POST = respond
+            
+            def log_message(self, *args):
+                pass
+        
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f'http://127.0.0.1:{server.server_port}', log
+        
+    def test_results_per_target_and_session(self):
+        """Test that sessions send their own headers and targets are reported by label"""
+        base_url, log = self.serve()
+        sessions = [
+            ({'Cookie': 'a'}, [loadtest.Target('/page/', label='page'), loadtest.Target('/batch/', label='batch', body={'x': 1})]),
+            ({'Cookie': 'b'}, ['/fail/']),
+        ]
+        result = loadtest.run(base_url, None, concurrency=2, duration=0.3, warmup=0, sessions=sessions)
+        
+        self.assertEqual(set(result.by_label), {'page', 'batch', '/fail/'})
+        self.assertGreater(result.by_label['page'].requests, 0)
+        self.assertEqual(result.by_label['/fail/'].requests, 0)
+        self.assertGreater(result.by_label['/fail/'].errors, 0)
+        self.assertEqual(result.errors, result.by_label['/fail/'].errors)
+        self.assertEqual(result.requests, result.by_label['page'].requests + result.by_label['batch'].requests)
+        self.assertIn(('POST', '/batch/', 'a', b'{"x": 1}'), log)
+        self.assertTrue(all(cookie == 'b' for _, path, cookie, _ in log if path == '/fail/'))
+        
+    def test_csrf_headers(self):
+        """Test that the CSRF cookie and header carry the same token"""
+        headers = loadtest.csrf_headers('sessionid=abc')
+        self.assertEqual(headers['Cookie'], f"sessionid=abc; {settings.CSRF_COOKIE_NAME}={headers['X-CSRFToken']}")
+        self.assertEqual(len(headers['X-CSRFToken']), 32)
+        
+    def test_benchmark_load_tiers(self):
+        """Test that benchmark_load reads tier sizes with k and m suffixes"""
+        from .management.commands.benchmark_load import parse_tier
+        self.assertEqual([parse_tier(tier) for tier in ('500', '1k', '100K', '1m', '2.5m')], [500, 1000, 100_000, 1_000_000, 2_500_000])
+        with self.assertRaises(CommandError):
+            parse_tier('lots')
+
+
+class SeedFinanceTests(TestCase):
+    """Test the seed_finance synthetic data command"""
+    
+    def seed(self, *args):
+        call_command(
+            'seed_finance', '--users', '3', '--rows', '400', '--months', '6', '--end-date', '2026-06-15',
+            '--prefix', 'seeded-', *args, stdout=StringIO(), stderr=StringIO(),
+        )
+        return list(
+            Transaction.objects.filter(user__username__startswith='seeded-')
+            .order_by('user__username', 'date', 'description', 'amount')
+            .values_list('user__username', 'date', 'type', 'amount', 'category__name', 'description')
+        )
+        
+    def test_same_seed_gives_same_data(self):
+        """Test that a seed always produces the same rows, and another seed different ones"""
+        first = self.seed('--seed', '3')
+        self.assertEqual(self.seed('--seed', '3', '--replace'), first)
+        self.assertNotEqual(self.seed('--seed', '4', '--replace'), first)
+
+    def test_end_date_is_fixed_unless_today_is_asked_for(self):
+        """Test that histories end on a fixed day by default, so they do not change with the date"""
+        call_command('seed_finance', '--users', '2', '--rows', '50', '--prefix', 'fixed-', stdout=StringIO())
+        last = Transaction.objects.filter(user__username__startswith='fixed-').latest('date').date
+        from .management.commands.seed_finance import parse_end_date
+        self.assertLessEqual(last, seeding.END_DATE)
+        self.assertEqual((last.year, last.month), (seeding.END_DATE.year, seeding.END_DATE.month))
+        self.assertEqual(parse_end_date('today'), date.today())
+        self.assertEqual(parse_end_date('2024-02-29'), date(2024, 2, 29))
+        
+    def test_generated_data(self):
+        """Test row counts, skew, date range, budgets of every period and rollups"""
+        rows = self.seed()
+        self.assertEqual(len(rows), 400)
+        per_user = [sum(1 for row in rows if row[0] == f'seeded-{index}') for index in range(3)]
+        self.assertEqual(per_user, seeding.user_counts(400, 3))
+        self.assertGreater(per_user[0], per_user[1])
+        self.assertGreater(per_user[1], per_user[2])
+        self.assertTrue(all(date(2026, 1, 1) <= row[1] <= date(2026, 6, 15) for row in rows))
+        # A salary on the 25th of every month but the current, which has not reached it
+        salaries = [row[1] for row in rows if row[0] == 'seeded-0' and row[4] == 'Salary']
+        self.assertEqual(salaries, [date(2026, month, 25) for month in range(1, 6)] + [date(2026, 6, 15)])
+        
+        for user in User.objects.filter(username__startswith='seeded-'):
+            periods_used = set(Budget.objects.filter(user=user).values_list('period', flat=True))
+            self.assertEqual(periods_used, {period for period, _ in Budget.PERIOD_CHOICES})
+        self.assertEqual(rollups.verify(), [])
+        
+    def test_existing_users_need_replace(self):
+        """Test that seeding over existing users is refused without --replace"""
+        self.seed()
+        with self.assertRaisesMessage(CommandError, '--replace'):
+            self.seed()
+        
+    def test_allocate_is_exact(self):
+        """Test that allocations always add up to the total"""
+        self.assertEqual(seeding.allocate(10, [1, 1, 1]), [4, 3, 3])
+        self.assertEqual(sum(seeding.user_counts(1_000_003, 97, skew=1.2)), 1_000_003)
+        self.assertEqual(seeding.allocate(5, [0, 0]), [0, 0])
+
+
+class MetricsTests(TestCase):
+    """Test the Prometheus metrics middleware and endpoint"""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='metricsuser', password='testpass123')
+        Category.objects.create(user=self.user, name='Groceries')
+        self.client.login(username='metricsuser', password='testpass123')
+        
+    def counter(self, name, **labels):
+        totals = metrics.collect()['counters']
+        return sum(
+            value for (metric, metric_labels), value in totals.items()
+            if metric == name and labels.items() <= dict(metric_labels).items()
+        )
+        
+    def test_records_latency_queries_rendering_and_cache(self):
+        """Test that a dashboard request is counted with its queries, render time and cache lookup"""
+        before = {
+            'requests': self.counter('finance_http_requests_total', view='dashboard', status='200'),
+            'queries': self.counter('finance_db_queries_total', view='dashboard'),
+            'render': self.counter('finance_template_render_seconds_total', view='dashboard'),
+            'misses': self.counter('finance_cache_requests_total', view='dashboard', result='miss'),
+            'hits': self.counter('finance_cache_requests_total', view='dashboard', result='hit'),
+        }
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('dashboard'))
+        self.client.get(reverse('dashboard'))
+        
+        self.assertEqual(self.counter('finance_http_requests_total', view='dashboard', status='200'), before['requests'] + 2)
+        self.assertGreaterEqual(self.counter('finance_db_queries_total', view='dashboard'), before['queries'] + len(captured))
+        self.assertGreater(self.counter('finance_template_render_seconds_total', view='dashboard'), before['render'])
+        self.assertEqual(self.counter('finance_cache_requests_total', view='dashboard', result='miss'), before['misses'] + 1)
+        self.assertEqual(self.counter('finance_cache_requests_total', view='dashboard', result='hit'), before['hits'] + 1)
+        
+    def test_endpoint(self):
+        """Test the text format of the endpoint and that only staff and the token can read it"""
+        self.client.get(reverse('dashboard'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        body = response.content.decode()
+        self.assertIn('# TYPE finance_http_request_duration_seconds histogram', body)
+        self.assertRegex(body, r'finance_http_request_duration_seconds_bucket\{view="dashboard",method="GET",le="\+Inf"\} \d+')
+        self.assertIn('finance_db_connects{database="default",pid=', body)
+        
+        self.client.logout()
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+        
+    def test_aggregates_worker_snapshots(self):
+        """Test that other processes' snapshots are added and archived once they exit"""
+        self.client.get(reverse('dashboard'))
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        labels = [['view', 'elsewhere'], ['method', 'GET'], ['status', '200']]
+        for pid, count in ((101, 2), (102, 3)):
+            with open(os.path.join(directory, f'{pid}-1.json'), 'w') as file:
+                json.dump({'counters': [['finance_http_requests_total', labels, count]], 'histograms': [],
+                           'gauges': [['finance_db_connects', [['database', 'default'], ['pid', str(pid)]], 1]]}, file)
+        
+        with override_settings(METRICS_DIR=directory):
+            metrics.flush()
+            self.assertEqual(self.counter('finance_http_requests_total', view='elsewhere'), 5)
+            
+            metrics.mark_process_dead(101, directory)
+            self.assertFalse(os.path.exists(os.path.join(directory, '101-1.json')))
+            self.assertEqual(self.counter('finance_http_requests_total', view='elsewhere'), 5)
+            gauges = metrics.collect()['gauges']
+            self.assertNotIn(('finance_db_connects', (('database', 'default'), ('pid', '101'))), gauges)
+            self.assertIn(('finance_db_connects', (('database', 'default'), ('pid', '102'))), gauges)
+            # A worker archived while the snapshots are read is still counted once
+            real_glob, archived = metrics.glob.glob, []
+            
+            def archive_during_read(pattern):
+                paths = real_glob(pattern)
+                if pattern.endswith('*-*.json') and not archived:
+                    archived.append(102)
+                    metrics.mark_process_dead(102, directory)
+                return paths
+            
+            with mock.patch.object(metrics.glob, 'glob', side_effect=archive_during_read):
+                self.assertEqual(self.counter('finance_http_requests_total', view='elsewhere'), 5)
+            self.assertFalse(os.path.exists(os.path.join(directory, '102-1.json')))
+            self.assertEqual(self.counter('finance_http_requests_total', view='elsewhere'), 5)
+            # This process's own file is not counted on top of its live figures
+            self.assertEqual(
+                self.counter('finance_http_requests_total', view='dashboard'),
+                sum(value for name, labels, value in metrics.snapshot()['counters']
+                    if name == 'finance_http_requests_total' and ('view', 'dashboard') in labels),
+            )
+
+
+class ProfilingTests(TestCase):
+    """Test the Server-Timing header, slow-request logs and on-demand profiles"""
+    
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='profileuser', password='testpass123')
+        Category.objects.create(user=self.user, name='Groceries')
+        self.client.login(username='profileuser', password='testpass123')
+        
+    def test_server_timing(self):
+        """Test that responses break their time down into db, render, cache and total"""
+        response = self.client.get(reverse('dashboard'))
+        timings = dict(re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing']))
+        self.assertEqual(set(timings), {'db', 'render', 'cache', 'total'})
+        self.assertGreater(float(timings['db']), 0)
+        self.assertGreater(float(timings['render']), 0)
+        self.assertGreaterEqual(float(timings['total']), float(timings['db']) + float(timings['render']))
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+        
+        with override_settings(SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('dashboard')))
+        
+    def test_slow_and_sampled_requests_are_logged(self):
+        """Test the JSON log record of slow and sampled requests, with every query"""
+        with override_settings(SLOW_REQUEST_SECONDS=0.000001):
+            with self.assertLogs('finance.profiling', 'WARNING') as logs, CaptureQueriesContext(connection) as captured:
+                self.client.get(reverse('dashboard'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['reason'], 'slow')
+        self.assertEqual(record['view'], 'dashboard')
+        self.assertEqual(record['query_count'], len(captured))
+        # Without their parameters
+        self.assertIn('"django_session"."session_key" = %s', record['queries'][0]['sql'])
+        
+        with override_settings(SLOW_REQUEST_SECONDS=0, SLOW_REQUEST_SAMPLE_RATE=1.0):
+            with self.assertLogs('finance.profiling', 'INFO') as logs:
+                self.client.get(reverse('dashboard'))
+        self.assertEqual(json.loads(logs.records[0].getMessage())['reason'], 'sampled')
+        
+        with override_settings(SLOW_REQUEST_SECONDS=0, SLOW_REQUEST_SAMPLE_RATE=0):
+            with self.assertNoLogs('finance.profiling'):
+                self.client.get(reverse('dashboard'))
+        
+    def test_duplicate_fingerprints(self):
+        """Test that queries differing only in values share a fingerprint and are reported as duplicates"""
+        sql = 'SELECT * FROM "finance_category" WHERE "finance_category"."id" IN (%s, %s)'
+        self.assertEqual(profiling.fingerprint(sql), profiling.fingerprint(sql.replace('(%s, %s)', '(%s)')))
+        self.assertEqual(profiling.fingerprint('SELECT 1 LIMIT 21'), profiling.fingerprint('SELECT 1  LIMIT 5'))
+        self.assertNotEqual(profiling.fingerprint(sql), profiling.fingerprint('SELECT * FROM "finance_budget"'))
+        
+        stats = metrics.RequestStats()
+        stats.sql = [('default', sql, 0.002, False), ('default', 'SELECT 1', 0.001, False), ('default', sql, 0.003, False)]
+        request = Client().get(reverse('login')).wsgi_request
+        record = profiling.profile_record(request, mock.Mock(status_code=200), stats, 0.01, 'slow')
+        self.assertEqual(record['query_count'], 3)
+        self.assertEqual(len(record['duplicates']), 1)
+        self.assertEqual(record['duplicates'][0]['count'], 2)
+        self.assertAlmostEqual(record['duplicates'][0]['ms'], 5.0)
+        
+    def test_profile_header(self):
+        """Test that staff get a cProfile report of a request and other users the normal response"""
+        response = self.client.get(reverse('dashboard'), HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Status', response)
+        
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(reverse('dashboard'), HTTP_X_PROFILE='tottime')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(response['X-Profile-Status'], '200')
+        self.assertIn('function calls', response.content.decode())
+        self.assertIn('Ordered by: internal time', response.content.decode())
+        
+        response = self.client.get(reverse('dashboard'), HTTP_X_PROFILE='pstats')
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        with tempfile.NamedTemporaryFile() as file:
+            file.write(response.content)
+            file.flush()
+            self.assertTrue(pstats.Stats(file.name).total_calls)
+
+
+class HealthTests(TestCase):
+    """Test the liveness probe and the cached readiness probe"""
+    
+    def setUp(self):
+        health.reset()
+        self.addCleanup(health.reset)
+        
+    def test_liveness_does_no_io(self):
+        """Test that the liveness probe answers without touching the database or cache"""
+        with self.assertNumQueries(0), mock.patch.object(health, 'check') as check:
+            response = self.client.get(reverse('health-live'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'OK')
+        check.assert_not_called()
+        
+    def test_readiness_is_cached(self):
+        """Test the readiness report and that probes within the TTL make no queries"""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('health-ready'))
+        self.assertGreater(len(captured), 0)
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report['status'], 'ok')
+        self.assertTrue(report['checks']['databases']['default']['ok'])
+        self.assertGreaterEqual(report['checks']['databases']['default']['ms'], 0)
+        self.assertTrue(report['checks']['migrations']['default']['ok'])
+        self.assertTrue(report['checks']['cache']['ok'])
+        self.assertNotIn('pool', report)
+        self.assertNotIn('pid', report)
+        with override_settings(METRICS_TOKEN='secret'):
+            report = self.client.get(reverse('health-ready'), HTTP_AUTHORIZATION='Bearer secret').json()
+        self.assertEqual(report['checks']['migrations']['default']['pending'], 0)
+        self.assertIn('connects', report['pool']['default'])
+        
+        with self.assertNumQueries(0):
+            for _ in range(20):
+                self.assertEqual(self.client.get(reverse('health-ready')).json()['checked_at'], report['checked_at'])
+                self.assertEqual(self.client.get(reverse('health-check')).status_code, 200)
+        
+        # Once the TTL passes, only the database is queried again: the migrations stay applied
+        with override_settings(READINESS_CACHE_SECONDS=0), self.assertNumQueries(len(connections.all())):
+            self.client.get(reverse('health-ready'))
+        
+    def test_failing_dependency(self):
+        """Test that a failed check makes the probes report an error"""
+        with mock.patch.object(health, 'check_cache', side_effect=RuntimeError('cache is down')):
+            response = self.client.get(reverse('health-ready'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], 'error')
+        self.assertEqual(response.json()['checks']['cache'], {'ok': False, 'ms': mock.ANY})
+        staff = User.objects.create_user(username='healthstaff', password='testpass123', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(reverse('health-ready')).json()['checks']['cache']['error'], 'cache is down')
+        self.client.logout()
+        
+        response = self.client.get(reverse('health-check'))
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('cache: cache is down', response.content.decode())
+        
+    def test_probes_do_not_wait_for_a_running_check(self):
+        """Test that a stale report is served while another request re-checks"""
+        health.readiness()
+        checked_at = health._result[1]['checked_at']
+        health._result = (health._result[0] - 3600, health._result[1])
+        with health._lock, self.assertNumQueries(0):
+            self.assertEqual(health.readiness()[1]['checked_at'], checked_at)
+        self.assertNotEqual(health.readiness()[1]['checked_at'], checked_at)
+
+
+class SharedMemoryCacheTests(TestCase):
+    """Test the cache backend shared by processes through a memory-mapped file"""
+    
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'cache')
+        
+    def make_cache(self, **options):
+        return sharedcache.SharedMemoryCache(self.path, {'OPTIONS': {'SIZE': 256 * 1024, 'BLOCK_SIZE': 256, **options}})
+        
+    def test_cache_api(self):
+        """Test the Django cache operations"""
+        cache = self.make_cache()
+        cache.set('key', {'amount': Decimal('12.50')})
+        self.assertEqual(cache.get('key'), {'amount': Decimal('12.50')})
+        self.assertIsNone(cache.get('missing'))
+        self.assertEqual(cache.get('missing', 'default'), 'default')
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('new', 'value'))
+        self.assertTrue(cache.has_key('new'))
+        self.assertTrue(cache.delete('new'))
+        self.assertFalse(cache.delete('new'))
+        
+        cache.set('count', 1)
+        self.assertEqual(cache.incr('count'), 2)
+        self.assertEqual(cache.decr('count', 5), -3)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        
+        # A failed increment leaves the rest of the cache in place
+        cache.set('text', 'not a number')
+        with self.assertRaises(TypeError):
+            cache.incr('text')
+        self.assertEqual(cache.get('key'), {'amount': Decimal('12.50')})
+        self.assertEqual(cache.get('text'), 'not a number')
+        self.assertEqual(cache._map[sharedcache.DIRTY_OFFSET], 0)
+        
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        # Spread over many blocks
+        large = os.urandom(20_000)
+        cache.set('large', large)
+        self.assertEqual(cache.get('large'), large)
+        
+        cache.clear()
+        self.assertIsNone(cache.get('key'))
+        
+    def test_expiry(self):
+        """Test timeouts and touch"""
+        cache = self.make_cache()
+        cache.set('short', 1, timeout=0.05)
+        cache.set('forever', 1, timeout=None)
+        cache.set('touched', 1, timeout=0.05)
+        self.assertTrue(cache.touch('touched', timeout=60))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('short'))
+        self.assertTrue(cache.add('short', 2))
+        self.assertEqual(cache.get('forever'), 1)
+        self.assertEqual(cache.get('touched'), 1)
+        
+    def test_least_recently_used_entries_are_evicted(self):
+        """Test eviction from a full set and when the blocks run out"""
+        cache = self.make_cache(MAX_ENTRIES=sharedcache.WAYS)
+        for index in range(sharedcache.WAYS):
+            cache.set(f'key{index}', index)
+        cache.get('key0')
+        cache.set('new', 'value')
+        self.assertEqual(cache.get('key0'), 0)
+        self.assertIsNone(cache.get('key1'))
+        self.assertEqual(cache.get('new'), 'value')
+        
+        cache = self.make_cache(MAX_ENTRIES=64, SIZE=16 * 1024)
+        values = {f'value{index}': os.urandom(3000) for index in range(20)}
+        for key, value in values.items():
+            cache.set(key, value)
+        stored = {key: cache.get(key) for key in values}
+        self.assertEqual(stored['value19'], values['value19'])
+        self.assertIsNone(stored['value0'])
+        self.assertTrue(all(value in (None, values[key]) for key, value in stored.items()))
+        # Larger than the whole cache: not stored
+        cache.set('huge', os.urandom(20_000))
+        self.assertIsNone(cache.get('huge'))
+        
+    def test_shared_between_processes(self):
+        """Test that forked processes see each other's writes and never lose increments"""
+        cache = self.make_cache()
+        cache.set('counter', 0)
+        cache.set('parent', 'written before the fork')
+        children = []
+        for index in range(4):
+            pid = os.fork()
+            if pid == 0:
+                code = 0
+                try:
+                    child = self.make_cache()
+                    if child.get('parent') != 'written before the fork':
+                        code = 1
+                    for _ in range(200):
+                        cache.incr('counter')
+                        child.set(f'child{index}', index)
+                finally:
+                    os._exit(code)
+            children.append(pid)
+        for pid in children:
+            self.assertEqual(os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1]), 0)
+        self.assertEqual(cache.get('counter'), 800)
+        self.assertEqual(cache.get_many([f'child{index}' for index in range(4)]), {f'child{index}': index for index in range(4)})
+        
+    def test_space_is_reserved_up_front(self):
+        """Test that the file's space is allocated when it is opened, so a full tmpfs fails then"""
+        cache = self.make_cache()
+        cache.get('key')
+        self.assertGreaterEqual(os.stat(self.path).st_blocks * 512, cache._size)
+        
+        os.remove(self.path)
+        with mock.patch('os.posix_fallocate', side_effect=OSError(errno.ENOSPC, 'No space left on device')):
+            with self.assertRaisesRegex(OSError, 'shm-size') as raised:
+                self.make_cache().get('key')
+        self.assertEqual(raised.exception.errno, errno.ENOSPC)
+        
+    def test_recovers_from_interrupted_writes_and_other_layouts(self):
+        """Test that a half-written file, or one laid out differently, is emptied instead of read"""
+        cache = self.make_cache()
+        cache.set('key', 'value')
+        cache._map[sharedcache.DIRTY_OFFSET] = 1
+        self.assertIsNone(cache.get('key'))
+        cache.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+        
+        other = self.make_cache(MAX_ENTRIES=32)
+        self.assertIsNone(other.get('key'))
+        other.set('key', 'other')
+        self.assertIsNone(cache.get('key'))
+        
+    def test_serves_the_dashboard(self):
+        """Test the backend as the project's cache, for the dashboard cache"""
+        backend = {'BACKEND': 'finance.sharedcache.SharedMemoryCache', 'LOCATION': self.path}
+        with override_settings(CACHES={'default': backend}):
+            user = User.objects.create_user(username='sharedcacheuser', password='testpass123')
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+            self.assertLessEqual(len(captured), 3)
+            self.assertTrue(os.path.exists(self.path))
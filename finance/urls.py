@@ -1,27 +1,58 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, metrics, views
 
-urlpatterns = [
-    # Health check
-    path('health/', views.health_check, name='health-check'),
+
+def get_urlpatterns(async_views=False):
+    """URL patterns of the app; with ``async_views`` the dashboard and list
+    pages use their ``async def`` views, for serving under ASGI"""
+    if async_views:
+        dashboard = views.dashboard_async_view
+        transaction_list = views.TransactionListAsyncView
+        category_list = views.CategoryListAsyncView
+        budget_list = views.BudgetListAsyncView
+    else:
+        dashboard = views.dashboard_view
+        transaction_list = views.TransactionListView
+        category_list = views.CategoryListView
+        budget_list = views.BudgetListView
+    
+    return [
+        # Health check
+        path('health/', views.health_check, name='health-check'),
+        path('health/live/', views.liveness, name='health-live'),
+        path('health/ready/', views.readiness, name='health-ready'),
+        path('health/database/', views.database_stats, name='health-database'),
+        path('metrics/', metrics.metrics_view, name='metrics'),
+    
+        # Dashboard
+        path('', dashboard, name='dashboard'),
     
-    # Dashboard
-    path('', views.dashboard_view, name='dashboard'),
+        # Authentication
+        path('register/', views.register_view, name='register'),
     
-    # Authentication
-    path('register/', views.register_view, name='register'),
+        # Transactions
+        path('transactions/', transaction_list.as_view(), name='transaction-list'),
+        path('transactions/create/', views.TransactionCreateView.as_view(), name='transaction-create'),
+        path('transactions/import/', views.transaction_import_view, name='transaction-import'),
+        path('transactions/export/', views.transaction_export_view, name='transaction-export'),
+        path('transactions/<int:pk>/edit/', views.TransactionUpdateView.as_view(), name='transaction-edit'),
+        path('transactions/<int:pk>/delete/', views.TransactionDeleteView.as_view(), name='transaction-delete'),
     
-    # Transactions
-    path('transactions/', views.TransactionListView.as_view(), name='transaction-list'),
-    path('transactions/create/', views.TransactionCreateView.as_view(), name='transaction-create'),
-    path('transactions/<int:pk>/edit/', views.TransactionUpdateView.as_view(), name='transaction-edit'),
-    path('transactions/<int:pk>/delete/', views.TransactionDeleteView.as_view(), name='transaction-delete'),
+        # Categories
+        path('categories/', category_list.as_view(), name='category-list'),
+        path('categories/create/', views.CategoryCreateView.as_view(), name='category-create'),
     
-    # Categories
-    path('categories/', views.CategoryListView.as_view(), name='category-list'),
-    path('categories/create/', views.CategoryCreateView.as_view(), name='category-create'),
+        # Budgets
+        path('budgets/', budget_list.as_view(), name='budget-list'),
+        path('budgets/create/', views.BudgetCreateView.as_view(), name='budget-create'),
     
-    # Budgets
-    path('budgets/', views.BudgetListView.as_view(), name='budget-list'),
-    path('budgets/create/', views.BudgetCreateView.as_view(), name='budget-create'),
-]
\ No newline at end of file
+        # JSON API
+        path('api/v1/transactions/', api.transactions, name='api-transactions'),
+        path('api/v1/transactions/batch/', api.transactions_batch, name='api-transactions-batch'),
+        path('api/v1/categories/', api.categories, name='api-categories'),
+        path('api/v1/budgets/', api.budgets, name='api-budgets'),
+    ]
+
+
+urlpatterns = get_urlpatterns(async_views=getattr(settings, 'ASYNC_VIEWS', False))
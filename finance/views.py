@@ -1,27 +1,55 @@
+import asyncio
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth import login
 from django.contrib import messages
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView
+from django.views.generic import View, ListView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
-from django.db.models import Sum, Q
+from django.core.paginator import InvalidPage
+from django.db.models import Q
 from django.utils import timezone
 from datetime import datetime, date
-from decimal import Decimal
-from django.http import HttpResponse
+import io
+import os
+from django.http import HttpResponse, HttpResponseBadRequest, Http404, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.template.response import TemplateResponse
+from asgiref.sync import async_to_sync, sync_to_async
+from urllib.parse import urlencode
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from django.db import connection
 from .models import Transaction, Category, Budget
-from .forms import TransactionForm, CategoryForm, BudgetForm, CustomUserCreationForm
+from . import caching, concurrency, exports, health, ledger, metrics, pool, rollups, sharding
+from .concurrency import async_login_required
+from .pagination import CursorPaginator, InvalidCursor, cursor_filters
+from .forms import TransactionForm, CategoryForm, BudgetForm, CustomUserCreationForm, TransactionImportForm, TransactionFilterForm
+from .importers import ImportFileError, import_transactions
 
 
 class UserAccessMixin(LoginRequiredMixin):
     """Mixin to ensure users can only access their own data"""
     
     def get_queryset(self):
-        return super().get_queryset().filter(user=self.request.user)
+        return sharding.using_user(super().get_queryset(), self.request.user).filter(user=self.request.user)
+
+
+class AsyncUserAccessMixin(UserAccessMixin):
+    """``UserAccessMixin`` for views with ``async def`` handlers.
+
+    Authenticates without blocking the event loop.  Subclasses of sync
+    views get an async ``get`` that runs the sync one in a thread; override
+    it to run independent queries concurrently.
+    """
+    
+    async def dispatch(self, request, *args, **kwargs):
+        user = await concurrency.authenticate(request)
+        if not user.is_authenticated:
+            return self.handle_no_permission()
+        return await View.dispatch(self, request, *args, **kwargs)
+    
+    async def get(self, request, *args, **kwargs):
+        return await sync_to_async(super().get)(request, *args, **kwargs)
 
 
 # Authentication Views
@@ -49,103 +77,218 @@ def register_view(request):
     return render(request, 'registration/register.html', {'form': form})
 
 
+def dashboard_queries(user, current_date):
+    """The dashboard's independent queries, as callables keyed by context name"""
+    current_month = current_date.month
+    current_year = current_date.year
+    
+    return {
+        # Monthly totals from the pre-aggregated rollup table
+        'totals': lambda: rollups.monthly_totals(user, current_year, current_month),
+        # Recent transactions (last 10)
+        'recent_transactions': lambda: list(
+            Transaction.objects.filter(user=user).select_related('category')[:10]
+        ),
+        # Budget information for every period in a constant number of queries
+        'budget_data': lambda: Budget.objects.filter(user=user).progress(current_date),
+        # Expense breakdown by category for current month
+        'expense_breakdown': lambda: list(rollups.expense_breakdown(
+            user, current_year, current_month
+        )),
+    }
+
+
+def dashboard_summary(current_date, results):
+    """Assemble the dashboard context from the results of ``dashboard_queries``"""
+    total_income, total_expenses = results.pop('totals')
+    return {
+        'total_income': total_income,
+        'total_expenses': total_expenses,
+        'current_balance': total_income - total_expenses,
+        **results,
+        'current_month': current_date.strftime('%B %Y'),
+    }
+
+
+def build_dashboard_context(user, current_date):
+    """Compute the dashboard's financial summary for ``user`` as of ``current_date``"""
+    queries = dashboard_queries(user, current_date)
+    return dashboard_summary(current_date, {name: query() for name, query in queries.items()})
+
+
+async def abuild_dashboard_context(user, current_date):
+    """``build_dashboard_context`` with its queries running concurrently"""
+    queries = dashboard_queries(user, current_date)
+    results = await concurrency.gather(*queries.values())
+    return dashboard_summary(current_date, dict(zip(queries, results)))
+
+
 @login_required
 def dashboard_view(request):
     """Main dashboard view with financial summary and budget tracking"""
     # Get current month data
     current_date = timezone.now().date()
-    current_month = current_date.month
-    current_year = current_date.year
     
-    # Calculate monthly totals
-    monthly_transactions = Transaction.objects.filter(
-        user=request.user,
-        date__month=current_month,
-        date__year=current_year
+    # Served from the per-user cache until the user's data changes
+    context = caching.dashboard_context(
+        request.user,
+        current_date,
+        lambda: build_dashboard_context(request.user, current_date),
     )
     
-    total_income = monthly_transactions.filter(type='Income').aggregate(
-        total=Sum('amount')
-    )['total'] or Decimal('0.00')
-    
-    total_expenses = monthly_transactions.filter(type='Expense').aggregate(
-        total=Sum('amount')
-    )['total'] or Decimal('0.00')
-    
-    current_balance = total_income - total_expenses
-    
-    # Get recent transactions (last 10)
-    recent_transactions = Transaction.objects.filter(user=request.user)[:10]
-    
-    # Get budget information
-    monthly_budgets = Budget.objects.filter(user=request.user, period='Monthly')
-    budget_data = []
-    
-    for budget in monthly_budgets:
-        spent = monthly_transactions.filter(
-            type='Expense',
-            category=budget.category
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        
-        percentage = float((spent / budget.limit) * 100) if budget.limit > 0 else 0
-        percentage = min(percentage, 100)  # Cap at 100%
-        
-        budget_data.append({
-            'budget': budget,
-            'spent': spent,
-            'remaining': budget.limit - spent,
-            'percentage': percentage,
-            'is_over_budget': spent > budget.limit
-        })
-    
-    # Get expense breakdown by category for current month
-    expense_breakdown = monthly_transactions.filter(type='Expense').values(
-        'category__name'
-    ).annotate(
-        total=Sum('amount')
-    ).order_by('-total')[:5]
+    return render(request, 'finance/dashboard.html', context)
+
+
+@async_login_required
+async def dashboard_async_view(request):
+    """``dashboard_view`` for ASGI, running the dashboard queries concurrently"""
+    current_date = timezone.now().date()
     
-    context = {
-        'total_income': total_income,
-        'total_expenses': total_expenses,
-        'current_balance': current_balance,
-        'recent_transactions': recent_transactions,
-        'budget_data': budget_data,
-        'expense_breakdown': expense_breakdown,
-        'current_month': current_date.strftime('%B %Y'),
-    }
+    # The cache's single-flight locks are synchronous, so the lookup runs in
+    # a thread and a miss hops back to the event loop to run the queries
+    context = await sync_to_async(caching.dashboard_context)(
+        request.user,
+        current_date,
+        lambda: async_to_sync(abuild_dashboard_context)(request.user, current_date),
+    )
     
-    return render(request, 'finance/dashboard.html', context)
+    # Rendered by the handler in a thread, off the event loop
+    return TemplateResponse(request, 'finance/dashboard.html', context)
 
 
 # Transaction CRUD Views
 class TransactionListView(UserAccessMixin, ListView):
-    """List all user's transactions"""
+    """List all user's transactions.
+
+    Pages with OFFSET by default.  With ``pagination=cursor`` in the query
+    string, or ``TRANSACTION_LIST_PAGINATION = 'cursor'`` in settings, it
+    switches to keyset pagination on ``(-date, -created_at, -id)`` with
+    opaque next/previous cursors and a total read from the monthly rollups,
+    so every page costs the same regardless of depth.
+
+    With ``ledger=1`` each row also gets a running ``balance``, computed
+    with a SQL window over the page's month plus the rollup opening balance
+    (see ``finance.ledger``).
+
+    ``q`` runs an indexed full-text search on the description (see
+    ``finance.search``); numbered pages are then ordered by relevance, while
+    cursor pages keep their date order.  Running balances are not shown for
+    search results.
+    """
     model = Transaction
     template_name = 'finance/transaction_list.html'
     context_object_name = 'transactions'
     paginate_by = 20
+    cursor_ordering = ('-date', '-created_at', '-id')
+
+    def get_pagination_mode(self):
+        mode = self.request.GET.get('pagination')
+        if mode in ['offset', 'cursor']:
+            return mode
+        if self.request.GET.get('cursor'):
+            return 'cursor'
+        return getattr(settings, 'TRANSACTION_LIST_PAGINATION', 'offset')
+
+    def get_filters(self):
+        """Type and category filters, taken from the cursor when paging by cursor"""
+        if not hasattr(self, '_filters'):
+            cursor = self.request.GET.get('cursor')
+            if cursor:
+                try:
+                    self._filters = cursor_filters(cursor)
+                except InvalidCursor:
+                    raise Http404('Invalid cursor.')
+            else:
+                self._filters = {
+                    'type': self.request.GET.get('type', ''),
+                    'category': self.request.GET.get('category', ''),
+                    'q': self.request.GET.get('q', '').strip(),
+                    'ledger': '1' if self.request.GET.get('ledger') else '',
+                }
+        return self._filters
+
+    def get_filter_arguments(self):
+        """Validated type and category filters as keyword arguments"""
+        filters = self.get_filters()
+        return {
+            'type': filters.get('type') if filters.get('type') in ['Income', 'Expense'] else None,
+            'category_id': filters.get('category') or None,
+        }
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related('category')
+        filters = self.get_filters()
         
         # Filter by transaction type if specified
-        transaction_type = self.request.GET.get('type')
+        transaction_type = filters.get('type')
         if transaction_type in ['Income', 'Expense']:
             queryset = queryset.filter(type=transaction_type)
         
         # Filter by category if specified
-        category_id = self.request.GET.get('category')
+        category_id = filters.get('category')
         if category_id:
             queryset = queryset.filter(category_id=category_id)
         
+        # Full-text search, best matches first
+        if filters.get('q'):
+            queryset = queryset.search(filters['q']).order_by('-search_rank', '-date', '-created_at', '-id')
+        
         return queryset
 
+    def show_balances(self):
+        filters = self.get_filters()
+        return bool(filters.get('ledger')) and not filters.get('q')
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.get_pagination_mode() == 'cursor':
+            paginator, page, object_list, is_paginated = self.paginate_by_cursor(queryset, page_size)
+        else:
+            paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+
+        if self.show_balances():
+            object_list = ledger.attach_balances(
+                queryset, list(object_list), self.request.user, **self.get_filter_arguments()
+            )
+            page.object_list = object_list
+        return (paginator, page, object_list, is_paginated)
+
+    def get_cursor_count(self, queryset):
+        """Callable counting the rows listed in cursor mode"""
+        if self.get_filters().get('q'):
+            # Rollups know nothing about search matches; count them directly
+            return queryset.count
+        return lambda: rollups.transaction_count(self.request.user, **self.get_filter_arguments())
+
+    def paginate_by_cursor(self, queryset, page_size):
+        filters = self.get_filters()
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering, count=self.get_cursor_count(queryset))
+        try:
+            page = paginator.page(self.request.GET.get('cursor'), filters)
+        except InvalidCursor:
+            raise Http404('Invalid cursor.')
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def cursor_url(self, cursor):
+        return '?' + urlencode({'pagination': 'cursor', 'cursor': cursor})
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        filters = self.get_filters()
         context['categories'] = Category.objects.filter(user=self.request.user)
-        context['selected_type'] = self.request.GET.get('type', '')
-        context['selected_category'] = self.request.GET.get('category', '')
+        context['selected_type'] = filters.get('type', '')
+        context['selected_category'] = filters.get('category', '')
+        context['ledger'] = self.show_balances()
+        context['search_query'] = filters.get('q', '')
+        context['filter_query'] = urlencode({name: value for name, value in filters.items() if value})
+        
+        context['cursor_pagination'] = self.get_pagination_mode() == 'cursor'
+        if context['cursor_pagination']:
+            page = context['page_obj']
+            context['first_page_url'] = '?' + urlencode({'pagination': 'cursor', **filters})
+            if page.has_next():
+                context['next_page_url'] = self.cursor_url(page.next_cursor)
+            if page.has_previous():
+                context['previous_page_url'] = self.cursor_url(page.previous_cursor)
         return context
 
 
@@ -167,6 +310,62 @@ class TransactionCreateView(UserAccessMixin, CreateView):
         return super().form_valid(form)
 
 
+@login_required
+def transaction_import_view(request):
+    """Import transactions from an uploaded CSV file"""
+    result = None
+    if request.method == 'POST':
+        form = TransactionImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            stream = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+            try:
+                result = import_transactions(request.user, stream)
+            except ImportFileError as exc:
+                form.add_error('file', str(exc))
+            else:
+                if result.created:
+                    messages.success(request, f'Imported {result.created} transactions.')
+                if result.errors:
+                    messages.warning(request, f'{result.error_count} rows could not be imported.')
+            finally:
+                stream.detach()
+    else:
+        form = TransactionImportForm()
+    
+    return render(request, 'finance/transaction_import.html', {
+        'form': form,
+        'result': result,
+        'max_errors_shown': 200,
+    })
+
+
+@login_required
+def transaction_export_view(request):
+    """Stream the user's transactions as CSV or NDJSON"""
+    export_format = request.GET.get('format') or 'csv'
+    if export_format not in exports.FORMATS:
+        return HttpResponseBadRequest(f"Unknown format: choose one of {', '.join(exports.FORMATS)}.")
+    form = TransactionFilterForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(' '.join(
+            message for messages in form.errors.values() for message in messages
+        ))
+    
+    filters = form.cleaned_data
+    queryset = exports.filter_transactions(
+        Transaction.objects.filter(user=request.user),
+        type=filters['type'],
+        category_id=filters['category'],
+        start=filters['start'],
+        end=filters['end'],
+    )
+    content_type, extension = exports.FORMATS[export_format]
+    response = StreamingHttpResponse(exports.stream(queryset, export_format), content_type=content_type)
+    filename = f'transactions-{timezone.localdate().isoformat()}.{extension}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 class TransactionUpdateView(UserAccessMixin, UpdateView):
     """Update existing transaction"""
     model = Transaction
@@ -190,6 +389,9 @@ class TransactionDeleteView(UserAccessMixin, DeleteView):
     template_name = 'finance/transaction_confirm_delete.html'
     success_url = reverse_lazy('transaction-list')
 
+    def get_queryset(self):
+        return super().get_queryset().select_related('category')
+
     def delete(self, request, *args, **kwargs):
         messages.success(request, 'Transaction deleted successfully!')
         return super().delete(request, *args, **kwargs)
@@ -223,11 +425,97 @@ class CategoryCreateView(UserAccessMixin, CreateView):
 
 # Budget Views
 class BudgetListView(UserAccessMixin, ListView):
-    """List all user's budgets"""
+    """List all user's budgets with their progress in the current period"""
     model = Budget
     template_name = 'finance/budget_list.html'
     context_object_name = 'budgets'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['budget_data'] = self.object_list.progress()
+        return context
+
+
+# Async views, routed instead of the sync ones when ASYNC_VIEWS is set (see finance/urls.py)
+class TransactionListAsyncView(AsyncUserAccessMixin, TransactionListView):
+    """``TransactionListView`` for ASGI.
+
+    The page of rows, the total count and the category filter choices do
+    not depend on each other, so they are fetched concurrently; running
+    balances, which need the page, follow.
+    """
+    
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        (self.categories,), pagination = await asyncio.gather(
+            concurrency.gather(lambda: list(Category.objects.filter(user=request.user))),
+            self.apaginate_queryset(self.object_list, self.paginate_by),
+        )
+        paginator, page, object_list, is_paginated = pagination
+        if self.show_balances():
+            object_list = await sync_to_async(ledger.attach_balances)(
+                self.object_list, list(object_list), request.user, **self.get_filter_arguments()
+            )
+            page.object_list = object_list
+        self.pagination = (paginator, page, object_list, is_paginated)
+        return self.render_to_response(self.get_context_data())
+    
+    async def apaginate_queryset(self, queryset, page_size):
+        if self.get_pagination_mode() == 'cursor':
+            return await self.apaginate_by_cursor(queryset, page_size)
+        return await self.apaginate_by_offset(queryset, page_size)
+    
+    async def apaginate_by_cursor(self, queryset, page_size):
+        # The page and the count are independent queries
+        pagination, count = await concurrency.gather(
+            lambda: self.paginate_by_cursor(queryset, page_size),
+            self.get_cursor_count(queryset),
+        )
+        pagination[0]._cached_count = count
+        return pagination
+    
+    async def apaginate_by_offset(self, queryset, page_size):
+        paginator = self.get_paginator(
+            queryset, page_size, orphans=self.get_paginate_orphans(),
+            allow_empty_first_page=self.get_allow_empty(),
+        )
+        page_number = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+        try:
+            number = int(page_number)
+        except ValueError:
+            number = None
+        if number is None or number < 1 or paginator.orphans:
+            # 'last' and invalid pages need the count first
+            return await sync_to_async(ListView.paginate_queryset)(self, queryset, page_size)
+        
+        # Fetch the requested rows alongside the count, then validate the page
+        bottom = (number - 1) * page_size
+        rows, paginator.count = await concurrency.gather(
+            lambda: list(queryset[bottom:bottom + page_size]), queryset.count,
+        )
+        try:
+            page = paginator.page(number)
+        except InvalidPage as e:
+            raise Http404(f'Invalid page ({number}): {e}')
+        page.object_list = rows
+        return (paginator, page, rows, page.has_other_pages())
+    
+    def paginate_queryset(self, queryset, page_size):
+        return self.pagination
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['categories'] = self.categories
+        return context
+
+
+class CategoryListAsyncView(AsyncUserAccessMixin, CategoryListView):
+    """``CategoryListView`` for ASGI"""
+
+
+class BudgetListAsyncView(AsyncUserAccessMixin, BudgetListView):
+    """``BudgetListView`` for ASGI"""
+
 
 class BudgetCreateView(UserAccessMixin, CreateView):
     """Create new budget"""
@@ -247,23 +535,61 @@ class BudgetCreateView(UserAccessMixin, CreateView):
         return super().form_valid(form)
 
 
+@csrf_exempt
+def database_stats(request):
+    """Connection settings, connect counts and pool metrics of this worker process.
+
+    Only for staff users and requests sending ``METRICS_TOKEN``, as they describe the database setup.
+    """
+    if not metrics.has_access(request):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return JsonResponse({'pid': os.getpid(), 'databases': pool.connection_stats()})
+
+
 @csrf_exempt
 def health_check(request):
-    """Health check endpoint for load balancers and monitoring systems."""
-    try:
-        # Check database connectivity
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-            cursor.fetchone()
-        
+    """Health check endpoint for load balancers and monitoring systems.
+
+    Serves the cached readiness report, so probes do not query the database.
+    """
+    _, report = health.readiness()
+    if report['status'] == 'ok':
         return HttpResponse(
             "OK - Finance Tracker is healthy",
             status=200,
             content_type="text/plain"
         )
-    except Exception as e:
-        return HttpResponse(
-            f"ERROR - Database connection failed: {str(e)}",
-            status=500,
-            content_type="text/plain"
-        )
+    errors = [
+        f"{name} {alias}: {result['error']}"
+        for name in ('databases', 'migrations')
+        for alias, result in report['checks'][name].items() if not result['ok']
+    ]
+    if not report['checks']['cache']['ok']:
+        errors.append(f"cache: {report['checks']['cache']['error']}")
+    return HttpResponse(
+        f"ERROR - {'; '.join(errors)}",
+        status=500,
+        content_type="text/plain"
+    )
+
+
+@csrf_exempt
+def liveness(request):
+    """Liveness probe: the process answers requests; touches no database, cache or file"""
+    return HttpResponse("OK", content_type="text/plain")
+
+
+@csrf_exempt
+def readiness(request):
+    """Readiness probe: the cached database, cache and migration checks.
+
+    Anyone gets each check's result and latency; staff users and requests
+    sending ``METRICS_TOKEN`` also get the checks' details and errors, and
+    this worker's pid and pool state.
+    """
+    age, report = health.readiness()
+    if metrics.has_access(request):
+        body = {**report, 'age': round(age, 3), 'pid': os.getpid(), 'pool': pool.connection_stats()}
+    else:
+        body = {**health.summary(report), 'age': round(age, 3)}
+    return JsonResponse(body, status=200 if report['status'] == 'ok' else 503)
@@ -0,0 +1,74 @@
+"""Prepare server workers before they take traffic.
+
+Without a warm-up the first requests a worker serves also pay for building
+the URL resolver, compiling templates and connecting to the databases and
+the cache.  ``gunicorn.conf.py`` runs ``warm_code`` once in the master
+process when the application is preloaded, so forked workers share the
+result, and ``warm_connections`` in every worker after it is forked:
+connections must never be shared across a fork.
+
+Failures are logged, not raised: a worker that cannot reach its database yet
+can still serve the health check and connect on its next request.
+"""
+import logging
+import time
+
+from django.core.cache import cache
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+from .pool import PooledDatabaseWrapperMixin
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES = [
+    'finance/dashboard.html',
+    'finance/transaction_list.html',
+    'finance/transaction_form.html',
+    'finance/category_list.html',
+    'finance/budget_list.html',
+    'registration/login.html',
+]
+
+
+def _open_database_connections():
+    for alias in connections:
+        connection = connections[alias]
+        pooled = isinstance(connection, PooledDatabaseWrapperMixin)
+        # Without a pool or CONN_MAX_AGE the first request would close it again
+        if not pooled and not connection.settings_dict['CONN_MAX_AGE']:
+            continue
+        connection.ensure_connection()
+        if pooled:
+            connection.close()
+
+
+def _run(steps):
+    started = time.perf_counter()
+    for name, step in steps:
+        try:
+            step()
+        except Exception:
+            logger.warning('Warm-up of %s failed', name, exc_info=True)
+    return time.perf_counter() - started
+
+
+def warm_code():
+    """Build the URL resolver and compile the main templates; returns the seconds spent"""
+    return _run([
+        ('URL resolver', lambda: get_resolver()._populate()),
+        ('templates', lambda: [get_template(name) for name in TEMPLATES]),
+    ])
+
+
+def warm_connections():
+    """Connect to the databases and the cache; returns the seconds spent.
+
+    Pooled backends hand their connection back to the pool; persistent
+    connections stay open on the calling thread.
+    """
+    return _run([
+        ('database connections', _open_database_connections),
+        ('cache', lambda: cache.get('finance:warmup')),
+    ])
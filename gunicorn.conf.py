@@ -0,0 +1,185 @@
+"""Gunicorn configuration, read from the working directory or with ``--config``.
+
+``SERVER_MODE`` picks how requests are served:
+
+* ``wsgi`` (default): sync workers, one request at a time per process;
+* ``gthread``: threaded workers, for I/O-bound pages where a worker would
+  otherwise sit idle waiting on the database;
+* ``asgi``: Uvicorn workers running the async dashboard and list views.
+
+Workers (and threads) are sized from the CPUs and memory available to the
+container, honouring cgroup limits, and capped so that every worker fits in
+memory.  ``WEB_CONCURRENCY`` and ``GUNICORN_THREADS`` override the sizing.
+The application is preloaded in the master, which warms the URL resolver and
+templates once for all workers; each worker then opens its database and
+cache connections right after it is forked, and is replaced after
+``GUNICORN_MAX_REQUESTS`` requests (plus jitter, so they do not all restart
+at once) to bound memory growth.
+
+Workers write their metrics to ``METRICS_DIR`` (by default a directory for
+this server under ``/dev/shm``), which is emptied when the server starts;
+the metrics of exited workers are folded into an archive there (see
+``finance.metrics``).
+"""
+import glob
+import math
+import os
+import shutil
+import tempfile
+
+MODES = {
+    'wsgi': ('sync', 'FinanceTracker.wsgi:application'),
+    'gthread': ('gthread', 'FinanceTracker.wsgi:application'),
+    'asgi': ('uvicorn.workers.UvicornWorker', 'FinanceTracker.asgi:application'),
+}
+# Leave room for the master, the page cache and spikes
+MEMORY_HEADROOM = 0.75
+
+
+def _read(path):
+    try:
+        with open(path) as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def available_cpus():
+    """CPUs this process may use: its affinity mask, lowered by a cgroup CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = period = None
+    cpu_max = _read('/sys/fs/cgroup/cpu.max')  # cgroup v2: "<quota> <period>"
+    if cpu_max:
+        quota, _, period = cpu_max.partition(' ')
+    else:  # cgroup v1
+        quota = _read('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+        period = _read('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    try:
+        quota, period = int(quota), int(period)
+    except (TypeError, ValueError):  # "max", missing or unreadable
+        return cpus
+    if quota > 0 and period > 0:
+        cpus = min(cpus, max(1, math.ceil(quota / period)))
+    return cpus
+
+
+def available_memory_mb():
+    """Memory this process may use in MiB: the cgroup limit, else physical memory; None if unknown"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        limit = _read(path)
+        # cgroup v1 reports "no limit" as a huge number
+        if limit and limit.isdigit() and int(limit) < 1 << 60:
+            return int(limit) // (1 << 20)
+    meminfo = _read('/proc/meminfo') or ''
+    for line in meminfo.splitlines():
+        if line.startswith('MemTotal:'):
+            return int(line.split()[1]) // 1024
+    return None
+
+
+def worker_sizing(mode, cpus, memory_mb, worker_memory_mb=150, thread_memory_mb=10, threads=None):
+    """``(workers, threads)`` for ``mode`` on a machine with ``cpus`` and ``memory_mb``.
+
+    Sync workers follow the usual ``2 * cpus + 1``: one process per request,
+    with enough of them to keep the CPUs busy while others wait on I/O.
+    Threaded workers get one process per CPU plus one, with ``threads``
+    (default 4) requests each, and event-loop workers one process per CPU.
+    """
+    if mode == 'gthread':
+        workers, threads = cpus + 1, threads or 4
+    elif mode == 'asgi':
+        workers, threads = cpus, 1
+    else:
+        workers, threads = 2 * cpus + 1, 1
+    if memory_mb:
+        per_worker = worker_memory_mb + thread_memory_mb * (threads - 1)
+        workers = min(workers, int(memory_mb * MEMORY_HEADROOM // per_worker))
+    return max(1, workers), threads
+
+
+mode = os.environ.get('SERVER_MODE', 'wsgi')
+if mode not in MODES:
+    raise RuntimeError(f"SERVER_MODE must be one of {', '.join(MODES)}, not {mode!r}")
+worker_class, wsgi_app = MODES[mode]
+if mode == 'asgi':
+    os.environ.setdefault('ASYNC_VIEWS', 'True')
+
+workers, threads = worker_sizing(
+    mode,
+    available_cpus(),
+    available_memory_mb(),
+    worker_memory_mb=int(os.environ.get('GUNICORN_WORKER_MEMORY_MB', '150')),
+    thread_memory_mb=int(os.environ.get('GUNICORN_THREAD_MEMORY_MB', '10')),
+    threads=int(os.environ.get('GUNICORN_THREADS', '0')) or None,
+)
+workers = int(os.environ.get('WEB_CONCURRENCY', workers))
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+# A stuck request frees its worker after this long instead of holding it
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', str(max_requests // 10)))
+accesslog = '-'
+errorlog = '-'
+# Worker heartbeats on tmpfs, so a slow disk cannot get healthy workers killed
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+# Inherited by the workers; the master's pid keeps servers on one host apart
+os.environ.setdefault('METRICS_DIR', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), f'finance-metrics-{os.getpid()}',
+))
+
+
+def on_starting(server):
+    # Counters restart with the server
+    if os.environ['METRICS_DIR']:
+        for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], '*.json')):
+            os.remove(path)
+
+
+def when_ready(server):
+    server.log.info(
+        'Serving %s with %d %s worker(s) x %d thread(s), preload=%s',
+        wsgi_app, server.cfg.workers, worker_class, server.cfg.threads, server.cfg.preload_app,
+    )
+    if server.cfg.preload_app:
+        from finance import warmup
+        server.log.info('Warmed up code in %.0f ms', warmup.warm_code() * 1000)
+
+
+def pre_fork(server, worker):
+    if server.cfg.preload_app:
+        # Never hand a connection opened by the master to a worker
+        from django.db import connections
+        connections.close_all()
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from finance import warmup
+        server.log.info('Worker %s connected in %.0f ms', worker.pid, warmup.warm_connections() * 1000)
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app:
+        # The application was only loaded now, in the worker
+        from finance import warmup
+        seconds = warmup.warm_code() + warmup.warm_connections()
+        worker.log.info('Worker %s warmed up in %.0f ms', worker.pid, seconds * 1000)
+
+
+def child_exit(server, worker):
+    from finance import metrics
+    metrics.mark_process_dead(worker.pid, os.environ['METRICS_DIR'])
+
+
+def on_exit(server):
+    if os.path.basename(os.environ['METRICS_DIR']).startswith('finance-metrics-'):
+        shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
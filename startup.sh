@@ -6,35 +6,41 @@ echo "Starting Finance Tracker application..."
 # Exit on any error
 set -e
 
-# Collect static files
-echo "Collecting static files..."
-python manage.py collectstatic --noinput
+# Report how long each startup phase takes
+now_ms() { echo $(( $(date +%s%N) / 1000000 )); }
+startup_started=$(now_ms)
+phase_started=$startup_started
+end_phase() {
+    local finished
+    finished=$(now_ms)
+    echo "$1 took $(( finished - phase_started )) ms"
+    phase_started=$finished
+}
 
-# Wait for database to be ready with retries
-echo "Waiting for database connection..."
-for i in {1..30}; do
-    echo "Database connection attempt $i..."
-    if python manage.py check --database default; then
-        echo "Database is ready!"
-        break
-    else
-        echo "Database not ready, waiting 5 seconds..."
-        sleep 5
-    fi
-    if [ $i -eq 30 ]; then
-        echo "Database connection failed after 30 attempts"
-        exit 1
-    fi
-done
+# Static files are collected when the image is built; only deployments that
+# ship the source without a build step collect them here
+if [ -f staticfiles/staticfiles.json ]; then
+    echo "Static files were collected at build time"
+else
+    echo "Collecting static files..."
+    python manage.py collectstatic --noinput
+fi
+end_phase "Static files"
 
-# Apply database migrations
-echo "Applying database migrations..."
-python manage.py migrate --noinput
+# Wait for the database (in one process, with exponential backoff) and apply
+# migrations only when some are pending
+echo "Waiting for database connection..."
+python manage.py wait_for_db --migrate --timeout "${DB_WAIT_TIMEOUT:-150}"
+end_phase "Database"
 
 # Create superuser if it doesn't exist (optional for development)
 # echo "Creating superuser..."
 # python manage.py shell -c "from django.contrib.auth.models import User; User.objects.filter(username='admin').exists() or User.objects.create_superuser('admin', 'admin@example.com', 'change-this-password')"
 
-# Start Gunicorn server with production settings
-echo "Starting Gunicorn server..."
-exec gunicorn --bind 0.0.0.0:8000 --workers 3 --timeout 600 --access-logfile - --error-logfile - FinanceTracker.wsgi:application
\ No newline at end of file
+# Start Gunicorn with production settings. gunicorn.conf.py sizes the workers
+# for this machine; SERVER_MODE=gthread uses threaded workers and
+# SERVER_MODE=asgi serves the ASGI application through uvicorn workers with
+# the async dashboard and list pages, which run their queries concurrently.
+echo "Startup before Gunicorn took $(( $(now_ms) - startup_started )) ms"
+echo "Starting Gunicorn server (${SERVER_MODE:-wsgi})..."
+exec gunicorn --config gunicorn.conf.py
\ No newline at end of file